@@ -0,0 +1,164 @@
+"""
+The built-in rules (FirstTextLetterRule, UpperLetterAfterFullStopRule and
+UpperLetterAfterTwoUpperLettersRule) compiled into one engine.
+
+Every character is first mapped to a one-letter class with str.translate. The classes keep
+exactly what the rules ask of a symbol: isspace, == '.', isalpha, isupper and islower.
+Deviations are then found with a single regular expression over the class string.
+"""
+import re
+
+from .custom_types import DeviationsPositions, DecapitalizedText
+from .decapitalizer import lower_symbol
+
+SPACE = 'S'
+FULL_STOP = 'D'
+UPPER_LETTER = 'U'
+LOWER_LETTER = 'L'
+# Letters that are neither upper nor lower case (CJK, titlecase digraphs, ...)
+CASELESS_LETTER = 'A'
+# Upper case symbols that are not letters, like circled letters
+UPPER_OTHER = 'u'
+OTHER = 'O'
+
+# The expression runs over the reversed class string, so that "preceded by a full stop and
+# spaces" becomes a lookahead. A symbol is a deviation when it is
+# - an upper case non-letter: no rule but the first letter one covers it,
+# - an upper case letter that no rule expects to be upper case,
+# - a letter right after a full stop that is not upper case,
+# - a lower case letter right after two upper case (or caseless) letters.
+_REVERSED_DEVIATION = re.compile(r'u|U(?![UA]{2}|S*D)|[LA](?=S*D)|L(?=[UA]{2})')
+
+
+def classify(symbol: str) -> str:
+    if symbol.isspace():
+        return SPACE
+
+    if symbol == '.':
+        return FULL_STOP
+
+    if symbol.isalpha():
+        if symbol.isupper():
+            return UPPER_LETTER
+        if symbol.islower():
+            return LOWER_LETTER
+        return CASELESS_LETTER
+
+    return UPPER_OTHER if symbol.isupper() else OTHER
+
+
+class CompiledDecapitalizer:
+    """
+    Decapitalizer([FirstTextLetterRule(), UpperLetterAfterFullStopRule(), UpperLetterAfterTwoUpperLettersRule()])
+    with identical output, including the rule state carried from one call to the next.
+    """
+
+    def __init__(self):
+        self.__classes: dict[int, str] = {}
+        self.__lowered: dict[int, str] = {}
+        # State of the three rules: anything seen yet, a full stop waiting for a letter,
+        # upper case (or caseless) letters in a row, up to 2
+        self.__first_seen = False
+        self.__found_full_stop = False
+        self.__upper_count = 0
+
+    def decapitalize(self, text: str) -> (DecapitalizedText, DeviationsPositions):
+        if not text:
+            return text, []
+
+        classes = self.__classify(text)
+
+        # The rule state becomes a made-up past: a full stop, or the upper case letters in a row
+        context = FULL_STOP if self.__found_full_stop else UPPER_LETTER * self.__upper_count
+        reversed_classes = (context + classes)[::-1]
+
+        # Matches inside the made-up context are not symbols of text
+        deviations_positions = [
+            len(text) - match.start()
+            for match in _REVERSED_DEVIATION.finditer(reversed_classes)
+            if match.start() < len(text)
+        ]
+        deviations_positions.reverse()
+
+        if not self.__first_seen:
+            first_is_deviation = classes[0] not in (UPPER_LETTER, UPPER_OTHER)
+            if deviations_positions and deviations_positions[0] == 1:
+                deviations_positions.pop(0)
+            if first_is_deviation:
+                deviations_positions.insert(0, 1)
+
+        self.__update_state(context + classes)
+
+        return text.translate(self.__lowered), deviations_positions
+
+    def capitalize(self, text: DecapitalizedText, deviations: DeviationsPositions) -> str:
+        deviations = set(deviations)
+        classes = self.__classify(text)
+        capitalized = []
+
+        first_seen = self.__first_seen
+        found_full_stop = self.__found_full_stop
+        upper_count = self.__upper_count
+
+        for index, (symbol, symbol_class) in enumerate(zip(text, classes), start=1):
+            matched = False
+            deviation = False
+
+            if not first_seen:
+                matched = True
+                deviation = symbol_class not in (UPPER_LETTER, UPPER_OTHER)
+
+            if found_full_stop and symbol_class in (UPPER_LETTER, LOWER_LETTER, CASELESS_LETTER):
+                matched = True
+                deviation = deviation or symbol_class != UPPER_LETTER
+
+            if upper_count == 2 and symbol_class in (UPPER_LETTER, LOWER_LETTER, CASELESS_LETTER):
+                matched = True
+                deviation = deviation or symbol_class == LOWER_LETTER
+
+            if not matched and index in deviations or deviation and index not in deviations:
+                symbol = symbol.upper()
+                symbol_class = classify(symbol)
+
+            capitalized.append(symbol)
+
+            first_seen = True
+            if symbol_class == FULL_STOP:
+                found_full_stop = True
+            elif symbol_class != SPACE:
+                found_full_stop = False
+
+            if symbol_class in (UPPER_LETTER, CASELESS_LETTER):
+                upper_count = min(upper_count + 1, 2)
+            else:
+                upper_count = 0
+
+        self.__first_seen = first_seen
+        self.__found_full_stop = found_full_stop
+        self.__upper_count = upper_count
+
+        return ''.join(capitalized)
+
+    def __classify(self, text: str) -> str:
+        classes = self.__classes
+
+        for symbol in set(text):
+            if ord(symbol) not in classes:
+                classes[ord(symbol)] = classify(symbol)
+                self.__lowered[ord(symbol)] = lower_symbol(symbol)
+
+        return text.translate(classes)
+
+    def __update_state(self, classes: str):
+        self.__first_seen = True
+
+        last_not_space = classes.rstrip(SPACE)[-1:]
+        self.__found_full_stop = last_not_space == FULL_STOP
+
+        tail = classes[-2:]
+        upper_count = 0
+        for symbol_class in reversed(tail):
+            if symbol_class not in (UPPER_LETTER, CASELESS_LETTER):
+                break
+            upper_count += 1
+        self.__upper_count = upper_count
@@ -0,0 +1,126 @@
+"""
+Container for deflate-like compressed text that remembers whether it was decapitalized.
+
+    header:  magic b'DLC', version, flags, window size (big-endian uint32)
+    payload: deflate-like stream of the (decapitalized) text
+    if FLAG_DECAPITALIZED:
+             deflate-like stream of the gap-coded deviation positions,
+             its length in bytes (big-endian uint32)
+
+Both streams end on a byte boundary. The deviations are only known once the whole text has
+been seen, so they go last and are found from the end of the container.
+"""
+import struct
+from typing import Optional
+
+from deflate.decoder import DeflateLikeDecoder
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.stats import EncoderStats
+from deflate.stream_encoder import DeflateLikeStreamEncoder
+
+from .deviations import decode_deviations, encode_deviations
+from .stream import CapitalizingStream, DecapitalizingStream
+
+MAGIC = b'DLC'
+FORMAT_VERSION = 1
+FLAG_DECAPITALIZED = 0x01
+
+_HEADER = struct.Struct('>3sBBI')
+_DEVIATIONS_LENGTH = struct.Struct('>I')
+
+
+class TextEncoder:
+    """
+    Streaming encoder of the container, fed like DeflateLikeStreamEncoder.
+
+    With decapitalize=True the text is decapitalized on the fly and its deviations are
+    collected into a separate deflate-like stream, kept in memory until finish().
+    """
+
+    def __init__(
+            self,
+            window_size: int = 32768,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            decapitalize: bool = True,
+            stats: Optional[EncoderStats] = None,
+    ):
+        self.__text_encoder = DeflateLikeStreamEncoder(window_size, block_size, level, stats)
+        self.__header = _HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_DECAPITALIZED if decapitalize else 0, window_size)
+
+        self.__decapitalizer = None
+        if decapitalize:
+            self.__decapitalizer = DecapitalizingStream()
+            self.__deviations_encoder = DeflateLikeStreamEncoder(window_size, block_size, level, stats)
+            self.__deviations = bytearray()
+            self.__last_deviation = 0
+
+    def compress(self, data: bytes) -> bytes:
+        return self.__take_header() + self.__text_encoder.compress(self.__decapitalize(data))
+
+    def finish(self) -> bytes:
+        """Flush both streams and close the container; the encoder can't be used afterwards"""
+        text = self.__decapitalize(b'', final=True)
+        data = self.__take_header() + self.__text_encoder.compress(text) + self.__text_encoder.finish()
+
+        if self.__decapitalizer is None:
+            return data
+
+        self.__deviations += self.__deviations_encoder.finish()
+        return data + bytes(self.__deviations) + _DEVIATIONS_LENGTH.pack(len(self.__deviations))
+
+    def __decapitalize(self, data: bytes, final: bool = False) -> bytes:
+        if self.__decapitalizer is None:
+            return data
+
+        text, deviations = self.__decapitalizer.decapitalize(data, final)
+        if deviations:
+            encoded = encode_deviations(deviations, self.__last_deviation)
+            self.__deviations += self.__deviations_encoder.compress(encoded)
+            self.__last_deviation = deviations[-1]
+
+        return text
+
+    def __take_header(self) -> bytes:
+        header, self.__header = self.__header, b''
+        return header
+
+
+def compress(data: bytes, **encoder_kwargs) -> bytes:
+    encoder = TextEncoder(**encoder_kwargs)
+    return encoder.compress(data) + encoder.finish()
+
+
+def decompress(data: bytes) -> bytes:
+    """Decode a container, capitalizing the text back if it was decapitalized"""
+    if len(data) < _HEADER.size:
+        raise ValueError('Truncated container header')
+
+    magic, version, flags, window_size = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'Not a deflate-like text container: magic {magic!r}')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported container version {version}')
+
+    decoder = DeflateLikeDecoder(window_size)
+    payload = memoryview(data)[_HEADER.size:]
+
+    if not flags & FLAG_DECAPITALIZED:
+        return decoder.decode(bytes(payload))
+
+    if len(payload) < _DEVIATIONS_LENGTH.size:
+        raise ValueError('Truncated container trailer')
+
+    text_end = len(payload) - _DEVIATIONS_LENGTH.size
+    (deviations_length,) = _DEVIATIONS_LENGTH.unpack_from(payload, text_end)
+    text_end -= deviations_length
+    if text_end < 0:
+        raise ValueError(f'Deviations stream of {deviations_length} bytes does not fit the container')
+
+    deviations = decode_deviations(decoder.decode(bytes(payload[text_end: text_end + deviations_length])))
+    capitalizer = CapitalizingStream(deviations)
+
+    blocks = [capitalizer.capitalize(block) for block in decoder.iter_decode(bytes(payload[:text_end]))]
+    blocks.append(capitalizer.capitalize(b'', final=True))
+
+    return b''.join(blocks)
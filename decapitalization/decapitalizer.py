@@ -2,6 +2,20 @@ from .custom_types import Symbol, DeviationsPositions, DecapitalizedText
 from .rules import DecapitalizationRule, RuleCheckResult
 
 
+def lower_symbol(symbol: Symbol) -> Symbol:
+    """
+    symbol.lower() when capitalize can restore it with upper(), symbol itself otherwise.
+
+    Some symbols lower into several (İ) or don't upper back to themselves (Kelvin sign,
+    titlecase letters); they stay as they are, so positions and symbols survive the round trip.
+    """
+    lowered = symbol.lower()
+    if lowered == symbol or len(lowered) == 1 and lowered.upper() == symbol:
+        return lowered
+
+    return symbol
+
+
 class Decapitalizer:
     def __init__(self, rules: list[DecapitalizationRule]):
         self.__rules = rules
@@ -19,7 +33,7 @@ class Decapitalizer:
             ):
                 deviations_positions.append(position + 1)
 
-        return text.lower(), deviations_positions
+        return ''.join(map(lower_symbol, text)), deviations_positions
 
     def capitalize(self, text: DecapitalizedText, deviations: DeviationsPositions) -> str:
         deviations = set(deviations)
@@ -0,0 +1,56 @@
+"""
+Compact coding of deviation positions.
+
+Positions only grow, so each one is stored as the gap from the previous position in a
+LEB128 varint: 7 bits per byte, the high bit set on all bytes but the last. Deviations
+cluster (headings, abbreviations), so most gaps fit in one byte, and the repeating gaps are
+left for an entropy coder to squeeze further.
+"""
+from typing import Iterable
+
+from .custom_types import DeviationsPositions
+
+_VARINT_PAYLOAD_BITS = 7
+_VARINT_PAYLOAD_MASK = 0x7F
+_VARINT_CONTINUATION = 0x80
+
+
+def encode_deviations(positions: Iterable[int], previous: int = 0) -> bytes:
+    """Gap-code positions, previous being the last position already encoded in the stream"""
+    encoded = bytearray()
+
+    for position in positions:
+        if position <= previous:
+            raise ValueError(f'Deviation positions must grow, got {position} after {previous}')
+
+        gap = position - previous
+        previous = position
+
+        while gap > _VARINT_PAYLOAD_MASK:
+            encoded.append(gap & _VARINT_PAYLOAD_MASK | _VARINT_CONTINUATION)
+            gap >>= _VARINT_PAYLOAD_BITS
+        encoded.append(gap)
+
+    return bytes(encoded)
+
+
+def decode_deviations(data: bytes) -> DeviationsPositions:
+    positions = []
+    position = 0
+    gap = 0
+    shift = 0
+
+    for byte in data:
+        gap |= (byte & _VARINT_PAYLOAD_MASK) << shift
+        shift += _VARINT_PAYLOAD_BITS
+
+        if not byte & _VARINT_CONTINUATION:
+            position += gap
+            positions.append(position)
+            gap = 0
+            shift = 0
+
+    if shift:
+        raise ValueError('Truncated deviation positions')
+
+    return positions
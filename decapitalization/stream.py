@@ -0,0 +1,65 @@
+"""
+Decapitalization of UTF-8 input fed in chunks of any size.
+
+The rule state lives in the decapitalizer and the bytes of a character cut by a chunk
+boundary wait in an incremental decoder, so the result does not depend on where the input
+is cut. Deviation positions count symbols from the start of the stream.
+"""
+import codecs
+from collections import deque
+from typing import Iterable, Optional, Union
+
+from .compiled import CompiledDecapitalizer
+from .custom_types import DeviationsPositions
+from .decapitalizer import Decapitalizer
+
+_DECAPITALIZER_T = Union[Decapitalizer, CompiledDecapitalizer]
+
+
+class DecapitalizingStream:
+    def __init__(self, decapitalizer: Optional[_DECAPITALIZER_T] = None, encoding: str = 'utf-8'):
+        self.__decapitalizer = decapitalizer or CompiledDecapitalizer()
+        self.__decoder = codecs.getincrementaldecoder(encoding)()
+        self.__encoding = encoding
+        self.__position = 0
+
+    def decapitalize(self, data: bytes, final: bool = False) -> tuple[bytes, DeviationsPositions]:
+        """final=True rejects an incomplete character left at the end of the stream"""
+        text = self.__decoder.decode(data, final)
+        decapitalized, deviations = self.__decapitalizer.decapitalize(text)
+        if len(decapitalized) != len(text):
+            # Deviation positions would point at the wrong symbols
+            raise ValueError(f'Decapitalization turned {len(text)} symbols into {len(decapitalized)}')
+
+        position = self.__position
+        self.__position += len(text)
+
+        return decapitalized.encode(self.__encoding), [position + deviation for deviation in deviations]
+
+
+class CapitalizingStream:
+    """Reverse of DecapitalizingStream, given all deviation positions of the stream in order"""
+
+    def __init__(
+            self,
+            deviations: Iterable[int],
+            decapitalizer: Optional[_DECAPITALIZER_T] = None,
+            encoding: str = 'utf-8',
+    ):
+        self.__deviations = deque(deviations)
+        self.__decapitalizer = decapitalizer or CompiledDecapitalizer()
+        self.__decoder = codecs.getincrementaldecoder(encoding)()
+        self.__encoding = encoding
+        self.__position = 0
+
+    def capitalize(self, data: bytes, final: bool = False) -> bytes:
+        text = self.__decoder.decode(data, final)
+
+        position = self.__position
+        self.__position += len(text)
+
+        deviations = []
+        while self.__deviations and self.__deviations[0] <= self.__position:
+            deviations.append(self.__deviations.popleft() - position)
+
+        return self.__decapitalizer.capitalize(text, deviations).encode(self.__encoding)
@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+from deflate.bitio import BitWriter
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.parallel_encoder import compress_primed_chunk
+from deflate.stats import EncoderStats
+
+_SOURCE_T = Union[asyncio.StreamReader, AsyncIterable[bytes]]
+
+
+async def _read_pieces(source: _SOURCE_T, size: int) -> AsyncIterator[bytes]:
+    # Iterating a StreamReader yields lines, so it is read by size instead
+    if isinstance(source, asyncio.StreamReader):
+        while piece := await source.read(size):
+            yield piece
+        return
+
+    async for piece in source:
+        yield piece
+
+
+async def _read_chunks(source: _SOURCE_T, chunk_size: int) -> AsyncIterator[bytes]:
+    """source cut into chunks of chunk_size bytes, whatever sizes it comes in"""
+    pending = bytearray()
+
+    async for piece in _read_pieces(source, chunk_size):
+        pending += piece
+
+        while len(pending) >= chunk_size:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+
+    if pending:
+        yield bytes(pending)
+
+
+class AsyncDeflateEncoder:
+    """
+    parallel_compress for asyncio: chunks of an async byte stream are compressed on an
+    executor while the event loop keeps running.
+
+    Each chunk is primed with the window_size bytes before it, so the output is one
+    deflate-like stream, yielded in order as soon as the next chunk is done. At most
+    max_in_flight chunks are submitted and not yet consumed; reading the source waits
+    otherwise. Without an executor, the encoder starts a process pool on first use and
+    shuts it down in aclose(), or on leaving ``async with``.
+    """
+
+    def __init__(
+            self,
+            *,
+            chunk_size: int = 131072,
+            window_size: int = 32768,
+            level: int = DEFAULT_LEVEL,
+            block_size: Optional[int] = None,
+            executor: Optional[Executor] = None,
+            max_in_flight: Optional[int] = None,
+            stats: Optional[EncoderStats] = None,
+    ):
+        if chunk_size <= 0:
+            raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+
+        self.__chunk_size = chunk_size
+        self.__window_size = window_size
+        self.__executor = executor
+        self.__owns_executor = executor is None
+        self.__closed = False
+        self.__max_in_flight = max_in_flight or 2 * (os.cpu_count() or 1)
+        self.__stats = stats
+        self.__compress_function = functools.partial(
+            compress_primed_chunk,
+            window_size=window_size, level=level, block_size=block_size, collect_stats=stats is not None,
+        )
+
+    async def __aenter__(self) -> 'AsyncDeflateEncoder':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Shut down the process pool the encoder started, if any"""
+        self.__closed = True
+        executor, self.__executor = self.__executor, None
+
+        if self.__owns_executor and executor is not None:
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+    async def encode(self, data: bytes) -> bytes:
+        async def single_piece():
+            yield data
+
+        return b''.join([part async for part in self.compress(single_piece())])
+
+    async def compress(self, source: _SOURCE_T) -> AsyncIterator[bytes]:
+        """
+        Compressed bytes of source, the last byte zero padded.
+
+        Closing or cancelling the iteration cancels the chunks that haven't started yet.
+        """
+        if self.__closed:
+            raise ValueError('Encoder is closed')
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor()
+
+        # A slot is taken before a chunk is submitted and given back once its part is written
+        slots = asyncio.Semaphore(self.__max_in_flight)
+        in_flight = asyncio.Queue()
+        submitter = asyncio.create_task(self.__submit_chunks(source, self.__executor, slots, in_flight))
+        writer = BitWriter()
+
+        try:
+            while (future := await in_flight.get()) is not None:
+                part, chunk_stats, _ = await future
+                slots.release()
+                if self.__stats is not None:
+                    self.__stats.merge(chunk_stats)
+
+                writer.write_packed(part)
+                if data := writer.take_bytes():
+                    yield data
+
+            # Re-raises what went wrong while reading the source
+            await submitter
+
+            if tail := writer.getvalue().data:
+                yield tail
+        finally:
+            submitter.cancel()
+            while not in_flight.empty():
+                future = in_flight.get_nowait()
+                if future is not None:
+                    future.cancel()
+
+            await asyncio.gather(submitter, return_exceptions=True)
+
+    async def __submit_chunks(self, source: _SOURCE_T, executor: Executor, slots: asyncio.Semaphore, in_flight: asyncio.Queue):
+        """Queue a future per chunk, then None; waiting for a free slot holds reading back"""
+        loop = asyncio.get_running_loop()
+        history = b''
+
+        try:
+            async for chunk in _read_chunks(source, self.__chunk_size):
+                await slots.acquire()
+                in_flight.put_nowait(loop.run_in_executor(executor, self.__compress_function, history, chunk))
+                history = (history + chunk)[-self.__window_size:]
+        finally:
+            # Also on errors, so that the consumer stops waiting and awaits the submitter
+            in_flight.put_nowait(None)
@@ -0,0 +1,415 @@
+"""
+Reproducible compression benchmark.
+
+    python -m deflate.bench --output bench.json
+    python -m deflate.bench --baseline bench.json --tolerance 0.1
+
+Every (corpus, codec, level, window size) case runs in a freshly spawned process, so the
+reported peak RSS belongs to that case only. Synthetic corpora are generated from a fixed seed.
+Codecs with a format limited to 32 KiB windows (zlib, RFC 1951) cap larger window sizes.
+
+    python -m deflate.bench --codec deflate-like-decapitalized --window-size 16384 --window-size 65536
+"""
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import random
+import resource
+import struct
+import sys
+import time
+import zlib
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Optional
+
+from decapitalization import container as text_container
+from deflate.containers import ZlibEncoder
+from deflate.decoder import DeflateLikeDecoder
+from deflate.parallel_encoder import parallel_compress
+from deflate.rfc1951 import MAX_WINDOW_SIZE
+from deflate.seekable import SeekableEncoder, SeekableReader
+from deflate.stream_encoder import DeflateLikeStreamEncoder
+
+SAMPLES_GLOB = 'samples/*.txt'
+SYNTHETIC_SEED = 1951
+DEFAULT_SYNTHETIC_SIZE = 262144
+DEFAULT_LEVELS = (1, 6, 9)
+DEFAULT_WINDOW_SIZES = (32768,)
+DEFAULT_REPEAT = 1
+DEFAULT_TOLERANCE = 0.05
+
+# How often the parent checks that an isolated case is still running
+_CHILD_POLL_SECONDS = 1.0
+
+# A run too fast for the clock counts as one tick, which keeps throughputs finite (JSON has no Infinity)
+_CLOCK_RESOLUTION = time.get_clock_info('perf_counter').resolution
+# ru_maxrss is in bytes on macOS and in KiB elsewhere
+_MAXRSS_UNITS_PER_KIB = 1024 if sys.platform == 'darwin' else 1
+
+# compress(data, level, window_size) and decompress(data, window_size)
+_CODEC_T = tuple[Callable[[bytes, int, int], bytes], Callable[[bytes, int], bytes]]
+
+_MIN_ZLIB_WBITS = 9
+_MAX_ZLIB_WBITS = 15
+
+
+def _deflate_like_compress(data: bytes, level: int, window_size: int) -> bytes:
+    encoder = DeflateLikeStreamEncoder(window_size, level=level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _deflate_like_decompress(data: bytes, window_size: int) -> bytes:
+    return DeflateLikeDecoder(window_size).decode(data)
+
+
+def _deflate_like_parallel_compress(data: bytes, level: int, window_size: int) -> bytes:
+    # Includes the pool startup, like any one-shot caller would pay
+    return parallel_compress(data, window_size=window_size, level=level).data
+
+
+def _deflate_like_seekable_compress(data: bytes, level: int, window_size: int) -> bytes:
+    encoder = SeekableEncoder(window_size=window_size, level=level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _deflate_like_seekable_decompress(data: bytes, window_size: int) -> bytes:
+    return SeekableReader(data).read_all()
+
+
+def _deflate_like_decapitalized_compress(data: bytes, level: int, window_size: int) -> bytes:
+    try:
+        return text_container.compress(data, window_size=window_size, level=level)
+    except UnicodeDecodeError:
+        # Binary corpora are stored as they are, as the container allows
+        return text_container.compress(data, window_size=window_size, level=level, decapitalize=False)
+
+
+def _deflate_like_decapitalized_decompress(data: bytes, window_size: int) -> bytes:
+    return text_container.decompress(data)
+
+
+def _rfc1951_compress(data: bytes, level: int, window_size: int) -> bytes:
+    encoder = ZlibEncoder(min(window_size, MAX_WINDOW_SIZE), level=level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _stdlib_zlib_compress(data: bytes, level: int, window_size: int) -> bytes:
+    wbits = min(max(window_size.bit_length() - 1, _MIN_ZLIB_WBITS), _MAX_ZLIB_WBITS)
+    return zlib.compress(data, level, wbits)
+
+
+def _zlib_decompress(data: bytes, window_size: int) -> bytes:
+    # The zlib header tells the window
+    return zlib.decompress(data)
+
+
+# The RFC 1951 output is decompressed by the stdlib, as this project has no decoder for it
+CODECS: dict[str, _CODEC_T] = {
+    'deflate-like': (_deflate_like_compress, _deflate_like_decompress),
+    'deflate-like-decapitalized': (_deflate_like_decapitalized_compress, _deflate_like_decapitalized_decompress),
+    'deflate-like-parallel': (_deflate_like_parallel_compress, _deflate_like_decompress),
+    'deflate-like-seekable': (_deflate_like_seekable_compress, _deflate_like_seekable_decompress),
+    'rfc1951-zlib': (_rfc1951_compress, _zlib_decompress),
+    'stdlib-zlib': (_stdlib_zlib_compress, _zlib_decompress),
+}
+
+
+def _random_corpus(size: int) -> bytes:
+    return random.Random(SYNTHETIC_SEED).randbytes(size)
+
+
+def _repetitive_corpus(size: int) -> bytes:
+    phrase = b'The quick brown fox jumps over the lazy dog. '
+    return (phrase * (size // len(phrase) + 1))[:size]
+
+
+def _binary_corpus(size: int) -> bytes:
+    # Fixed-width records with slowly changing counters and a few random fields, like a
+    # typical columnar or telemetry dump
+    generator = random.Random(SYNTHETIC_SEED)
+    records = []
+    record_count = size // 16 + 1
+
+    for index in range(record_count):
+        records.append(struct.pack('<IIfHH', index, 1700000000 + index * 7, generator.gauss(20, 2), index % 64, generator.getrandbits(16)))
+
+    return b''.join(records)[:size]
+
+
+SYNTHETIC_CORPORA: dict[str, Callable[[int], bytes]] = {
+    'synthetic-random': _random_corpus,
+    'synthetic-repetitive': _repetitive_corpus,
+    'synthetic-binary': _binary_corpus,
+}
+
+
+@dataclass
+class BenchResult:
+    corpus: str
+    codec: str
+    level: int
+    window_size: int
+    input_size: int
+    compressed_size: int
+    ratio: float
+    compress_mb_s: float
+    decompress_mb_s: float
+    peak_rss_kib: int
+    round_trip_ok: bool
+    # Why the case couldn't run to the end; its metrics are zero then
+    error: Optional[str] = None
+
+
+@dataclass
+class BenchReport:
+    meta: dict
+    results: list[BenchResult] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps({'meta': self.meta, 'results': [asdict(r) for r in self.results]}, indent=2)
+
+
+def load_corpora(*, samples_glob: str = SAMPLES_GLOB, synthetic_size: int = DEFAULT_SYNTHETIC_SIZE, max_size: Optional[int] = None) -> dict[str, bytes]:
+    corpora = {}
+
+    for path in sorted(glob.glob(samples_glob)):
+        with open(path, 'rb') as f:
+            corpora[os.path.basename(path)] = f.read(max_size) if max_size else f.read()
+
+    for name, generate in SYNTHETIC_CORPORA.items():
+        corpora[name] = generate(min(synthetic_size, max_size) if max_size else synthetic_size)
+
+    return corpora
+
+
+def _megabytes_per_second(size: int, seconds: float) -> float:
+    return round(size / max(seconds, _CLOCK_RESOLUTION) / 1e6, 3)
+
+
+def _peak_rss_kib() -> int:
+    # Pool workers of the parallel codec count as well: the largest of them, not their sum
+    peak_rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return peak_rss // _MAXRSS_UNITS_PER_KIB
+
+
+def _best_time(function: Callable, repeat: int):
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+def _run_case(corpus_name: str, data: bytes, codec_name: str, level: int, window_size: int, repeat: int) -> BenchResult:
+    compress, decompress = CODECS[codec_name]
+
+    compressed, compress_seconds = _best_time(lambda: compress(data, level, window_size), repeat)
+    decompressed, decompress_seconds = _best_time(lambda: decompress(compressed, window_size), repeat)
+
+    return BenchResult(
+        corpus=corpus_name,
+        codec=codec_name,
+        level=level,
+        window_size=window_size,
+        input_size=len(data),
+        compressed_size=len(compressed),
+        ratio=round(len(data) / len(compressed), 4) if compressed else 0.0,
+        compress_mb_s=_megabytes_per_second(len(data), compress_seconds),
+        decompress_mb_s=_megabytes_per_second(len(data), decompress_seconds),
+        peak_rss_kib=_peak_rss_kib(),
+        round_trip_ok=decompressed == data,
+    )
+
+
+def _failed_result(corpus_name: str, data: bytes, codec_name: str, level: int, window_size: int, error: str) -> BenchResult:
+    return BenchResult(
+        corpus=corpus_name,
+        codec=codec_name,
+        level=level,
+        window_size=window_size,
+        input_size=len(data),
+        compressed_size=0,
+        ratio=0.0,
+        compress_mb_s=0.0,
+        decompress_mb_s=0.0,
+        peak_rss_kib=0,
+        round_trip_ok=False,
+        error=error,
+    )
+
+
+def _run_case_safely(corpus_name: str, data: bytes, codec_name: str, level: int, window_size: int, repeat: int) -> BenchResult:
+    try:
+        return _run_case(corpus_name, data, codec_name, level, window_size, repeat)
+    except Exception as e:
+        return _failed_result(corpus_name, data, codec_name, level, window_size, f'{type(e).__name__}: {e}')
+
+
+def _run_case_in_child(queue, *args):
+    queue.put(_run_case_safely(*args))
+
+
+def _child_result(queue, process, case: tuple) -> BenchResult:
+    """The result the child puts on queue, or a failed one if it dies without one"""
+    while True:
+        try:
+            return queue.get(timeout=_CHILD_POLL_SECONDS)
+        except queue_module.Empty:
+            if process.is_alive():
+                continue
+
+        # The result may have been flushed right before the child exited
+        try:
+            return queue.get(timeout=_CHILD_POLL_SECONDS)
+        except queue_module.Empty:
+            corpus_name, data, codec_name, level, window_size, _ = case
+            return _failed_result(corpus_name, data, codec_name, level, window_size, f'Exited with code {process.exitcode}')
+
+
+def run(
+        corpora: dict[str, bytes],
+        codecs: list[str],
+        levels: list[int],
+        window_sizes: tuple[int, ...] = DEFAULT_WINDOW_SIZES,
+        *,
+        repeat: int = DEFAULT_REPEAT,
+        isolate: bool = True,
+) -> BenchReport:
+    report = BenchReport(meta={
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'zlib': zlib.ZLIB_RUNTIME_VERSION,
+        'repeat': repeat,
+        'isolated': isolate,
+    })
+
+    context = multiprocessing.get_context('spawn')
+
+    cases = itertools.product(corpora.items(), codecs, levels, window_sizes)
+
+    for (corpus_name, data), codec_name, level, window_size in cases:
+        case = (corpus_name, data, codec_name, level, window_size, repeat)
+
+        if isolate:
+            queue = context.Queue()
+            process = context.Process(target=_run_case_in_child, args=(queue, *case))
+            process.start()
+            result = _child_result(queue, process, case)
+            process.join()
+        else:
+            result = _run_case_safely(*case)
+
+        label = f'{corpus_name:<34} {codec_name:<26} level={level} window={window_size:<6}'
+
+        if result.error is not None:
+            print(f'{label} FAILED {result.error}', file=sys.stderr)
+            report.results.append(result)
+            continue
+
+        print(
+            f'{label} ratio={result.ratio:<8} '
+            f'compress={result.compress_mb_s} MB/s decompress={result.decompress_mb_s} MB/s '
+            f'rss={result.peak_rss_kib} KiB',
+            file=sys.stderr,
+        )
+        report.results.append(result)
+
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Human-readable regressions of report against baseline, beyond the relative tolerance"""
+    baseline_results = {_case_key(r): r for r in baseline['results']}
+
+    regressions = []
+
+    for result in report['results']:
+        key = _case_key(result)
+        if key not in baseline_results:
+            continue
+
+        previous = baseline_results[key]
+
+        if result.get('error'):
+            regressions.append(f'{key}: failed with {result["error"]}')
+            continue
+
+        if not result['round_trip_ok']:
+            regressions.append(f'{key}: round trip failed')
+
+        for metric in ('ratio', 'compress_mb_s', 'decompress_mb_s'):
+            if result[metric] < previous[metric] * (1 - tolerance):
+                regressions.append(f'{key}: {metric} {previous[metric]} -> {result[metric]}')
+
+        if result['peak_rss_kib'] > previous['peak_rss_kib'] * (1 + tolerance):
+            regressions.append(f'{key}: peak_rss_kib {previous["peak_rss_kib"]} -> {result["peak_rss_kib"]}')
+
+    return regressions
+
+
+def _case_key(result: dict) -> tuple:
+    # Reports written before window sizes were benchmarked used the default window
+    return result['corpus'], result['codec'], result['level'], result.get('window_size', DEFAULT_WINDOW_SIZES[0])
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--codec', action='append', choices=sorted(CODECS), help='codecs to run (default: all)')
+    parser.add_argument('--level', action='append', type=int, help=f'levels to run (default: {DEFAULT_LEVELS})')
+    parser.add_argument('--window-size', action='append', type=int, help=f'window sizes to run (default: {DEFAULT_WINDOW_SIZES})')
+    parser.add_argument('--corpus', action='append', help='run only these corpora (default: all)')
+    parser.add_argument('--samples', default=SAMPLES_GLOB, help='glob of file corpora')
+    parser.add_argument('--synthetic-size', type=int, default=DEFAULT_SYNTHETIC_SIZE)
+    parser.add_argument('--max-size', type=int, help='truncate every corpus to this many bytes')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='report the best of N runs')
+    parser.add_argument('--no-isolate', action='store_true', help='run cases in this process (RSS becomes cumulative)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report to compare against; regressions give exit code 1')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    corpora = load_corpora(samples_glob=args.samples, synthetic_size=args.synthetic_size, max_size=args.max_size)
+    if args.corpus:
+        corpora = {name: data for name, data in corpora.items() if name in args.corpus}
+
+    report = run(
+        corpora,
+        args.codec or sorted(CODECS),
+        args.level or list(DEFAULT_LEVELS),
+        tuple(args.window_size or DEFAULT_WINDOW_SIZES),
+        repeat=args.repeat,
+        isolate=not args.no_isolate,
+    )
+    report_json = report.to_json()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(json.loads(report_json), json.load(f), args.tolerance)
+
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+from typing import NamedTuple, Optional
+
+_FLUSH_THRESHOLD_BITS = 64
+_REFILL_BYTES = 8
+
+
+class PackedBits(NamedTuple):
+    data: bytes
+    bit_count: int
+
+    def to_bit_string(self) -> str:
+        if not self.bit_count:
+            return ''
+
+        return '{:0{}b}'.format(int.from_bytes(self.data, 'big'), len(self.data) * 8)[:self.bit_count]
+
+
+class BitWriter:
+    """
+    MSB-first bit packer: the bit string '10110' is stored as the byte 0b10110000.
+
+    Bits are collected in an integer accumulator and moved to the bytearray in whole bytes.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+        self.__accumulator = 0
+        self.__accumulator_bits = 0
+        self.__taken_bytes = 0
+
+    def __len__(self) -> int:
+        return self.bit_count
+
+    @property
+    def bit_count(self) -> int:
+        """Bits written since creation, including the ones already taken"""
+        return (self.__taken_bytes + len(self.__buffer)) * 8 + self.__accumulator_bits
+
+    def write(self, value: int, bit_count: int):
+        self.__accumulator = (self.__accumulator << bit_count) | value
+        self.__accumulator_bits += bit_count
+
+        if self.__accumulator_bits >= _FLUSH_THRESHOLD_BITS:
+            self.__flush_whole_bytes()
+
+    def write_bit_string(self, bits: str):
+        if bits:
+            self.write(int(bits, 2), len(bits))
+
+    def write_bytes(self, data: bytes):
+        """Whole bytes at any bit position, shifted in one big integer operation"""
+        if not self.__accumulator_bits % 8:
+            self.__flush_whole_bytes()
+            self.__buffer += data
+            return
+
+        self.write(int.from_bytes(data, 'big'), len(data) * 8)
+
+    def write_packed(self, packed: PackedBits):
+        data, bit_count = packed
+        if not bit_count:
+            return
+
+        padding = len(data) * 8 - bit_count
+        self.write(int.from_bytes(data, 'big') >> padding, bit_count)
+
+    def getvalue(self) -> PackedBits:
+        """Bits not taken yet, the last byte padded with zeros"""
+        padding = -self.__accumulator_bits % 8
+        tail_bytes = (self.__accumulator_bits + padding) // 8
+        tail = (self.__accumulator << padding).to_bytes(tail_bytes, 'big')
+
+        return PackedBits(bytes(self.__buffer) + tail, len(self.__buffer) * 8 + self.__accumulator_bits)
+
+    def take_bytes(self) -> bytes:
+        """Remove and return the complete bytes written so far; a partial last byte stays"""
+        self.__flush_whole_bytes()
+
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__taken_bytes += len(data)
+
+        return data
+
+    def to_bit_string(self) -> str:
+        return self.getvalue().to_bit_string()
+
+    def __flush_whole_bytes(self):
+        remainder_bits = self.__accumulator_bits % 8
+        whole_bytes = self.__accumulator_bits // 8
+
+        self.__buffer += (self.__accumulator >> remainder_bits).to_bytes(whole_bytes, 'big')
+        self.__accumulator &= (1 << remainder_bits) - 1
+        self.__accumulator_bits = remainder_bits
+
+
+class LsbBitWriter:
+    """
+    LSB-first bit packer of RFC 1951: values fill each byte starting from its lowest bit.
+
+    Huffman codes must be bit-reversed by the caller, as they are sent starting from their first bit.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+        self.__accumulator = 0
+        self.__accumulator_bits = 0
+        self.__taken_bytes = 0
+
+    def __len__(self) -> int:
+        return self.bit_count
+
+    @property
+    def bit_count(self) -> int:
+        return (self.__taken_bytes + len(self.__buffer)) * 8 + self.__accumulator_bits
+
+    def write(self, value: int, bit_count: int):
+        self.__accumulator |= value << self.__accumulator_bits
+        self.__accumulator_bits += bit_count
+
+        if self.__accumulator_bits >= _FLUSH_THRESHOLD_BITS:
+            self.__flush_whole_bytes()
+
+    def align_to_byte(self):
+        self.__accumulator_bits += -self.__accumulator_bits % 8
+
+    def write_bytes(self, data: bytes):
+        if self.__accumulator_bits % 8:
+            raise ValueError('Raw bytes can only be written at a byte boundary')
+
+        self.__flush_whole_bytes()
+        self.__buffer += data
+
+    def getvalue(self) -> bytes:
+        """Bytes not taken yet, the last byte padded with zeros"""
+        tail_bytes = (self.__accumulator_bits + 7) // 8
+        return bytes(self.__buffer) + self.__accumulator.to_bytes(tail_bytes, 'little')
+
+    def take_bytes(self) -> bytes:
+        """Remove and return the complete bytes written so far; a partial last byte stays"""
+        self.__flush_whole_bytes()
+
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__taken_bytes += len(data)
+
+        return data
+
+    def __flush_whole_bytes(self):
+        whole_bytes = self.__accumulator_bits // 8
+
+        self.__buffer += (self.__accumulator & ((1 << (whole_bytes * 8)) - 1)).to_bytes(whole_bytes, 'little')
+        self.__accumulator >>= whole_bytes * 8
+        self.__accumulator_bits -= whole_bytes * 8
+
+
+class BitReader:
+    """
+    MSB-first counterpart of BitWriter.
+
+    Reading past the last bit yields zeros from peek(); consuming them raises EOFError.
+    """
+
+    def __init__(self, data: bytes, bit_count: Optional[int] = None):
+        self.__data = data
+        self.__bit_count = len(data) * 8 if bit_count is None else bit_count
+        self.__next_byte = 0
+        self.__accumulator = 0
+        self.__accumulator_bits = 0
+
+    @property
+    def position(self) -> int:
+        """Number of bits consumed so far"""
+        return self.__next_byte * 8 - self.__accumulator_bits
+
+    @property
+    def bits_remaining(self) -> int:
+        return self.__bit_count - self.position
+
+    def peek(self, bit_count: int) -> int:
+        if self.__accumulator_bits < bit_count:
+            self.__refill(bit_count)
+
+        return (self.__accumulator >> (self.__accumulator_bits - bit_count)) & ((1 << bit_count) - 1)
+
+    def skip(self, bit_count: int):
+        if self.__accumulator_bits < bit_count:
+            self.__refill(bit_count)
+
+        self.__accumulator_bits -= bit_count
+        self.__accumulator &= (1 << self.__accumulator_bits) - 1
+
+        if self.__next_byte * 8 - self.__accumulator_bits > self.__bit_count:
+            raise EOFError('Unexpected end of bit stream')
+
+    def read(self, bit_count: int) -> int:
+        value = self.peek(bit_count)
+        self.skip(bit_count)
+        return value
+
+    def read_bytes(self, byte_count: int) -> bytes:
+        return self.read(byte_count * 8).to_bytes(byte_count, 'big')
+
+    def __refill(self, bit_count: int):
+        wanted_bytes = max(_REFILL_BYTES, (bit_count - self.__accumulator_bits + 7) // 8)
+        chunk = self.__data[self.__next_byte: self.__next_byte + wanted_bytes]
+
+        # Zero padding past the end keeps peek() usable for the last codes of the stream
+        self.__accumulator = (self.__accumulator << (wanted_bytes * 8)) | (
+            int.from_bytes(chunk, 'big') << ((wanted_bytes - len(chunk)) * 8)
+        )
+        self.__accumulator_bits += wanted_bytes * 8
+        self.__next_byte += wanted_bytes
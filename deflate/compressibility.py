@@ -0,0 +1,63 @@
+"""
+Cheap look at a chunk before the match search, in the spirit of the btrfs compression heuristic.
+
+A few evenly spaced slices are checked for their byte entropy and for repeated 4-byte
+strings. Random or already compressed data has close to 8 bits of entropy and no repeats,
+so neither LZSS nor Huffman coding can win anything worth the time spent on it.
+"""
+import math
+from collections import Counter
+from enum import Enum, auto
+
+PROBE_SLICE_COUNT = 64
+PROBE_SLICE_LENGTH = 64
+# Shorter chunks are cheap enough to go through the regular path
+MIN_PROBE_LENGTH = 2 * PROBE_SLICE_COUNT * PROBE_SLICE_LENGTH
+
+_REPEAT_KEY_LENGTH = 4
+
+INCOMPRESSIBLE_MIN_ENTROPY = 7.8
+INCOMPRESSIBLE_MAX_REPEATS = 0.01
+MARGINAL_MAX_REPEATS = 0.05
+
+# The marginal match search gives up after this share of the level's chain length
+MARGINAL_CHAIN_LENGTH_SHIFT = 3
+
+
+class Compressibility(Enum):
+    INCOMPRESSIBLE = auto()
+    MARGINAL = auto()
+    COMPRESSIBLE = auto()
+
+
+def probe(data: bytes) -> Compressibility:
+    if len(data) < MIN_PROBE_LENGTH:
+        return Compressibility.COMPRESSIBLE
+
+    step = len(data) // PROBE_SLICE_COUNT
+    slices = [data[start: start + PROBE_SLICE_LENGTH] for start in range(0, step * PROBE_SLICE_COUNT, step)]
+
+    keys = [
+        piece[index: index + _REPEAT_KEY_LENGTH]
+        for piece in slices
+        for index in range(PROBE_SLICE_LENGTH - _REPEAT_KEY_LENGTH + 1)
+    ]
+    repeats = 1 - len(set(keys)) / len(keys)
+
+    if repeats >= MARGINAL_MAX_REPEATS:
+        return Compressibility.COMPRESSIBLE
+
+    if repeats < INCOMPRESSIBLE_MAX_REPEATS and _entropy(Counter(b''.join(slices))) >= INCOMPRESSIBLE_MIN_ENTROPY:
+        return Compressibility.INCOMPRESSIBLE
+
+    return Compressibility.MARGINAL
+
+
+def marginal_chain_length(max_chain_length: int) -> int:
+    return max(1, max_chain_length >> MARGINAL_CHAIN_LENGTH_SHIFT)
+
+
+def _entropy(counts: Counter) -> float:
+    """Order-0 entropy in bits per symbol"""
+    total = sum(counts.values())
+    return -sum(count / total * math.log2(count / total) for count in counts.values())
@@ -0,0 +1,132 @@
+import struct
+import zlib
+from enum import Enum
+from typing import Optional
+
+from deflate.dictionary import dictionary_id
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.rfc1951 import RawDeflateEncoder, MAX_WINDOW_SIZE
+from deflate.stats import EncoderStats
+
+ZLIB_DEFLATE_METHOD = 8
+ZLIB_PRESET_DICTIONARY_FLAG = 0x20
+
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_DEFLATE_METHOD = 8
+GZIP_UNKNOWN_OS = 255
+
+
+class Container(Enum):
+    RAW = 'raw'
+    ZLIB = 'zlib'
+    GZIP = 'gzip'
+
+
+def _zlib_level_flag(level: int) -> int:
+    # FLEVEL of RFC 1950: fastest, fast, default, maximum compression
+    if level < 2:
+        return 0
+    if level < 6:
+        return 1
+    if level == 6:
+        return 2
+    return 3
+
+
+def _gzip_extra_flags(level: int) -> int:
+    # XFL of RFC 1952: 2 - maximum compression, 4 - fastest algorithm
+    if level >= 9:
+        return 2
+    if level == 1:
+        return 4
+    return 0
+
+
+class ZlibEncoder:
+    """RFC 1950 framing with an incrementally updated Adler-32, and FDICT for a preset dictionary"""
+
+    def __init__(
+            self,
+            window_size: int = MAX_WINDOW_SIZE,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+            dictionary: Optional[bytes] = None,
+    ):
+        self.__deflate = RawDeflateEncoder(window_size, block_size, level, stats, dictionary)
+        self.__header = self.__build_header(window_size, level, dictionary)
+        self.__adler32 = 1
+
+    def compress(self, data: bytes) -> bytes:
+        self.__adler32 = zlib.adler32(data, self.__adler32)
+        return self.__take_header() + self.__deflate.compress(data)
+
+    def flush(self) -> bytes:
+        return self.__take_header() + self.__deflate.flush()
+
+    def finish(self) -> bytes:
+        return self.__take_header() + self.__deflate.finish() + struct.pack('>I', self.__adler32)
+
+    def __take_header(self) -> bytes:
+        header, self.__header = self.__header, b''
+        return header
+
+    @staticmethod
+    def __build_header(window_size: int, level: int, dictionary: Optional[bytes]) -> bytes:
+        window_bits = max(8, (window_size - 1).bit_length())
+        cmf = (window_bits - 8) << 4 | ZLIB_DEFLATE_METHOD
+        flg = _zlib_level_flag(level) << 6
+        if dictionary:
+            flg |= ZLIB_PRESET_DICTIONARY_FLAG
+        flg |= -(cmf * 256 + flg) % 31
+
+        if dictionary:
+            return bytes((cmf, flg)) + struct.pack('>I', dictionary_id(dictionary))
+
+        return bytes((cmf, flg))
+
+
+class GzipEncoder:
+    """RFC 1952 framing with an incrementally updated CRC-32 and input size"""
+
+    def __init__(
+            self,
+            window_size: int = MAX_WINDOW_SIZE,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+    ):
+        self.__deflate = RawDeflateEncoder(window_size, block_size, level, stats)
+        self.__header = GZIP_MAGIC + struct.pack(
+            '<BBIBB', GZIP_DEFLATE_METHOD, 0, 0, _gzip_extra_flags(level), GZIP_UNKNOWN_OS,
+        )
+        self.__crc32 = 0
+        self.__size = 0
+
+    def compress(self, data: bytes) -> bytes:
+        self.__crc32 = zlib.crc32(data, self.__crc32)
+        self.__size += len(data)
+        return self.__take_header() + self.__deflate.compress(data)
+
+    def flush(self) -> bytes:
+        return self.__take_header() + self.__deflate.flush()
+
+    def finish(self) -> bytes:
+        trailer = struct.pack('<II', self.__crc32, self.__size & 0xFFFFFFFF)
+        return self.__take_header() + self.__deflate.finish() + trailer
+
+    def __take_header(self) -> bytes:
+        header, self.__header = self.__header, b''
+        return header
+
+
+_ENCODERS = {
+    Container.RAW: RawDeflateEncoder,
+    Container.ZLIB: ZlibEncoder,
+    Container.GZIP: GzipEncoder,
+}
+
+
+def compress(data: bytes, container: Container = Container.ZLIB, **encoder_kwargs) -> bytes:
+    encoder = _ENCODERS[container](**encoder_kwargs)
+    return encoder.compress(data) + encoder.finish()
@@ -0,0 +1,197 @@
+import logging
+from array import array
+from typing import Iterator, Optional, Union
+
+from deflate.bitio import BitReader, PackedBits
+from deflate.encoder import (
+    BTYPE_BITS, BLOCK_LENGTH_BITS, NON_COMPRESSED_BITS_PER_BYTE, NON_COMPRESSED_BTYPE, FIXED_HUFFMAN_BTYPE,
+    COMPRESSED_HUFFMAN_BTYPE, PRESET_DICTIONARY_BTYPE,
+)
+from deflate.dictionary import dictionary_id
+from deflate.huffman.huffman import Codec, HuffmanLookupTable
+from deflate.huffman_encoder import END_OF_BLOCK, MATCH_FLAG, FIXED_LITERAL_LENGTH_CODEC, FIXED_OFFSET_CODEC
+from deflate.tables import FIRST_LENGTH_CODE, LENGTH_BASES, LENGTH_EXTRA_BITS, OFFSET_CODE_TABLE
+
+logger = logging.getLogger(__name__)
+
+_ENCODED_T = Union[PackedBits, bytes]
+_HISTORY_T = Union[bytes, bytearray, array]
+
+_FIXED_LITERAL_LENGTH_TABLE = HuffmanLookupTable.from_codec(FIXED_LITERAL_LENGTH_CODEC)
+_FIXED_OFFSET_TABLE = HuffmanLookupTable.from_codec(FIXED_OFFSET_CODEC)
+
+_LENGTH_CODE_COUNT = len(LENGTH_BASES)
+_OFFSET_CODE_COUNT = len(OFFSET_CODE_TABLE)
+
+
+class DeflateLikeDecoder:
+    def __init__(self, window_size: int = 32768, dictionary: Optional[bytes] = None):
+        """dictionary is only used by streams that ask for it by its id"""
+        self.__window_size = window_size
+        self.__dictionary = dictionary
+
+    def decode(self, encoded: _ENCODED_T, history: bytes = b'') -> bytes:
+        return b''.join(self.iter_decode(encoded, history))
+
+    def decode_into(self, encoded: _ENCODED_T, buffer: Union[bytearray, memoryview]) -> int:
+        """Decode into a caller-supplied buffer, returning the number of bytes written"""
+        view = memoryview(buffer)
+        written = 0
+
+        for block in self.iter_decode(encoded):
+            end = written + len(block)
+            if end > len(view):
+                raise ValueError(f'Output buffer of {len(view)} bytes is too small')
+
+            view[written: end] = block
+            written = end
+
+        return written
+
+    def iter_decode(self, encoded: _ENCODED_T, history: _HISTORY_T = b'') -> Iterator[Union[bytes, array]]:
+        """
+        Yield the decompressed content block by block.
+
+        history is the content the stream was primed with, e.g. by compress_chunk. It may
+        also be an array of stand-in symbols above 255, for decoding before the history is
+        known: blocks then come as arrays too, holding the stand-ins that matches copied.
+        """
+        if isinstance(encoded, PackedBits):
+            reader = BitReader(encoded.data, encoded.bit_count)
+        else:
+            reader = BitReader(encoded)
+
+        symbols = isinstance(history, array)
+        history = history[-self.__window_size:] if symbols else bytearray(history[-self.__window_size:])
+        stream_start = reader.position
+
+        # Whatever is shorter than a block header is the zero padding of the last byte
+        while reader.bits_remaining >= BTYPE_BITS + BLOCK_LENGTH_BITS:
+            block_type = reader.read(BTYPE_BITS)
+            block_bit_count = reader.read(BLOCK_LENGTH_BITS)
+
+            if block_type == PRESET_DICTIONARY_BTYPE:
+                if reader.position != stream_start + BTYPE_BITS + BLOCK_LENGTH_BITS:
+                    raise ValueError('Preset dictionary id after the start of the stream')
+
+                dictionary = self.__preset_dictionary(block_bit_count)[-self.__window_size:]
+                history = array(history.typecode, iter(dictionary)) if symbols else bytearray(dictionary)
+                continue
+
+            if block_type == NON_COMPRESSED_BTYPE:
+                block = self.__read_non_compressed_block(reader, block_bit_count)
+                if symbols:
+                    block = array(history.typecode, iter(block))
+            elif block_type == FIXED_HUFFMAN_BTYPE:
+                block = self.__read_fixed_huffman_block(reader, block_bit_count, history)
+            elif block_type == COMPRESSED_HUFFMAN_BTYPE:
+                block = self.__read_huffman_block(reader, block_bit_count, history)
+            else:
+                raise ValueError(f'Unknown block type {block_type:02b}')
+
+            logger.debug('Decoded block type=%s, size=%d', block_type, len(block))
+
+            yield block
+            history = (history + block)[-self.__window_size:]
+
+    def __preset_dictionary(self, expected_id: int) -> bytes:
+        if self.__dictionary is None:
+            raise ValueError(f'Stream needs the preset dictionary {expected_id:08x}')
+
+        if dictionary_id(self.__dictionary) != expected_id:
+            raise ValueError(
+                f'Stream needs the preset dictionary {expected_id:08x}, got {dictionary_id(self.__dictionary):08x}'
+            )
+
+        return self.__dictionary
+
+    @staticmethod
+    def __read_non_compressed_block(reader: BitReader, block_bit_count: int) -> bytes:
+        return reader.read_bytes(block_bit_count // NON_COMPRESSED_BITS_PER_BYTE)
+
+    @classmethod
+    def __read_fixed_huffman_block(cls, reader: BitReader, block_bit_count: int, history: _HISTORY_T) -> _HISTORY_T:
+        return cls.__read_tokens(
+            reader,
+            reader.position + block_bit_count,
+            FIXED_LITERAL_LENGTH_CODEC,
+            _FIXED_LITERAL_LENGTH_TABLE,
+            _FIXED_OFFSET_TABLE,
+            history,
+        )
+
+    @classmethod
+    def __read_huffman_block(cls, reader: BitReader, block_bit_count: int, history: _HISTORY_T) -> _HISTORY_T:
+        block_end = reader.position + block_bit_count
+
+        lengths_and_symbols_codec = Codec.read_bitwise(reader)
+        offset_codec = Codec.read_bitwise(reader)
+
+        return cls.__read_tokens(
+            reader,
+            block_end,
+            lengths_and_symbols_codec,
+            HuffmanLookupTable.from_codec(lengths_and_symbols_codec),
+            HuffmanLookupTable.from_codec(offset_codec),
+            history,
+        )
+
+    @staticmethod
+    def __read_tokens(
+            reader: BitReader,
+            block_end: int,
+            lengths_and_symbols_codec: Codec,
+            lengths_and_symbols_table: HuffmanLookupTable,
+            offset_table: HuffmanLookupTable,
+            history: _HISTORY_T,
+    ) -> _HISTORY_T:
+        read_length_or_symbol = lengths_and_symbols_table.read_symbol
+        read_offset_code = offset_table.read_symbol
+        read = reader.read
+
+        # The end-of-block code is written without a literal/match flag
+        if END_OF_BLOCK not in lengths_and_symbols_codec.bit_codes:
+            raise ValueError('Corrupted Huffman block: no end of block code')
+        tokens_end = block_end - lengths_and_symbols_codec.bit_codes[END_OF_BLOCK][1]
+
+        out = history[:]
+        block_start = len(out)
+
+        while reader.position < tokens_end:
+            if read(1) != MATCH_FLAG:
+                symbol = read_length_or_symbol(reader)
+                if symbol >= END_OF_BLOCK:
+                    raise ValueError(f'Invalid literal {symbol}')
+
+                out.append(symbol)
+                continue
+
+            length_code = read_length_or_symbol(reader) - FIRST_LENGTH_CODE
+            if not 0 <= length_code < _LENGTH_CODE_COUNT:
+                raise ValueError(f'Invalid length code {length_code + FIRST_LENGTH_CODE}')
+
+            length = LENGTH_BASES[length_code] + read(LENGTH_EXTRA_BITS[length_code])
+
+            offset_code = read_offset_code(reader)
+            if offset_code >= _OFFSET_CODE_COUNT:
+                raise ValueError(f'Invalid offset code {offset_code}')
+
+            offset_base, offset_extra_bits = OFFSET_CODE_TABLE[offset_code]
+            offset = offset_base + read(offset_extra_bits)
+
+            start = len(out) - offset
+            if start < 0:
+                raise ValueError(f'Offset {offset} points before the start of the stream')
+
+            if offset >= length:
+                out += out[start: start + length]
+            else:
+                out += (out[start:] * (length // offset + 1))[:length]
+
+        if read_length_or_symbol(reader) != END_OF_BLOCK or reader.position != block_end:
+            raise ValueError('Corrupted Huffman block: end of block not found')
+
+        if isinstance(out, array):
+            return out[block_start:]
+
+        return bytes(out[block_start:])
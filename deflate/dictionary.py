@@ -0,0 +1,131 @@
+"""
+Preset dictionaries for short messages.
+
+A dictionary primes the LZSS window before the first byte of a stream, so even a message of
+a few hundred bytes finds matches. Streams name their dictionary by dictionary_id(), the
+Adler-32 that zlib's FDICT uses as well.
+
+Training follows the idea of zstd's COVER: sample strings are scored by how many samples
+share their k-grams, the best segments are picked greedily without counting a k-gram twice,
+and the best ones go to the end of the dictionary, where offsets are the cheapest.
+
+    python -m deflate.dictionary samples/*.txt --record-size 512 --output samples.dict
+"""
+import argparse
+import heapq
+import sys
+import zlib
+from collections import Counter
+from typing import Iterable, Optional
+
+DEFAULT_DICTIONARY_SIZE = 16384
+DEFAULT_SEGMENT_LENGTH = 64
+DEFAULT_KGRAM_LENGTH = 6
+
+
+def dictionary_id(dictionary: bytes) -> int:
+    return zlib.adler32(dictionary)
+
+
+def train_dictionary(
+        samples: Iterable[bytes],
+        size: int = DEFAULT_DICTIONARY_SIZE,
+        *,
+        segment_length: int = DEFAULT_SEGMENT_LENGTH,
+        kgram_length: int = DEFAULT_KGRAM_LENGTH,
+) -> bytes:
+    """Pick up to size bytes of segments that the samples share most"""
+    if segment_length < kgram_length:
+        raise ValueError(f'segment_length must be at least kgram_length ({kgram_length}), got {segment_length}')
+
+    samples = [sample for sample in samples if len(sample) >= kgram_length]
+
+    # A k-gram counts once per sample: only what other messages share helps a new one
+    frequencies = Counter()
+    for sample in samples:
+        frequencies.update({sample[i: i + kgram_length] for i in range(len(sample) - kgram_length + 1)})
+
+    def kgrams(segment: bytes) -> set[bytes]:
+        return {
+            kgram
+            for kgram in (segment[i: i + kgram_length] for i in range(len(segment) - kgram_length + 1))
+            if frequencies[kgram] > 1
+        }
+
+    def score(segment_kgrams: set[bytes]) -> int:
+        return sum(frequencies[kgram] for kgram in segment_kgrams)
+
+    # Max-heap of (-score, order, segment); scores only drop as k-grams get covered, so a
+    # rescored segment that still beats the next best one is the best overall (lazy greedy)
+    candidates = []
+    for sample in samples:
+        for start in range(0, len(sample) - kgram_length + 1, segment_length):
+            segment = sample[start: start + segment_length]
+            segment_score = score(kgrams(segment))
+            if segment_score:
+                candidates.append((-segment_score, len(candidates), segment))
+    heapq.heapify(candidates)
+
+    chosen = []
+    chosen_size = 0
+
+    while candidates and chosen_size < size:
+        _, order, segment = heapq.heappop(candidates)
+        segment_kgrams = kgrams(segment)
+        segment_score = score(segment_kgrams)
+
+        if not segment_score:
+            continue
+
+        if candidates and segment_score < -candidates[0][0]:
+            heapq.heappush(candidates, (-segment_score, order, segment))
+            continue
+
+        chosen.append(segment)
+        chosen_size += len(segment)
+        for kgram in segment_kgrams:
+            frequencies[kgram] = 0
+
+    return b''.join(reversed(chosen))[-size:]
+
+
+def _split_records(data: bytes, record_size: int, split_lines: bool) -> list[bytes]:
+    if split_lines:
+        return data.splitlines(keepends=True)
+
+    if record_size:
+        return [data[start: start + record_size] for start in range(0, len(data), record_size)]
+
+    return [data]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m deflate.dictionary', description='Train a preset dictionary')
+    parser.add_argument('files', nargs='+', help='sample corpus')
+    parser.add_argument('--output', '-o', required=True, help='dictionary file to write')
+    parser.add_argument('--size', type=int, default=DEFAULT_DICTIONARY_SIZE, help='dictionary size in bytes')
+    parser.add_argument('--segment-length', type=int, default=DEFAULT_SEGMENT_LENGTH)
+    parser.add_argument('--kgram-length', type=int, default=DEFAULT_KGRAM_LENGTH)
+    records = parser.add_mutually_exclusive_group()
+    records.add_argument('--record-size', type=int, default=0, help='cut files into samples of this many bytes')
+    records.add_argument('--split-lines', action='store_true', help='every line is a sample')
+    args = parser.parse_args(argv)
+
+    samples = []
+    for file_path in args.files:
+        with open(file_path, 'rb') as f:
+            samples += _split_records(f.read(), args.record_size, args.split_lines)
+
+    dictionary = train_dictionary(
+        samples, args.size, segment_length=args.segment_length, kgram_length=args.kgram_length,
+    )
+
+    with open(args.output, 'wb') as f:
+        f.write(dictionary)
+
+    print(f'Dictionary of {len(dictionary)} bytes from {len(samples)} samples, id {dictionary_id(dictionary):08x}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,40 +1,216 @@
 import logging
+from dataclasses import dataclass
+from typing import Optional
 
-from deflate.huffman_encoder import DeflateHuffmanEncoder
+from deflate.bitio import BitWriter, PackedBits
+from deflate.compressibility import Compressibility, marginal_chain_length, probe
+from deflate.dictionary import dictionary_id
+from deflate.huffman.huffman import Codec
+from deflate.huffman_encoder import (
+    FIXED_LITERAL_LENGTH_CODEC, FIXED_OFFSET_CODEC, BlockStatistics, DeflateHuffmanEncoder,
+)
+from deflate.lzss.chunk_compressor import Lzss, LzssStreamCompressor
+from deflate.lzss.levels import DEFAULT_LEVEL, MatchStrategy, compression_level
+from deflate.lzss.tokens import TokenStream
+from deflate.stats import DYNAMIC_HUFFMAN_BLOCK, FIXED_HUFFMAN_BLOCK, STORED_BLOCK, EncoderStats, stage_timer
 
 
 logger = logging.getLogger(__name__)
 
-NON_COMPRESSED_BTYPE = '00'
-COMPRESSED_HUFFMAN_BTYPE = '10'
+NON_COMPRESSED_BTYPE = 0b00
+FIXED_HUFFMAN_BTYPE = 0b01
+COMPRESSED_HUFFMAN_BTYPE = 0b10
+# Not a block: the length field holds the dictionary_id of the preset dictionary. Only
+# the first header of a stream may be one, like FDICT in a zlib header.
+PRESET_DICTIONARY_BTYPE = 0b11
+
+BTYPE_BITS = 2
+BLOCK_LENGTH_BITS = 32
+BLOCK_HEADER_BITS = BTYPE_BITS + BLOCK_LENGTH_BITS
+NON_COMPRESSED_BITS_PER_BYTE = 8
+
+# The block splitter prices runs of this many tokens and merges neighbours unless
+# separate blocks come out smaller
+SPLIT_SEGMENT_TOKENS = 1024
+
+_BLOCK_TYPE_NAMES = {
+    NON_COMPRESSED_BTYPE: STORED_BLOCK,
+    FIXED_HUFFMAN_BTYPE: FIXED_HUFFMAN_BLOCK,
+    COMPRESSED_HUFFMAN_BTYPE: DYNAMIC_HUFFMAN_BLOCK,
+}
+
+
+@dataclass
+class _BlockPlan:
+    start: int
+    end: int
+    statistics: BlockStatistics
+    block_type: int
+    # Size of the block after its header
+    bit_count: int
+    codecs: Optional[tuple[Codec, Codec]]
+
+    @property
+    def cost(self) -> int:
+        return BLOCK_HEADER_BITS + self.bit_count
+
+
+def _plan_block(start: int, end: int, statistics: BlockStatistics) -> _BlockPlan:
+    """Cheapest block type for the tokens start..end, priced from their histograms alone"""
+    candidates = [(statistics.byte_count * NON_COMPRESSED_BITS_PER_BYTE, NON_COMPRESSED_BTYPE, None)]
+
+    fixed_codecs = (FIXED_LITERAL_LENGTH_CODEC, FIXED_OFFSET_CODEC)
+    fixed_bit_count = statistics.bit_count(fixed_codecs)
+    if fixed_bit_count is not None:
+        candidates.append((fixed_bit_count, FIXED_HUFFMAN_BTYPE, fixed_codecs))
+
+    dynamic_codecs = statistics.dynamic_codecs()
+    dynamic_bit_count = BlockStatistics.header_bit_count(dynamic_codecs) + statistics.bit_count(dynamic_codecs)
+    candidates.append((dynamic_bit_count, COMPRESSED_HUFFMAN_BTYPE, dynamic_codecs))
+
+    # On a tie the block type that is cheaper to decode wins
+    bit_count, block_type, codecs = min(candidates, key=lambda candidate: candidate[0])
+
+    return _BlockPlan(start, end, statistics, block_type, bit_count, codecs)
 
 
 class DeflateLikeEncoder:
-    def __init__(self, window_size: int = 32768):
-        self.__huffman_encoder = DeflateHuffmanEncoder(window_size)
+    def __init__(
+            self,
+            window_size: int = 32768,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+            dictionary: Optional[bytes] = None,
+    ):
+        self.__window_size = window_size
+        self.__level = compression_level(level)
+        self.__level_number = level
+        self.__stats = stats
+        self.__dictionary = dictionary or None
+        self.__huffman_encoder = DeflateHuffmanEncoder(window_size, level, stats)
 
     def encode(self, chunk: bytes) -> str:
-        huffman_encoded = self.__compress_huffman_block(chunk)
-        non_compressed = self.__non_compress_block(chunk)
+        """Debug view of encode_to_bytes: one '0'/'1' character per bit"""
+        return self.encode_to_bytes(chunk).to_bit_string()
+
+    def encode_to_bytes(self, chunk: bytes) -> PackedBits:
+        writer = BitWriter()
+        self.write(chunk, writer)
+        return writer.getvalue()
+
+    def write(self, chunk: bytes, writer: BitWriter):
+        self.write_chunk(chunk, self.start_stream(writer), writer)
+
+    def start_stream(self, writer: BitWriter) -> LzssStreamCompressor:
+        """LZSS compressor for a new stream, primed with the preset dictionary whose id goes to writer"""
+        lzss = Lzss(
+            window_size=self.__window_size, level=self.__level_number, dictionary=self.__dictionary, stats=self.__stats,
+        ).stream()
+
+        if self.__dictionary is not None:
+            writer.write(PRESET_DICTIONARY_BTYPE, BTYPE_BITS)
+            writer.write(dictionary_id(self.__dictionary), BLOCK_LENGTH_BITS)
+
+        return lzss
+
+    def write_chunk(self, chunk: bytes, lzss: LzssStreamCompressor, writer: BitWriter):
+        """
+        LZSS-compress chunk on lzss, which keeps the window of the stream, then write_block it.
+
+        A quick probe comes first: incompressible chunks skip the match search and go out
+        stored, marginal ones get a shorter match search.
+        """
+        if self.__level.strategy is MatchStrategy.LITERALS_ONLY:
+            lzss.skip(chunk)
+            self.__write_non_compressed_block(chunk, writer)
+            return
+
+        compressibility = probe(chunk)
+        if self.__stats is not None:
+            self.__stats.probe_results[compressibility.name.lower()] += 1
+
+        if compressibility is Compressibility.INCOMPRESSIBLE:
+            lzss.skip(chunk)
+            self.__write_non_compressed_block(chunk, writer)
+            return
+
+        max_chain_length = None
+        if compressibility is Compressibility.MARGINAL:
+            max_chain_length = marginal_chain_length(lzss.max_chain_length)
+
+        self.write_block(chunk, lzss.compress(chunk, max_chain_length=max_chain_length), writer)
+
+    def write_block(self, chunk: bytes, lzss_result: TokenStream, writer: BitWriter):
+        """
+        Write chunk given its LZSS tokens (which may refer to earlier blocks).
+
+        The tokens are split into blocks where their statistics change enough to pay for
+        another block header, and every block gets its cheapest type: stored, fixed
+        or dynamic Huffman.
+        """
+        if self.__level.strategy is MatchStrategy.LITERALS_ONLY:
+            self.__write_non_compressed_block(chunk, writer)
+            return
+
+        with stage_timer(self.__stats, 'tree_seconds'):
+            plans = self.__split(lzss_result)
+
+        chunk_position = 0
+
+        for plan in plans:
+            block_end = chunk_position + plan.statistics.byte_count
+            logger.debug('Block of %d tokens: type=%s, bits=%d', plan.end - plan.start, plan.block_type, plan.bit_count)
+
+            if plan.block_type == NON_COMPRESSED_BTYPE:
+                self.__write_non_compressed_block(chunk[chunk_position: block_end], writer)
+            else:
+                self.__write_huffman_block(plan, lzss_result, writer)
+
+            chunk_position = block_end
+
+    @staticmethod
+    def __split(lzss_result: TokenStream) -> list[_BlockPlan]:
+        plans = []
+        current = None
+
+        for start in range(0, len(lzss_result), SPLIT_SEGMENT_TOKENS) or range(1):
+            end = min(start + SPLIT_SEGMENT_TOKENS, len(lzss_result))
+            segment = _plan_block(start, end, BlockStatistics(lzss_result[start: end]))
+
+            if current is None:
+                current = segment
+                continue
+
+            merged = _plan_block(current.start, end, current.statistics + segment.statistics)
+            if merged.cost <= current.cost + segment.cost:
+                current = merged
+                continue
+
+            plans.append(current)
+            current = segment
+
+        plans.append(current)
+
+        return plans
 
-        logger.debug(f'{len(huffman_encoded)=}, {len(non_compressed)=}')
+    def __write_huffman_block(self, plan: _BlockPlan, lzss_result: TokenStream, writer: BitWriter):
+        with stage_timer(self.__stats, 'emit_seconds'):
+            writer.write(plan.block_type, BTYPE_BITS)
+            writer.write(plan.bit_count, BLOCK_LENGTH_BITS)
 
-        if len(huffman_encoded) < len(non_compressed):
-            logger.debug('Good encoded!')
-            return huffman_encoded
+            if plan.block_type == COMPRESSED_HUFFMAN_BTYPE:
+                self.__huffman_encoder.write_codecs(plan.codecs, writer)
 
-        logger.debug('Raw data :(')
-        return non_compressed
+            self.__huffman_encoder.write_tokens(lzss_result[plan.start: plan.end], plan.codecs, writer)
 
-    def __compress_huffman_block(self, chunk: bytes) -> str:
-        encoded_chunk_bits = self.__huffman_encoder.encode(chunk)
-        return COMPRESSED_HUFFMAN_BTYPE + '{:016b}'.format(len(encoded_chunk_bits)) + encoded_chunk_bits
+        if self.__stats is not None:
+            self.__stats.block_types[_BLOCK_TYPE_NAMES[plan.block_type]] += 1
 
-    def __non_compress_block(self, chunk: bytes) -> str:
-        bits_from_bytes = [
-            '{:016b}'.format(byte)
-            for byte in chunk
-        ]
+    def __write_non_compressed_block(self, chunk: bytes, writer: BitWriter):
+        with stage_timer(self.__stats, 'emit_seconds'):
+            writer.write(NON_COMPRESSED_BTYPE, BTYPE_BITS)
+            writer.write(len(chunk) * NON_COMPRESSED_BITS_PER_BYTE, BLOCK_LENGTH_BITS)
+            writer.write_bytes(chunk)
 
-        bits = ''.join(bits_from_bytes)
-        return NON_COMPRESSED_BTYPE + '{:016b}'.format(len(bits)) + bits
+        if self.__stats is not None:
+            self.__stats.block_types[STORED_BLOCK] += 1
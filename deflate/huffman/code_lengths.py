@@ -0,0 +1,131 @@
+from deflate.bitio import BitWriter, BitReader
+
+# Code length alphabet of RFC 1951, 3.2.7: 0..15 are literal lengths, the rest are runs
+REPEAT_PREVIOUS = 16
+REPEAT_ZERO_SHORT = 17
+REPEAT_ZERO_LONG = 18
+
+CODE_LENGTH_SYMBOL_BITS = 5
+CODE_LENGTH_COUNT_BITS = 9
+
+# symbol -> (extra bits, shortest run)
+RUN_EXTRA_BITS = {
+    REPEAT_PREVIOUS: (2, 3),
+    REPEAT_ZERO_SHORT: (3, 3),
+    REPEAT_ZERO_LONG: (7, 11),
+}
+
+_RLE_TOKEN_T = tuple[int, int]
+
+
+def run_length_encode(code_lengths: list[int]) -> list[_RLE_TOKEN_T]:
+    """Code lengths as (symbol, extra bits value) tokens of the code length alphabet"""
+    tokens = []
+    position = 0
+
+    while position < len(code_lengths):
+        length = code_lengths[position]
+        run = 1
+        while position + run < len(code_lengths) and code_lengths[position + run] == length:
+            run += 1
+
+        position += run
+
+        if length == 0:
+            while run >= 11:
+                step = min(run, 138)
+                tokens.append((REPEAT_ZERO_LONG, step - 11))
+                run -= step
+
+            if run >= 3:
+                tokens.append((REPEAT_ZERO_SHORT, run - 3))
+                run = 0
+
+            tokens.extend((0, 0) for _ in range(run))
+            continue
+
+        tokens.append((length, 0))
+        run -= 1
+
+        while run >= 3:
+            step = min(run, 6)
+            tokens.append((REPEAT_PREVIOUS, step - 3))
+            run -= step
+
+        tokens.extend((length, 0) for _ in range(run))
+
+    return tokens
+
+
+def run_length_decode(tokens: list[_RLE_TOKEN_T]) -> list[int]:
+    code_lengths = []
+
+    for symbol, extra in tokens:
+        if symbol < REPEAT_PREVIOUS:
+            code_lengths.append(symbol)
+            continue
+
+        _, shortest_run = RUN_EXTRA_BITS[symbol]
+        if symbol == REPEAT_PREVIOUS:
+            if not code_lengths:
+                raise ValueError('Code length repeat without a previous length')
+            code_lengths.extend([code_lengths[-1]] * (shortest_run + extra))
+        else:
+            code_lengths.extend([0] * (shortest_run + extra))
+
+    return code_lengths
+
+
+def _trimmed_count(code_lengths: list[int]) -> int:
+    count = len(code_lengths)
+    while count and code_lengths[count - 1] == 0:
+        count -= 1
+
+    return count
+
+
+def write_code_lengths(writer: BitWriter, code_lengths: list[int]):
+    """Dense code lengths (index is the symbol) with trailing zeros trimmed, run-length coded"""
+    count = _trimmed_count(code_lengths)
+    writer.write(count, CODE_LENGTH_COUNT_BITS)
+
+    for symbol, extra in run_length_encode(code_lengths[:count]):
+        writer.write(symbol, CODE_LENGTH_SYMBOL_BITS)
+        if symbol in RUN_EXTRA_BITS:
+            writer.write(extra, RUN_EXTRA_BITS[symbol][0])
+
+
+def code_lengths_bit_count(code_lengths: list[int]) -> int:
+    """Size of what write_code_lengths writes for code_lengths, without writing it"""
+    count = _trimmed_count(code_lengths)
+
+    return CODE_LENGTH_COUNT_BITS + sum(
+        CODE_LENGTH_SYMBOL_BITS + (RUN_EXTRA_BITS[symbol][0] if symbol in RUN_EXTRA_BITS else 0)
+        for symbol, _ in run_length_encode(code_lengths[:count])
+    )
+
+
+def read_code_lengths(reader: BitReader) -> list[int]:
+    count = reader.read(CODE_LENGTH_COUNT_BITS)
+    tokens = []
+    decoded = 0
+
+    while decoded < count:
+        symbol = reader.read(CODE_LENGTH_SYMBOL_BITS)
+        if symbol > REPEAT_ZERO_LONG:
+            raise ValueError(f'Invalid code length symbol {symbol}')
+
+        if symbol in RUN_EXTRA_BITS:
+            extra_bits, shortest_run = RUN_EXTRA_BITS[symbol]
+            extra = reader.read(extra_bits)
+            decoded += shortest_run + extra
+        else:
+            extra = 0
+            decoded += 1
+        tokens.append((symbol, extra))
+
+    code_lengths = run_length_decode(tokens)
+    if len(code_lengths) != count:
+        raise ValueError(f'Code length runs overflow the alphabet: {len(code_lengths)} > {count}')
+
+    return code_lengths
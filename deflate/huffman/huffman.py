@@ -1,17 +1,27 @@
-from heapq import heappush, heappop
-from collections import Counter
-from typing import Iterable
+from collections import Counter, deque
+from typing import Iterable, Optional
 from collections import abc
 
+from deflate import vectorized
+from deflate.bitio import BitWriter, BitReader
+from deflate.huffman.code_lengths import write_code_lengths, read_code_lengths
+
+MAX_CODE_LENGTH = 15
+
 
 class Codec:
     def __init__(self):
         self.letters = {}
         self.codes = {}
+        self.bit_codes = {}
 
     def update(self, letter, code):
         self.letters[code] = letter
         self.codes[letter] = code
+        self.bit_codes[letter] = (int(code, 2), len(code))
+
+    def write(self, writer: BitWriter, letter):
+        writer.write(*self.bit_codes[letter])
 
     def encode(self, s):
         if isinstance(s, abc.Iterable):
@@ -34,45 +44,168 @@ class Codec:
     def decode(self, s):
         return ''.join(self._decode(s))
 
+    @classmethod
+    def from_code_lengths(cls, code_lengths: dict) -> 'Codec':
+        codec = cls()
+
+        for letter, (code, length) in canonical_codes(code_lengths).items():
+            codec.update(letter, '{:0{}b}'.format(code, length))
+
+        return codec
+
+    def code_lengths(self) -> list[int]:
+        """Dense code lengths for an alphabet of non-negative integer symbols"""
+        lengths = [0] * (max(self.bit_codes, default=-1) + 1)
+
+        for letter, (_, length) in self.bit_codes.items():
+            lengths[letter] = length
+
+        return lengths
+
     def bitwise(self):
-        encoded_codes = []
-        for symbol in sorted(self.codes.keys()):
-            code = self.codes[symbol]
-            code_length = len(code)
-            code_length_bits = '{:08b}'.format(code_length)
-            encoded_codes.append(code_length_bits+code)
+        writer = BitWriter()
+        self.write_bitwise(writer)
+        return writer.to_bit_string()
+
+    def write_bitwise(self, writer: BitWriter):
+        """Canonical codes are fully defined by their lengths, so only the lengths are written"""
+        write_code_lengths(writer, self.code_lengths())
 
-        return ''.join(encoded_codes)
+    @classmethod
+    def read_bitwise(cls, reader: BitReader) -> 'Codec':
+        return cls.from_code_lengths(dict(enumerate(read_code_lengths(reader))))
 
     def from_bitwise(self, encoded: str, *, alphabet):
-        current_alphabet_index = 0
-        decoded_codes = {}
-        cursor = 0
-        while cursor < len(encoded):
-            code_length = int(encoded[cursor: cursor + 8], 2)
-            cursor += 8
+        writer = BitWriter()
+        writer.write_bit_string(encoded)
+        packed = writer.getvalue()
+
+        code_lengths = read_code_lengths(BitReader(packed.data, packed.bit_count))
+        codec = Codec.from_code_lengths({alphabet[index]: length for index, length in enumerate(code_lengths)})
+
+        return codec.codes
+
+
+def huffman_code_lengths(frequencies: dict, max_code_length: int = MAX_CODE_LENGTH) -> dict:
+    """
+    Optimal code lengths for the given frequencies, limited to max_code_length.
+
+    Symbols with zero frequency get no code. A single symbol gets a 1 bit code.
+    """
+    # Sorted, so that ties are broken the same way whatever order the histogram was built in
+    symbols = sorted(symbol for symbol, frequency in frequencies.items() if frequency > 0)
+
+    if len(symbols) <= 1:
+        return {symbol: 1 for symbol in symbols}
+
+    if len(symbols) > 1 << max_code_length:
+        raise ValueError(f'{len(symbols)} symbols do not fit into {max_code_length} bit codes')
+
+    lengths = _two_queue_code_lengths([frequencies[symbol] for symbol in symbols])
+    if max(lengths) <= max_code_length:
+        return dict(zip(symbols, lengths))
+
+    # Rebalance the per-length counts (JPEG, Annex K.3), then hand the shortest
+    # lengths to the most frequent symbols
+    length_counts = [0] * (max(lengths) + 1)
+    for length in lengths:
+        length_counts[length] += 1
+
+    for length in range(len(length_counts) - 1, max_code_length, -1):
+        while length_counts[length] > 0:
+            shorter = length - 2
+            while length_counts[shorter] == 0:
+                shorter -= 1
+
+            length_counts[length] -= 2
+            length_counts[length - 1] += 1
+            length_counts[shorter + 1] += 2
+            length_counts[shorter] -= 1
+
+    by_frequency = sorted(range(len(symbols)), key=lambda index: -frequencies[symbols[index]])
+    limited_lengths = (
+        length
+        for length in range(1, max_code_length + 1)
+        for _ in range(length_counts[length])
+    )
+
+    return {symbols[index]: length for index, length in zip(by_frequency, limited_lengths)}
+
+
+def _two_queue_code_lengths(frequencies: list[int]) -> list[int]:
+    """
+    Unlimited Huffman code lengths in O(n) past the sort (van Leeuwen's two queues).
 
-            code = encoded[cursor: cursor + code_length]
-            decoded_codes[alphabet[current_alphabet_index]] = code
+    Leaves are taken in ascending frequency order, and merged nodes are created with
+    non-decreasing frequencies, so the smallest node is always at the front of one of
+    the two queues. Leaves are nodes 0..n-1 and every merge creates the next node,
+    so a parent id is always greater than its children ids.
+    """
+    leaves = deque((frequencies[node], node) for node in vectorized.argsort(frequencies))
+    merged = deque()
+    parents = [0] * (2 * len(frequencies) - 1)
+    next_node = len(frequencies)
 
-            cursor += code_length
-            current_alphabet_index += 1
+    def pop_smallest() -> tuple[int, int]:
+        if not merged or (leaves and leaves[0][0] <= merged[0][0]):
+            return leaves.popleft()
+        return merged.popleft()
 
-        return decoded_codes
+    while len(leaves) + len(merged) > 1:
+        first_frequency, first_node = pop_smallest()
+        second_frequency, second_node = pop_smallest()
+        parents[first_node] = parents[second_node] = next_node
+        merged.append((first_frequency + second_frequency, next_node))
+        next_node += 1
+
+    depths = [0] * len(parents)
+    for node in range(len(parents) - 2, -1, -1):
+        depths[node] = depths[parents[node]] + 1
+
+    return depths[:len(frequencies)]
+
+
+def canonical_codes(code_lengths: dict) -> dict:
+    """symbol -> (code, length) of the canonical prefix code (RFC 1951, 3.2.2)"""
+    length_counts = Counter(length for length in code_lengths.values() if length)
+
+    next_code = {}
+    code = 0
+    for length in range(1, max(length_counts, default=0) + 1):
+        next_code[length] = code
+        code = (code + length_counts[length]) << 1
+
+    codes = {}
+    for symbol in sorted(code_lengths):
+        length = code_lengths[symbol]
+        if not length:
+            continue
+
+        codes[symbol] = (next_code[length], length)
+        next_code[length] += 1
+
+    return codes
 
 
 _HUFFMAN_CODES_T = dict[str, str]
 
 
 class StaticHuffmanEncoder:
-    def __init__(self, statistics_string: Iterable):
-        self.__statistics_string = statistics_string
-        self.__codes = self.__huffman_codes()
+    def __init__(self, statistics_string: Iterable, max_code_length: int = MAX_CODE_LENGTH):
+        self.__code_lengths = huffman_code_lengths(Counter(statistics_string), max_code_length)
+        self.__codes = {
+            letter: '{:0{}b}'.format(code, length)
+            for letter, (code, length) in canonical_codes(self.__code_lengths).items()
+        }
 
     @property
     def codes(self) -> _HUFFMAN_CODES_T:
         return self.__codes
 
+    @property
+    def code_lengths(self) -> dict:
+        return self.__code_lengths
+
     def codec(self) -> Codec:
         codec = Codec()
 
@@ -81,46 +214,91 @@ class StaticHuffmanEncoder:
 
         return codec
 
-    def __huffman_codes(self):
-        frequencies = Counter(self.__statistics_string)
-        if len(frequencies) == 1:
-            letter, = frequencies
-            return {letter: '0'}
 
-        queue = []
-        res = {letter: '' for letter in frequencies}
+_ROOT_TABLE_BITS = 9
+
+
+class HuffmanLookupTable:
+    """
+    Two-level decoding table for a prefix code, as in zlib's inflate.
 
-        for letter, frequency in frequencies.items():
-            heappush(queue, (frequency, (letter,)))
+    The root table is indexed by the next `root_bits` of input. Codes that fit give
+    (symbol, code length) right away; longer codes share a root entry (sub-table index, 0)
+    pointing to a sub-table indexed by the bits that follow.
+    """
 
-        while len(queue) > 1:
-            first_freq, first_letters = heappop(queue)
-            second_freq, second_letters = heappop(queue)
+    def __init__(self, bit_codes: dict, root_bits: int = _ROOT_TABLE_BITS):
+        max_length = max((length for _, length in bit_codes.values()), default=0)
+        self.root_bits = max(1, min(root_bits, max_length))
+        self.root: list[Optional[tuple]] = [None] * (1 << self.root_bits)
+        self.sub_tables: list[tuple[int, list[Optional[tuple]]]] = []
 
-            for letter in first_letters:
-                res[letter] = '0' + res[letter]
+        long_codes: dict[int, list[tuple]] = {}
 
-            for letter in second_letters:
-                res[letter] = '1' + res[letter]
+        for symbol, (code, length) in bit_codes.items():
+            if length <= self.root_bits:
+                free_bits = self.root_bits - length
+                first = code << free_bits
+                self.root[first: first + (1 << free_bits)] = [(symbol, length)] * (1 << free_bits)
+                continue
 
-            heappush(
-                queue,
-                (
-                    first_freq + second_freq,
-                    tuple(sorted((*first_letters, *second_letters)))
-                )
-            )
+            prefix = code >> (length - self.root_bits)
+            long_codes.setdefault(prefix, []).append((symbol, code, length))
 
-        return res
+        for prefix, codes in long_codes.items():
+            sub_bits = max(length for _, _, length in codes) - self.root_bits
+            sub_table = [None] * (1 << sub_bits)
+
+            for symbol, code, length in codes:
+                rest_length = length - self.root_bits
+                free_bits = sub_bits - rest_length
+                first = (code & ((1 << rest_length) - 1)) << free_bits
+                sub_table[first: first + (1 << free_bits)] = [(symbol, rest_length)] * (1 << free_bits)
+
+            self.root[prefix] = (len(self.sub_tables), 0)
+            self.sub_tables.append((sub_bits, sub_table))
+
+    @classmethod
+    def from_codec(cls, codec: Codec) -> 'HuffmanLookupTable':
+        return cls(codec.bit_codes)
+
+    def read_symbol(self, reader: BitReader):
+        entry = self.root[reader.peek(self.root_bits)]
+        if entry is None:
+            raise ValueError('Invalid Huffman code')
+
+        symbol, length = entry
+        if length:
+            reader.skip(length)
+            return symbol
+
+        reader.skip(self.root_bits)
+        sub_bits, sub_table = self.sub_tables[symbol]
+        entry = sub_table[reader.peek(sub_bits)]
+        if entry is None:
+            raise ValueError('Invalid Huffman code')
+
+        symbol, length = entry
+        reader.skip(length)
+        return symbol
 
 
 class StaticHuffmanDecoder:
     def __init__(self, codes: _HUFFMAN_CODES_T):
         self.__codes = codes
-        self.__letters = {code: symbol for symbol, code in self.__codes.items()}
+        self.__table = HuffmanLookupTable({symbol: (int(code, 2), len(code)) for symbol, code in codes.items()})
 
     def decode(self, bin_string: str) -> str:
-        codec = Codec()
-        codec.codes = self.__codes
-        codec.letters = self.__letters
-        return codec.decode(bin_string)
+        if not bin_string:
+            return ''
+
+        padding = -len(bin_string) % 8
+        data = (int(bin_string, 2) << padding).to_bytes((len(bin_string) + padding) // 8, 'big')
+        reader = BitReader(data, len(bin_string))
+
+        read_symbol = self.__table.read_symbol
+        letters = []
+        while reader.bits_remaining:
+            letters.append(read_symbol(reader))
+
+        return ''.join(letters)
@@ -1,211 +1,161 @@
-import functools
 import logging
-from typing import TypeVar
-
-from deflate.huffman.huffman import StaticHuffmanEncoder
-from deflate.lzss.chunk_compressor import Lzss, EncodeResult
+from collections import Counter
+from typing import Optional
+
+from deflate.bitio import BitWriter, PackedBits
+from deflate.huffman.code_lengths import code_lengths_bit_count
+from deflate.huffman.huffman import Codec, huffman_code_lengths
+from deflate.lzss.chunk_compressor import Lzss
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.lzss.tokens import TokenStream
+from deflate.stats import EncoderStats, stage_timer
+from deflate.tables import (
+    FIXED_LITERAL_LENGTH_LENGTHS, FIXED_OFFSET_CODE_LENGTH, LENGTH_CODES, OFFSET_CODE_TABLE, offset_code,
+)
+from deflate.vectorized import token_histograms
 
 logger = logging.getLogger(__name__)
 
-T = TypeVar('T')
-
-
-def _reverse_and_unzip_dict(dict_to_reverse: dict[T, list[T]]) -> dict[T, T]:
-    d = {}
+END_OF_BLOCK = 256
+LITERAL_FLAG = 0
+MATCH_FLAG = 1
 
-    for k, vs in dict_to_reverse.items():
-        for v in vs:
-            d[v] = k
+# Five bits address 32 offset codes, enough for windows of up to 64 KiB
+FIXED_OFFSET_CODE_COUNT = 32
 
-    return d
+FIXED_LITERAL_LENGTH_CODEC = Codec.from_code_lengths(dict(enumerate(FIXED_LITERAL_LENGTH_LENGTHS)))
+FIXED_OFFSET_CODEC = Codec.from_code_lengths({code: FIXED_OFFSET_CODE_LENGTH for code in range(FIXED_OFFSET_CODE_COUNT)})
 
+_CODECS_T = tuple[Codec, Codec]
 
-class DeflateHuffmanEncoder:
-    def __init__(self, window_size: int):
-        self.__window_size = window_size
 
-    def encode(self, string: bytes):
-        lzss = Lzss(window_size=self.__window_size)
-        lzss_result = lzss.compress(string)
-        logger.debug('LZSS Compressed')
-        lengths_and_symbols_encoder = StaticHuffmanEncoder(self.__huffman_statistics_string_based_on_lengths(lzss_result))
-        logger.debug('Statistics Length/Symbol built')
-        lengths_and_symbols_codec = lengths_and_symbols_encoder.codec()
-        offsets_encoder = StaticHuffmanEncoder(self.__huffman_statistics_string_based_on_offsets(lzss_result))
-        logger.debug('Statistics Offset built')
-        offset_codec = offsets_encoder.codec()
+class BlockStatistics:
+    """
+    Histograms of a run of LZSS tokens, enough to tell the exact size of its Huffman encodings.
 
-        result = []
-        huffman_tree_lengths_and_symbols_bits = lengths_and_symbols_codec.bitwise()
-        huffman_tree_offsets_bits = offset_codec.bitwise()
+    Statistics of neighbouring runs add up with +, so a block splitter can price a merged
+    block without looking at the tokens again.
+    """
 
-        result.extend([
-            '{:016b}'.format(len(huffman_tree_lengths_and_symbols_bits)),
-            huffman_tree_lengths_and_symbols_bits,
-        ])
+    def __init__(self, lzss_result: Optional[TokenStream] = None):
+        histograms = token_histograms(TokenStream() if lzss_result is None else lzss_result)
 
-        result.extend([
-            '{:016b}'.format(len(huffman_tree_offsets_bits)),
-            huffman_tree_offsets_bits,
-        ])
+        self.literal_length_counts = histograms.literal_length_counts
+        self.offset_counts = histograms.offset_counts
+        # Length and offset extra bits plus one literal/match flag per token
+        self.plain_bit_count = histograms.extra_bit_count + histograms.token_count
+        self.byte_count = histograms.byte_count
 
-        for lzss_encoded in lzss_result:
-            lzss_encoded_bits = self._encode_lzss_result(lzss_encoded, lengths_and_symbols_codec, offset_codec)
-            result.append(lzss_encoded_bits)
+    def __add__(self, other: 'BlockStatistics') -> 'BlockStatistics':
+        result = BlockStatistics()
+        result.literal_length_counts = self.literal_length_counts + other.literal_length_counts
+        result.offset_counts = self.offset_counts + other.offset_counts
+        result.plain_bit_count = self.plain_bit_count + other.plain_bit_count
+        result.byte_count = self.byte_count + other.byte_count
 
-        result.append(lengths_and_symbols_codec.encode(256))
+        return result
 
-        return ''.join(result)
+    def dynamic_codecs(self) -> _CODECS_T:
+        literal_length_counts = Counter({END_OF_BLOCK: 1})
+        literal_length_counts.update(self.literal_length_counts)
 
-    def _encode_lzss_result(self, r: EncodeResult, length_and_symbols_codec, offset_codec) -> str:
-        if r.symbol is not None:
-            return '0' + length_and_symbols_codec.encode(r.symbol)
+        return (
+            Codec.from_code_lengths(huffman_code_lengths(literal_length_counts)),
+            Codec.from_code_lengths(huffman_code_lengths(self.offset_counts)),
+        )
 
-        return '1' + self._encode_length_offset(r, length_and_symbols_codec=length_and_symbols_codec, offset_codec=offset_codec)
+    def bit_count(self, codecs: _CODECS_T) -> Optional[int]:
+        """Size of the tokens and the end of block written with codecs, None if some symbol has no code"""
+        literal_length_codec, offset_codec = codecs
+        literal_length_codes = literal_length_codec.bit_codes
+        offset_codes = offset_codec.bit_codes
 
-    def _encode_length_offset(self, r: EncodeResult, *, length_and_symbols_codec, offset_codec) -> str:
-        length_code = self._encode_length(r.length, length_and_symbols_codec)
-        offset_code = self._encode_offset(r.offset, offset_codec)
+        if END_OF_BLOCK not in literal_length_codes:
+            return None
 
-        return length_code + offset_code
+        bit_count = self.plain_bit_count + literal_length_codes[END_OF_BLOCK][1]
 
-    def _encode_length(self, length: int, codec) -> str:
-        base_length_code = self.__huffman_reverse_lengths_table[length]
-        min_bound_for_base_length_code = self.__huffman_lengths_table[base_length_code][0]
-        length_extra_bits = self.__required_extra_bits_for_base_length_code(base_length_code)
-        if length_extra_bits == 0:
-            return codec.encode(base_length_code)
+        for counts, codes in ((self.literal_length_counts, literal_length_codes), (self.offset_counts, offset_codes)):
+            for symbol, count in counts.items():
+                if symbol not in codes:
+                    return None
+                bit_count += count * codes[symbol][1]
 
-        base_length_huffman_code = codec.encode(base_length_code)
-        delta_bin_code = ('{:0' + f'{length_extra_bits}' + 'b}').format(length - min_bound_for_base_length_code)
+        return bit_count
 
-        return base_length_huffman_code + delta_bin_code
+    @staticmethod
+    def header_bit_count(codecs: _CODECS_T) -> int:
+        return sum(code_lengths_bit_count(codec.code_lengths()) for codec in codecs)
 
-    def _encode_offset(self, offset: int, codec) -> str:
-        base_offset_code = self.__hugman_reverse_offset_table[offset]
-        min_bound_for_base_offset_code = self.__huffman_offset_table[base_offset_code][0]
-        length_extra_bits = self.__required_extra_bits_for_base_offset_code(base_offset_code)
-        if length_extra_bits == 0:
-            return codec.encode(base_offset_code)
 
-        base_offset_huffman_code = codec.encode(base_offset_code)
-        delta_bin_code = ('{:0' + f'{length_extra_bits}' + 'b}').format(offset - min_bound_for_base_offset_code)
+class DeflateHuffmanEncoder:
+    def __init__(self, window_size: int, level: int = DEFAULT_LEVEL, stats: Optional[EncoderStats] = None):
+        self.__window_size = window_size
+        self.__level = level
+        self.__stats = stats
 
-        return base_offset_huffman_code + delta_bin_code
+    def encode(self, string: bytes) -> str:
+        """Debug view of encode_to_bytes: one '0'/'1' character per bit"""
+        return self.encode_to_bytes(string).to_bit_string()
 
-    def __huffman_statistics_string_based_on_lengths(self, lzss_result: list[EncodeResult]) -> list[int]:
-        r = [256, 286, 287]
-        symbols_for_encoding = set(r)
+    def encode_to_bytes(self, string: bytes) -> PackedBits:
+        writer = BitWriter()
+        self.write(string, writer)
+        return writer.getvalue()
 
-        for lzss_encoded in lzss_result:
-            if lzss_encoded.symbol is not None:
-                r.append(lzss_encoded.symbol)
+    def write(self, string: bytes, writer: BitWriter):
+        lzss = Lzss(window_size=self.__window_size, level=self.__level, stats=self.__stats)
+        lzss_result = lzss.compress(string)
+        logger.debug('LZSS compressed %d symbols into %d tokens', len(string), len(lzss_result))
+        self.write_lzss_result(lzss_result, writer)
+
+    def encode_lzss_result(self, lzss_result: TokenStream) -> PackedBits:
+        writer = BitWriter()
+        self.write_lzss_result(lzss_result, writer)
+        return writer.getvalue()
+
+    def write_lzss_result(self, lzss_result: TokenStream, writer: BitWriter):
+        """Payload of a dynamic Huffman block: both code length tables, then the tokens"""
+        with stage_timer(self.__stats, 'tree_seconds'):
+            codecs = BlockStatistics(lzss_result).dynamic_codecs()
+
+        with stage_timer(self.__stats, 'emit_seconds'):
+            self.write_codecs(codecs, writer)
+            self.write_tokens(lzss_result, codecs, writer)
+
+    @staticmethod
+    def write_codecs(codecs: _CODECS_T, writer: BitWriter):
+        for codec in codecs:
+            codec.write_bitwise(writer)
+
+    def write_tokens(self, lzss_result: TokenStream, codecs: _CODECS_T, writer: BitWriter):
+        lengths_and_symbols_codec, offset_codec = codecs
+
+        for length, value in zip(lzss_result.lengths, lzss_result.values):
+            if not length:
+                writer.write(LITERAL_FLAG, 1)
+                lengths_and_symbols_codec.write(writer, value)
                 continue
 
-            length_code = self.__huffman_reverse_lengths_table[lzss_encoded.length]
-            r.append(length_code)
+            writer.write(MATCH_FLAG, 1)
+            self._write_length(length, writer, lengths_and_symbols_codec)
+            self._write_offset(value, writer, offset_codec)
 
-        for code in range(0, 288):
-            if code not in symbols_for_encoding:
-                symbols_for_encoding.add(code)
-                r.append(code)
+        lengths_and_symbols_codec.write(writer, END_OF_BLOCK)
 
-        return r
+    @staticmethod
+    def _write_length(length: int, writer: BitWriter, codec: Codec):
+        length_code, extra_bits, base_length = LENGTH_CODES[length]
+        codec.write(writer, length_code)
 
-    def __huffman_statistics_string_based_on_offsets(self, lzss_result: list[EncodeResult]) -> list[int]:
-        r = []
+        if extra_bits:
+            writer.write(length - base_length, extra_bits)
 
-        used_codes = set()
-
-        for lzss_encoded in lzss_result:
-            if lzss_encoded.offset is None:
-                continue
+    @staticmethod
+    def _write_offset(offset: int, writer: BitWriter, codec: Codec):
+        code = offset_code(offset)
+        codec.write(writer, code)
 
-            base_offset_code = self.__hugman_reverse_offset_table[lzss_encoded.offset]
-            r.append(base_offset_code)
-            used_codes.add(base_offset_code)
-
-        for offset_code in self.__huffman_offset_table.keys():
-            if offset_code not in used_codes:
-                used_codes.add(offset_code)
-                r.append(offset_code)
-
-        return r
-
-    @functools.cached_property
-    def __huffman_lengths_table(self) -> dict[int, list[int]]:
-        d = {
-            257 + i - 3: [i] for i in range(3, 10 + 1)
-        }
-
-        d[265] = [11, 12]
-        d[266] = [13, 14]
-        d[267] = [15, 16]
-        d[268] = [17, 18]
-        d[269] = list(range(19, 23))
-        d[270] = list(range(23, 27))
-        d[271] = list(range(27, 31))
-        d[272] = list(range(31, 35))
-        d[273] = list(range(35, 43))
-        d[274] = list(range(43, 51))
-        d[275] = list(range(51, 59))
-        d[276] = list(range(59, 67))
-        d[277] = list(range(67, 83))
-        d[278] = list(range(83, 99))
-        d[279] = list(range(99, 115))
-        d[280] = list(range(115, 131))
-        d[281] = list(range(131, 163))
-        d[282] = list(range(163, 195))
-        d[283] = list(range(195, 227))
-        d[284] = list(range(227, 258))
-        d[285] = [258]
-        return d
-
-    def __required_extra_bits_for_base_length_code(self, base_code: int) -> int:
-        if 257 <= base_code <= 264:
-            return 0
-
-        if base_code == 285:
-            return 0
-
-        delta = base_code - 265
-
-        return delta // 4 + 1
-
-    def __required_extra_bits_for_base_offset_code(self, base_code: int) -> int:
-        if 0 <= base_code <= 3:
-            return 0
-
-        delta = base_code - 4
-
-        return delta // 2 + 1
-
-    @functools.cached_property
-    def __huffman_reverse_lengths_table(self):
-        return _reverse_and_unzip_dict(self.__huffman_lengths_table)
-
-    @functools.cached_property
-    def __huffman_offset_table(self) -> dict[int, list[int]]:
-        current_offset = 5
-        current_code = 4
-        extra_bits = 0
-
-        table = {0: [1], 1: [2], 2: [3], 3: [4]}
-
-        while current_offset <= self.__window_size:
-            if current_code % 2 == 0:
-                extra_bits += 1
-            table[current_code] = []
-            for i in range(2**extra_bits):
-                if current_offset > self.__window_size:
-                    break
-                table[current_code].append(current_offset)
-                current_offset += 1
-
-            current_code += 1
-
-        return table
-
-    @functools.cached_property
-    def __hugman_reverse_offset_table(self) -> dict[int, int]:
-        return _reverse_and_unzip_dict(self.__huffman_offset_table)
+        base_offset, extra_bits = OFFSET_CODE_TABLE[code]
+        if extra_bits:
+            writer.write(offset - base_offset, extra_bits)
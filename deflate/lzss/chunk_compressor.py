@@ -1,160 +1,422 @@
-from dataclasses import dataclass
+from array import array
 from typing import Union, Optional
 
-from deflate.lzss.circularlist import CircularList
-
-_OFFSET_T = int
-_LENGTH_T = int
-
+from deflate.lzss.levels import DEFAULT_LEVEL, MatchStrategy, compression_level
+from deflate.lzss.match_finder import HashChainMatchFinder
+from deflate.lzss.optimal import collect_matches, optimal_parse
+from deflate.lzss.tokens import EncodeResult, TokenStream
+from deflate.stats import EncoderStats
 
 _CONTENT_T = Union[bytes, str]
 
+_TOO_FAR_OFFSET = 4096
 
-@dataclass
-class EncodeResult:
-    symbol: Union[str, int, None]
-    offset: Optional[_OFFSET_T]
-    length: Optional[_LENGTH_T]
+# Code points of decompressed text, like TokenStream values
+_TEXT_TYPECODE = 'I'
 
 
 class Lzss:
-    def __init__(self, window_size: int, min_repeated_string_length: int = 3, max_repeated_string_length = 258):
+    def __init__(
+            self,
+            window_size: int,
+            min_repeated_string_length: int = 3,
+            max_repeated_string_length = 258,
+            *,
+            level: int = DEFAULT_LEVEL,
+            max_chain_length: Optional[int] = None,
+            nice_match_length: Optional[int] = None,
+            dictionary: Optional[_CONTENT_T] = None,
+            stats: Optional[EncoderStats] = None,
+    ):
+        """dictionary primes the window of every compression, like zlib's deflateSetDictionary"""
         self.__window_size = window_size
         self.__min_repeated_string_length = min_repeated_string_length
         self.__max_repeated_string_length = max_repeated_string_length
+        self.__level = level
+        self.__max_chain_length = max_chain_length
+        self.__nice_match_length = nice_match_length
+        self.__dictionary = dictionary
+        self.__stats = stats
 
-    def compress(self, data: _CONTENT_T) -> list[EncodeResult]:
+    def compress(self, data: _CONTENT_T) -> TokenStream:
         compressor = LzssChunkCompressor(
             data=data,
             window_size=self.__window_size,
             min_repeated_string_length=self.__min_repeated_string_length,
             max_repeated_string_length=self.__max_repeated_string_length,
+            level=self.__level,
+            max_chain_length=self.__max_chain_length,
+            nice_match_length=self.__nice_match_length,
+            dictionary=self.__dictionary,
+            stats=self.__stats,
         )
 
         return compressor.compress()
 
-    def decompress(self, encoded_result: list[EncodeResult]) -> _CONTENT_T:
-        if not encoded_result:
-            raise ValueError('Empty encoded_result')
+    def stream(self) -> 'LzssStreamCompressor':
+        compressor = LzssStreamCompressor(
+            window_size=self.__window_size,
+            min_repeated_string_length=self.__min_repeated_string_length,
+            max_repeated_string_length=self.__max_repeated_string_length,
+            level=self.__level,
+            max_chain_length=self.__max_chain_length,
+            nice_match_length=self.__nice_match_length,
+            stats=self.__stats,
+        )
 
-        first_encoded = encoded_result[0]
-        decompressor = LzssChunkDecompressor(type(first_encoded.symbol))
+        if self.__dictionary:
+            compressor.prime(self.__dictionary[-self.__window_size:])
 
-        return decompressor.decompress(encoded_result)
+        return compressor
 
+    def decompress(self, encoded_result: TokenStream) -> _CONTENT_T:
+        if not encoded_result:
+            raise ValueError('Empty encoded_result')
 
-class LzssChunkCompressor:
-    def __init__(self, *, data: _CONTENT_T, window_size: int, min_repeated_string_length: int, max_repeated_string_length: int):
-        self.__data = data
-        self.__buffer = CircularList(window_size)
+        decompressor = LzssChunkDecompressor(str if encoded_result.text else bytes)
+
+        return decompressor.decompress(encoded_result, self.__dictionary or b'')
+
+
+class LzssStreamCompressor:
+    """
+    Keeps the window between compress() calls, so matches can reach into earlier data.
+
+    The parse follows the strategy of the compression level: literals only, greedy
+    (zlib's deflate_fast), lazy matching (zlib's deflate_slow) or an optimal parse. max_chain_length and
+    nice_match_length override the values of the level.
+    """
+
+    def __init__(
+            self,
+            *,
+            window_size: int,
+            min_repeated_string_length: int = 3,
+            max_repeated_string_length: int = 258,
+            level: int = DEFAULT_LEVEL,
+            max_chain_length: Optional[int] = None,
+            nice_match_length: Optional[int] = None,
+            stats: Optional[EncoderStats] = None,
+    ):
+        self.__level = compression_level(level)
+        self.__stats = stats
         self.__min_repeated_string_length = min_repeated_string_length
-        self.__max_repeated_string_length = max_repeated_string_length
-
-    def compress(self) -> list[EncodeResult]:
-        encoded_result = []
-        position = 0
+        self.__match_finder = HashChainMatchFinder(
+            window_size,
+            min_match_length=min_repeated_string_length,
+            max_match_length=max_repeated_string_length,
+            max_chain_length=self.__level.max_chain_length if max_chain_length is None else max_chain_length,
+            nice_match_length=self.__level.nice_match_length if nice_match_length is None else nice_match_length,
+        )
 
-        while position < len(self.__data):
-            encode_result = self.__encode_symbol(position)
-            encoded_result.append(encode_result)
-            if encode_result.offset is None:
-                self.__buffer.append(encode_result.symbol)
+    def prime(self, history: _CONTENT_T):
+        """Make history referable by the following compress() calls without encoding it"""
+        match_finder = self.__match_finder
+        match_finder.feed(history)
+        match_finder.insert_range(match_finder.end - len(history), match_finder.end)
+
+    @property
+    def max_chain_length(self) -> int:
+        return self.__match_finder.max_chain_length
+
+    def skip(self, data: _CONTENT_T):
+        """
+        Append data that goes out without LZSS, e.g. as a stored block.
+
+        It stays in the window but is not indexed, so later matches can't point into it.
+        """
+        self.__match_finder.feed(data)
+
+        if self.__stats is not None:
+            self.__stats.input_bytes += len(data)
+
+    def compress(self, data: _CONTENT_T, *, max_chain_length: Optional[int] = None) -> TokenStream:
+        """max_chain_length caps the match search of this call only"""
+        stats = self.__stats
+        if stats is None:
+            return self.__compress(data, max_chain_length)
+
+        match_finder = self.__match_finder
+        search_count = match_finder.search_count
+        candidate_count = match_finder.candidate_count
+
+        with stats.timer('lzss_seconds'):
+            lzss_result = self.__compress(data, max_chain_length)
+
+        stats.input_bytes += len(data)
+        stats.match_searches += match_finder.search_count - search_count
+        stats.chain_candidates += match_finder.candidate_count - candidate_count
+        stats.count_tokens(lzss_result)
+
+        return lzss_result
+
+    def __compress(self, data: _CONTENT_T, max_chain_length: Optional[int]) -> TokenStream:
+        match_finder = self.__match_finder
+        match_finder.feed(data)
+
+        strategy = self.__level.strategy
+        if strategy is MatchStrategy.LITERALS_ONLY:
+            return TokenStream.literals(data)
+
+        level_chain_length = match_finder.max_chain_length
+        if max_chain_length is not None:
+            match_finder.max_chain_length = min(max_chain_length, level_chain_length)
+
+        try:
+            if strategy is MatchStrategy.OPTIMAL:
+                matches = collect_matches(match_finder, len(data))
+                return optimal_parse(data, matches, self.__level.optimal_iterations)
+
+            tokens = TokenStream(text=isinstance(data, str))
+            if strategy is MatchStrategy.GREEDY:
+                self.__compress_greedy(len(data), tokens)
+            else:
+                self.__compress_lazy(len(data), tokens)
+
+            return tokens
+        finally:
+            match_finder.max_chain_length = level_chain_length
+
+    def __compress_greedy(self, data_length: int, tokens: TokenStream):
+        match_finder = self.__match_finder
+        buffer = match_finder.buffer
+        base = match_finder.base
+        end = match_finder.end
+        max_insert_length = self.__level.max_lazy_match_length
+        text = tokens.text
+        append_length = tokens.lengths.append
+        append_value = tokens.values.append
+
+        position = end - data_length
+
+        while position < end:
+            match = match_finder.find(position)
+
+            if match is None:
+                symbol = buffer[position - base]
+                append_length(0)
+                append_value(ord(symbol) if text else symbol)
+                match_finder.insert(position)
                 position += 1
                 continue
 
-            for i in range(0, encode_result.length):
-                self.__buffer.append(self.__data[position + i])
-
-            position += encode_result.length
-
-        return encoded_result
-
-    def __encode_symbol(self, position: int) -> EncodeResult:
-        r = self.__find_longest_substring_in_buffer(position)
-
-        if r is None:
-            return EncodeResult(symbol=self.__data[position], offset=None, length=None)
-
-        length = r[0]
-        offset = r[1]
-
-        if length < self.__min_repeated_string_length:
-            return EncodeResult(symbol=self.__data[position], offset=None, length=None)
-
-        return EncodeResult(symbol=None, length=length, offset=len(self.__buffer) - offset)
+            length, offset = match
+            append_length(length)
+            append_value(offset)
+
+            if length <= max_insert_length:
+                match_finder.insert_range(position, position + length)
+            else:
+                match_finder.insert(position)
+
+            position += length
+
+    def __compress_lazy(self, data_length: int, tokens: TokenStream):
+        """
+        A match is only emitted if the next position doesn't start a longer one;
+        otherwise the first symbol goes out as a literal and the longer match becomes pending.
+        """
+        match_finder = self.__match_finder
+        buffer = match_finder.buffer
+        base = match_finder.base
+        end = match_finder.end
+        good_match_length = self.__level.good_match_length
+        max_lazy_match_length = self.__level.max_lazy_match_length
+        max_chain_length = match_finder.max_chain_length
+        min_length = self.__min_repeated_string_length
+        text = tokens.text
+        append_length = tokens.lengths.append
+        append_value = tokens.values.append
+
+        position = end - data_length
+        pending = None
+
+        while position < end:
+            pending_length = pending[0] if pending is not None else 0
+
+            match = None
+            if pending_length < max_lazy_match_length:
+                chain_length = max_chain_length >> 2 if pending_length >= good_match_length else max_chain_length
+                match = match_finder.find(position, prev_length=pending_length, max_chain_length=chain_length)
+
+                # A far away match of the minimal length costs more than its literals
+                if match is not None and match[0] == min_length and match[1] > _TOO_FAR_OFFSET:
+                    match = None
+
+            match_finder.insert(position)
+
+            if pending is not None:
+                if match is None:
+                    length, offset = pending
+                    append_length(length)
+                    append_value(offset)
+                    match_finder.insert_range(position + 1, position - 1 + length)
+                    position += length - 1
+                    pending = None
+                    continue
+
+                symbol = buffer[position - 1 - base]
+                append_length(0)
+                append_value(ord(symbol) if text else symbol)
+
+            if match is None:
+                symbol = buffer[position - base]
+                append_length(0)
+                append_value(ord(symbol) if text else symbol)
+            pending = match
+            position += 1
+
+        if pending is not None:
+            length, offset = pending
+            append_length(length)
+            append_value(offset)
 
-    def __find_longest_substring_in_buffer(self, position: int) -> Optional[tuple[_LENGTH_T, _OFFSET_T]]:
-        cur_length = 0
 
-        result_found_index = None
-        buffer_string = self.__empty_content().join([self.__symbol_to_correct_type(s) for s in self.__buffer])
-
-        while True:
-            cur_prefix = self.__data[position: position + cur_length + 1]
-
-            found_index = buffer_string.find(cur_prefix)
-            if found_index == -1:
-                break
-
-            cur_length += 1
-            result_found_index = found_index
-
-            if cur_length >= self.__max_repeated_string_length or cur_length + position == len(self.__data):
-                break
-
-        if result_found_index is None:
-            return None
-
-        return cur_length, result_found_index
+class LzssChunkCompressor:
+    def __init__(
+            self,
+            *,
+            data: _CONTENT_T,
+            window_size: int,
+            min_repeated_string_length: int,
+            max_repeated_string_length: int,
+            level: int = DEFAULT_LEVEL,
+            max_chain_length: Optional[int] = None,
+            nice_match_length: Optional[int] = None,
+            dictionary: Optional[_CONTENT_T] = None,
+            stats: Optional[EncoderStats] = None,
+    ):
+        self.__data = data
+        self.__stream_compressor = LzssStreamCompressor(
+            window_size=window_size,
+            min_repeated_string_length=min_repeated_string_length,
+            max_repeated_string_length=max_repeated_string_length,
+            level=level,
+            max_chain_length=max_chain_length,
+            nice_match_length=nice_match_length,
+            stats=stats,
+        )
 
-    def __empty_content(self) -> _CONTENT_T:
-        if type(self.__data) == str:
-            return ''
+        if dictionary:
+            self.__stream_compressor.prime(dictionary[-window_size:])
 
-        return b''
+    def compress(self) -> TokenStream:
+        return self.__stream_compressor.compress(self.__data)
 
-    def __symbol_to_correct_type(self, symbol: _CONTENT_T) -> _CONTENT_T:
-        if self.__empty_content() == '':
-            return symbol
 
-        symbol: int
-        return symbol.to_bytes(1, byteorder='big')
+class LzssChunkDecompressor:
+    """
+    Rebuilds content from LZSS tokens inside one presized buffer.
 
+    A match is copied as a slice of what is already written. An overlapping match
+    (offset < length) copies its first period, then doubles the copied run with every
+    slice, so a long run takes log2(length / offset) copies instead of one per symbol.
+    """
 
-class LzssChunkDecompressor:
     def __init__(self, content_type: type[_CONTENT_T]):
         self.__content_type = content_type
 
-    def decompress(self, encoded_result: list[EncodeResult]) -> _CONTENT_T:
-        empty_content = self.__empty_content()
-
-        substrings = []
-
-        total_decoded = 0
-        for encoded in encoded_result:
-            if encoded.symbol is not None:
-                substrings.append(encoded.symbol)
-                total_decoded += 1
-                continue
-
-            start = total_decoded - encoded.offset
-            end = start + encoded.length
-            substrings.extend(substrings[i] for i in range(total_decoded - encoded.offset, end))
-
-            total_decoded += encoded.length
-
-        return empty_content.join(self.__symbol_to_correct_type(s) for s in substrings)
-
-    def __empty_content(self) -> _CONTENT_T:
+    def decompress(
+            self,
+            encoded_result: TokenStream,
+            dictionary: _CONTENT_T = b'',
+            *,
+            size_hint: Optional[int] = None,
+    ) -> _CONTENT_T:
+        """
+        dictionary is what the window was primed with, offsets may reach into it.
+
+        size_hint, the decompressed size if already known (e.g. from a container index),
+        saves counting it from the tokens and only sizes the buffer: the output is cut to
+        what the tokens produce, and a hint that is too small costs a recount and a second
+        pass instead of an error. A match with an offset of 0, or one reaching before the
+        dictionary, raises ValueError.
+        """
+        size = decompressed_size(encoded_result) if size_hint is None else size_hint
+        lengths, values = encoded_result.lengths, encoded_result.values
+
+        buffer = self.__buffer(dictionary, size)
+        try:
+            end = _expand_tokens(lengths, values, buffer, len(dictionary))
+        except IndexError:
+            buffer = self.__buffer(dictionary, decompressed_size(encoded_result))
+            end = _expand_tokens(lengths, values, buffer, len(dictionary))
+
+        with memoryview(buffer) as view:
+            if self.__content_type == str:
+                return ''.join(map(chr, view[len(dictionary): end]))
+
+            return bytes(view[len(dictionary): end])
+
+    def __buffer(self, dictionary: _CONTENT_T, size: int) -> Union[bytearray, array]:
+        """dictionary followed by room for size symbols"""
         if self.__content_type == str:
-            return ''
-
-        return b''
-
-    def __symbol_to_correct_type(self, symbol: _CONTENT_T) -> _CONTENT_T:
-        if self.__empty_content() == '':
-            return symbol
-
-        symbol: int
-        return symbol.to_bytes(1, byteorder='big')
-
+            buffer = array(_TEXT_TYPECODE, map(ord, dictionary))
+            buffer.extend(array(_TEXT_TYPECODE, [0]) * size)
+            return buffer
+
+        buffer = bytearray(len(dictionary) + size)
+        buffer[:len(dictionary)] = dictionary
+        return buffer
+
+    @staticmethod
+    def decompress_into(
+            encoded_result: TokenStream,
+            buffer: Union[bytearray, array, memoryview],
+            position: int = 0,
+    ) -> int:
+        """
+        Write the content at buffer[position:], returning where it ends.
+
+        buffer[:position] is the history that offsets reach into: a dictionary, or the
+        content of the previous tokens of the stream. The buffer is not resized: a buffer
+        that is too small raises ValueError, as does a match with an offset of 0 or one
+        reaching before the start of the buffer.
+        """
+        lengths, values = encoded_result.lengths, encoded_result.values
+
+        try:
+            return _expand_tokens(lengths, values, buffer, position)
+        except IndexError:
+            raise ValueError(f'Output buffer of {len(buffer)} items is too small') from None
+
+
+def decompressed_size(encoded_result: TokenStream) -> int:
+    """Length of the content of tokens: a symbol per literal plus the match lengths"""
+    lengths = encoded_result.lengths
+    return sum(lengths) + lengths.count(0)
+
+
+def _expand_tokens(lengths: array, values: array, buffer: Union[bytearray, array, memoryview], position: int) -> int:
+    for length, value in zip(lengths, values):
+        if not length:
+            buffer[position] = value
+            position += 1
+            continue
+
+        # An offset of 0 would copy nothing and never finish an overlapping match
+        if value <= 0:
+            raise ValueError(f'Invalid match offset {value}')
+
+        start = position - value
+        if start < 0:
+            raise ValueError(f'Offset {value} points before the start of the stream')
+
+        end = position + length
+        if end > len(buffer):
+            raise IndexError(end)
+
+        if value >= length:
+            buffer[position: end] = buffer[start: start + length]
+        else:
+            # buffer[start: position + copied] repeats the period, so copying from start
+            # keeps the phase as long as copied stays a multiple of it
+            copied = 0
+            while copied < length:
+                step = min(value + copied, length - copied)
+                buffer[position + copied: position + copied + step] = buffer[start: start + step]
+                copied += step
+
+        position = end
+
+    return position
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+
+
+class MatchStrategy(Enum):
+    LITERALS_ONLY = auto()
+    GREEDY = auto()
+    LAZY = auto()
+    # Shortest path over all matches under a Huffman cost model, see optimal.py
+    OPTIMAL = auto()
+
+
+@dataclass(frozen=True)
+class CompressionLevel:
+    strategy: MatchStrategy
+    # Lazy: search less when the pending match is already this long
+    good_match_length: int
+    # Lazy: don't look for a better match past this length. Greedy: don't index the
+    # inside of matches longer than this
+    max_lazy_match_length: int
+    nice_match_length: int
+    max_chain_length: int
+    # Optimal: passes of the parse, each priced by the code lengths of the previous one
+    optimal_iterations: int = 0
+
+
+MIN_LEVEL = 0
+MAX_LEVEL = 10
+DEFAULT_LEVEL = 6
+
+# zlib's configuration_table
+LEVELS = {
+    0: CompressionLevel(MatchStrategy.LITERALS_ONLY, 0, 0, 0, 0),
+    1: CompressionLevel(MatchStrategy.GREEDY, 4, 4, 8, 4),
+    2: CompressionLevel(MatchStrategy.GREEDY, 4, 5, 16, 8),
+    3: CompressionLevel(MatchStrategy.GREEDY, 4, 6, 32, 32),
+    4: CompressionLevel(MatchStrategy.LAZY, 4, 4, 16, 16),
+    5: CompressionLevel(MatchStrategy.LAZY, 8, 16, 32, 32),
+    6: CompressionLevel(MatchStrategy.LAZY, 8, 16, 128, 128),
+    7: CompressionLevel(MatchStrategy.LAZY, 8, 32, 128, 256),
+    8: CompressionLevel(MatchStrategy.LAZY, 32, 128, 258, 1024),
+    9: CompressionLevel(MatchStrategy.LAZY, 32, 258, 258, 4096),
+    # Beyond zlib's table: for archives written once and read many times
+    10: CompressionLevel(MatchStrategy.OPTIMAL, 258, 258, 258, 4096, optimal_iterations=5),
+}
+
+
+def compression_level(level: int) -> CompressionLevel:
+    if level not in LEVELS:
+        raise ValueError(f'Compression level must be in {MIN_LEVEL}..{MAX_LEVEL}, got {level}')
+
+    return LEVELS[level]
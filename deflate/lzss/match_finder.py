@@ -0,0 +1,262 @@
+from typing import Optional, Union
+
+_CONTENT_T = Union[bytes, str]
+
+_OFFSET_T = int
+_LENGTH_T = int
+
+_EXTEND_STEP = 16
+
+
+class HashChainMatchFinder:
+    """
+    Longest-match search over a flat window, as in zlib's longest_match.
+
+    Every position is indexed by its first `hash_length` symbols: `head` keeps the most recent
+    position for a prefix and `prev` links each position to the previous one with the same prefix.
+    Positions are absolute (counted from the first symbol ever fed), so the chains stay valid
+    while the buffer slides forward.
+    """
+
+    def __init__(
+            self,
+            window_size: int,
+            *,
+            min_match_length: int = 3,
+            max_match_length: int = 258,
+            max_chain_length: int = 4096,
+            nice_match_length: int = 258,
+    ):
+        if window_size <= 0:
+            raise ValueError(f'window_size must be positive, got {window_size}')
+
+        if min_match_length <= 0:
+            raise ValueError(f'min_match_length must be positive, got {min_match_length}')
+
+        self.window_size = window_size
+        self.min_match_length = min_match_length
+        self.max_match_length = max_match_length
+        self.max_chain_length = max_chain_length
+        self.nice_match_length = nice_match_length
+
+        # Chain depth bookkeeping for EncoderStats: find() calls that walked a chain, and
+        # the candidates they compared
+        self.search_count = 0
+        self.candidate_count = 0
+
+        self.__hash_length = min(3, min_match_length)
+        self.__buffer: Optional[_CONTENT_T] = None
+        self.__base = 0
+        self.__head: dict[_CONTENT_T, int] = {}
+        self.__prev = [-1] * window_size
+
+    @property
+    def buffer(self) -> _CONTENT_T:
+        return self.__buffer
+
+    @property
+    def base(self) -> int:
+        """Absolute position of buffer[0]"""
+        return self.__base
+
+    @property
+    def end(self) -> int:
+        """Absolute position right after the last fed symbol"""
+        if self.__buffer is None:
+            return self.__base
+
+        return self.__base + len(self.__buffer)
+
+    def feed(self, data: _CONTENT_T):
+        """
+        Append data to the window, dropping the symbols that can no longer be referenced.
+
+        Callers must have consumed everything but the last max_match_length symbols before feeding more.
+        """
+        if self.__buffer is None:
+            self.__buffer = data
+            return
+
+        discard = len(self.__buffer) - self.window_size - self.max_match_length
+        if discard > 0:
+            self.__buffer = self.__buffer[discard:]
+            self.__base += discard
+
+        previous_end = self.end
+        self.__buffer = self.__buffer + data
+
+        # The last positions before the old end had too few symbols to be hashed
+        self.insert_range(max(self.__base, previous_end - self.__hash_length + 1), previous_end)
+
+    def insert(self, position: int):
+        index = position - self.__base
+        key = self.__buffer[index: index + self.__hash_length]
+        if len(key) < self.__hash_length:
+            return
+
+        head = self.__head
+        self.__prev[position % self.window_size] = head.get(key, -1)
+        head[key] = position
+
+    def insert_range(self, start: int, end: int):
+        buffer = self.__buffer
+        base = self.__base
+        hash_length = self.__hash_length
+        head = self.__head
+        prev = self.__prev
+        window_size = self.window_size
+
+        for position in range(start, min(end, base + len(buffer) - hash_length + 1)):
+            index = position - base
+            key = buffer[index: index + hash_length]
+            prev[position % window_size] = head.get(key, -1)
+            head[key] = position
+
+    def find(
+            self,
+            position: int,
+            *,
+            end: Optional[int] = None,
+            prev_length: int = 0,
+            max_chain_length: Optional[int] = None,
+    ) -> Optional[tuple[_LENGTH_T, _OFFSET_T]]:
+        """
+        Longest match for `position` among the previous window_size positions.
+
+        Only matches longer than `prev_length` are reported; the match may overlap `position`
+        but never runs past `end`. On equal lengths the closest match wins.
+        """
+        buffer = self.__buffer
+        base = self.__base
+        index = position - base
+
+        if end is None:
+            end = base + len(buffer)
+
+        max_length = min(self.max_match_length, end - position)
+        best_length = max(prev_length, self.min_match_length - 1)
+        if max_length <= best_length:
+            return None
+
+        candidate = self.__head.get(buffer[index: index + self.__hash_length], -1)
+
+        if max_chain_length is None:
+            max_chain_length = self.max_chain_length
+
+        nice_match_length = min(self.nice_match_length, max_length)
+        lowest = max(position - self.window_size, base)
+        prev = self.__prev
+        window_size = self.window_size
+
+        best_offset = None
+        chain_budget = max_chain_length
+
+        while candidate >= lowest and max_chain_length > 0:
+            candidate_index = candidate - base
+
+            if (
+                    buffer[candidate_index + best_length] == buffer[index + best_length]
+                    and buffer[candidate_index: candidate_index + best_length] == buffer[index: index + best_length]
+            ):
+                length = best_length + 1
+
+                while (
+                        length + _EXTEND_STEP <= max_length
+                        and buffer[candidate_index + length: candidate_index + length + _EXTEND_STEP]
+                        == buffer[index + length: index + length + _EXTEND_STEP]
+                ):
+                    length += _EXTEND_STEP
+
+                while length < max_length and buffer[candidate_index + length] == buffer[index + length]:
+                    length += 1
+
+                best_length = length
+                best_offset = position - candidate
+
+                if length >= nice_match_length:
+                    max_chain_length -= 1
+                    break
+
+            candidate = prev[candidate % window_size]
+            max_chain_length -= 1
+
+        self.search_count += 1
+        self.candidate_count += chain_budget - max_chain_length
+
+        if best_offset is None:
+            return None
+
+        return best_length, best_offset
+
+    def find_all(
+            self,
+            position: int,
+            *,
+            end: Optional[int] = None,
+            max_chain_length: Optional[int] = None,
+    ) -> list[tuple[_LENGTH_T, _OFFSET_T]]:
+        """
+        Every match for `position` that is longer than all closer ones, as (length, offset)
+        pairs with growing lengths and offsets.
+
+        Any length up to the last one is best taken at the offset of the first pair
+        reaching it, which is what an optimal parser needs to price all of them.
+        """
+        buffer = self.__buffer
+        base = self.__base
+        index = position - base
+
+        if end is None:
+            end = base + len(buffer)
+
+        max_length = min(self.max_match_length, end - position)
+        best_length = self.min_match_length - 1
+        if max_length <= best_length:
+            return []
+
+        candidate = self.__head.get(buffer[index: index + self.__hash_length], -1)
+
+        if max_chain_length is None:
+            max_chain_length = self.max_chain_length
+
+        nice_match_length = min(self.nice_match_length, max_length)
+        lowest = max(position - self.window_size, base)
+        prev = self.__prev
+        window_size = self.window_size
+
+        matches = []
+        chain_budget = max_chain_length
+
+        while candidate >= lowest and max_chain_length > 0:
+            candidate_index = candidate - base
+
+            if (
+                    buffer[candidate_index + best_length] == buffer[index + best_length]
+                    and buffer[candidate_index: candidate_index + best_length] == buffer[index: index + best_length]
+            ):
+                length = best_length + 1
+
+                while (
+                        length + _EXTEND_STEP <= max_length
+                        and buffer[candidate_index + length: candidate_index + length + _EXTEND_STEP]
+                        == buffer[index + length: index + length + _EXTEND_STEP]
+                ):
+                    length += _EXTEND_STEP
+
+                while length < max_length and buffer[candidate_index + length] == buffer[index + length]:
+                    length += 1
+
+                best_length = length
+                matches.append((length, position - candidate))
+
+                if length >= nice_match_length:
+                    max_chain_length -= 1
+                    break
+
+            candidate = prev[candidate % window_size]
+            max_chain_length -= 1
+
+        self.search_count += 1
+        self.candidate_count += chain_budget - max_chain_length
+
+        return matches
@@ -0,0 +1,190 @@
+"""
+Optimal parsing in the spirit of zopfli, for when ratio matters more than time.
+
+All matches of every position are collected once. A shortest path search then picks the
+tokens with the fewest bits under a cost model: Huffman code lengths of the literal/length
+and offset alphabets plus the extra bits of each length and offset. The first pass prices
+tokens with the fixed Huffman codes; every next pass uses the code lengths of the tokens
+the previous one chose, until the estimated size stops shrinking.
+"""
+import bisect
+from array import array
+from typing import Union
+
+from deflate.huffman.huffman import huffman_code_lengths
+from deflate.lzss.match_finder import HashChainMatchFinder
+from deflate.lzss.tokens import TokenStream
+from deflate.tables import (
+    FIXED_LITERAL_LENGTH_LENGTHS, FIXED_OFFSET_CODE_LENGTH, LENGTH_BASES, LENGTH_CODES, LENGTH_EXTRA_BITS,
+    MAX_MATCH_LENGTH, OFFSET_CODE_TABLE, offset_code,
+)
+from deflate.vectorized import token_histograms
+
+_CONTENT_T = Union[bytes, str]
+
+DEFAULT_ITERATIONS = 5
+
+# Every deflate-like token starts with a literal/match flag
+_TOKEN_FLAG_BITS = 1
+_END_OF_BLOCK = 256
+
+# All lengths of one length code cost the same, so only the shortest and the longest of
+# each code are tried (every length up to 18, where codes are at most 2 lengths wide),
+# plus the longest match itself
+_TRIED_LENGTHS = tuple(sorted(
+    {base for base in LENGTH_BASES}
+    | {min(base + (1 << extra_bits) - 1, MAX_MATCH_LENGTH) for base, extra_bits in zip(LENGTH_BASES, LENGTH_EXTRA_BITS)}
+))
+
+
+class _CostModel:
+    """Bits of a literal, of each match length and of each offset code, flag included"""
+
+    def __init__(self, literal_length_lengths: dict, offset_lengths: dict):
+        # A symbol the block doesn't use yet would get one of the longest codes
+        missing_literal_length = max(literal_length_lengths.values(), default=8) + 1
+        missing_offset_length = max(offset_lengths.values(), default=5) + 1
+
+        self.literal_costs = {symbol: length + _TOKEN_FLAG_BITS for symbol, length in literal_length_lengths.items()}
+        self.missing_literal_cost = missing_literal_length + _TOKEN_FLAG_BITS
+
+        self.length_costs = [0] * (MAX_MATCH_LENGTH + 1)
+        for length in range(LENGTH_BASES[0], MAX_MATCH_LENGTH + 1):
+            length_code, extra_bits, _ = LENGTH_CODES[length]
+            self.length_costs[length] = (
+                literal_length_lengths.get(length_code, missing_literal_length) + extra_bits + _TOKEN_FLAG_BITS
+            )
+
+        self.offset_code_costs = [
+            offset_lengths.get(code, missing_offset_length) + extra_bits
+            for code, (_, extra_bits) in enumerate(OFFSET_CODE_TABLE)
+        ]
+
+    @classmethod
+    def fixed(cls) -> '_CostModel':
+        return cls(
+            dict(enumerate(FIXED_LITERAL_LENGTH_LENGTHS)),
+            {code: FIXED_OFFSET_CODE_LENGTH for code in range(len(OFFSET_CODE_TABLE))},
+        )
+
+    @classmethod
+    def from_tokens(cls, tokens: TokenStream) -> tuple['_CostModel', int]:
+        """Cost model of a dynamic Huffman block holding tokens, and the size of that block's tokens"""
+        histograms = token_histograms(tokens)
+        literal_length_counts = histograms.literal_length_counts
+        literal_length_counts[_END_OF_BLOCK] += 1
+
+        literal_length_lengths = huffman_code_lengths(literal_length_counts)
+        offset_lengths = huffman_code_lengths(histograms.offset_counts)
+
+        bit_count = histograms.extra_bit_count + histograms.token_count * _TOKEN_FLAG_BITS + sum(
+            count * literal_length_lengths[symbol] for symbol, count in literal_length_counts.items()
+        ) + sum(
+            count * offset_lengths[code] for code, count in histograms.offset_counts.items()
+        )
+
+        return cls(literal_length_lengths, offset_lengths), bit_count
+
+
+def collect_matches(
+        match_finder: HashChainMatchFinder,
+        data_length: int,
+) -> list[list[tuple[int, int]]]:
+    """find_all for every position of the last data_length symbols fed, indexing them all"""
+    end = match_finder.end
+    matches = []
+
+    for position in range(end - data_length, end):
+        matches.append(match_finder.find_all(position, end=end))
+        match_finder.insert(position)
+
+    return matches
+
+
+def optimal_parse(
+        data: _CONTENT_T,
+        matches: list[list[tuple[int, int]]],
+        iterations: int = DEFAULT_ITERATIONS,
+) -> TokenStream:
+    text = isinstance(data, str)
+    symbols = list(map(ord, data)) if text else data
+
+    tokens = _shortest_path(symbols, matches, _CostModel.fixed(), text)
+    model, bit_count = _CostModel.from_tokens(tokens)
+
+    for _ in range(iterations - 1):
+        next_tokens = _shortest_path(symbols, matches, model, text)
+        next_model, next_bit_count = _CostModel.from_tokens(next_tokens)
+
+        if next_bit_count >= bit_count:
+            break
+
+        tokens, model, bit_count = next_tokens, next_model, next_bit_count
+
+    return tokens
+
+
+def _shortest_path(
+        symbols: Union[bytes, list[int]],
+        matches: list[list[tuple[int, int]]],
+        model: _CostModel,
+        text: bool,
+) -> TokenStream:
+    data_length = len(symbols)
+    literal_costs = model.literal_costs
+    missing_literal_cost = model.missing_literal_cost
+    length_costs = model.length_costs
+    offset_code_costs = model.offset_code_costs
+    tried_lengths = _TRIED_LENGTHS
+    min_length = tried_lengths[0]
+
+    # costs[i]: fewest bits for the first i symbols; the last token there is a literal
+    # when lengths[i] is 0 and a match of lengths[i] symbols at offsets[i] otherwise
+    costs = [0] + [float('inf')] * data_length
+    lengths = [0] * (data_length + 1)
+    offsets = [0] * (data_length + 1)
+
+    for position in range(data_length):
+        cost = costs[position]
+
+        literal_cost = cost + literal_costs.get(symbols[position], missing_literal_cost)
+        if literal_cost < costs[position + 1]:
+            costs[position + 1] = literal_cost
+            lengths[position + 1] = 0
+
+        shortest = min_length
+        for longest, offset in matches[position]:
+            match_cost = cost + offset_code_costs[offset_code(offset)]
+
+            first = bisect.bisect_left(tried_lengths, shortest)
+            last = bisect.bisect_left(tried_lengths, longest)
+            for length in (*tried_lengths[first: last], longest):
+                length_cost = match_cost + length_costs[length]
+                target = position + length
+
+                if length_cost < costs[target]:
+                    costs[target] = length_cost
+                    lengths[target] = length
+                    offsets[target] = offset
+
+            shortest = longest + 1
+
+    token_lengths = array('H')
+    token_values = array('I')
+    position = data_length
+
+    while position > 0:
+        length = lengths[position]
+        if length:
+            token_lengths.append(length)
+            token_values.append(offsets[position])
+            position -= length
+        else:
+            token_lengths.append(0)
+            token_values.append(symbols[position - 1])
+            position -= 1
+
+    token_lengths.reverse()
+    token_values.reverse()
+
+    return TokenStream(token_lengths, token_values, text)
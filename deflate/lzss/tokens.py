@@ -0,0 +1,132 @@
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Union
+
+_OFFSET_T = int
+_LENGTH_T = int
+
+# Match lengths fit 16 bits; symbols (code points of text) and offsets need more
+_LENGTHS_TYPECODE = 'H'
+_VALUES_TYPECODE = 'I'
+
+_HEADER = struct.Struct('<IB')
+_TEXT_FLAG = 0x01
+
+
+@dataclass
+class EncodeResult:
+    symbol: Union[str, int, None]
+    offset: Optional[_OFFSET_T]
+    length: Optional[_LENGTH_T]
+
+
+class TokenStream:
+    """
+    LZSS tokens as two parallel arrays instead of an object per token.
+
+    lengths[i] is 0 for a literal and the match length otherwise; values[i] is the literal
+    symbol (its code point for text) or the match offset. Hot loops go over the columns,
+    e.g. zip(tokens.lengths, tokens.values); iterating or indexing the stream itself builds
+    EncodeResult views. Slices are token streams again, copied at C speed.
+    """
+
+    __slots__ = ('lengths', 'values', 'text')
+
+    def __init__(self, lengths: Optional[array] = None, values: Optional[array] = None, text: bool = False):
+        self.lengths = array(_LENGTHS_TYPECODE) if lengths is None else lengths
+        self.values = array(_VALUES_TYPECODE) if values is None else values
+        # Literals of str input come back as str symbols
+        self.text = text
+
+    @classmethod
+    def literals(cls, data: Union[bytes, str]) -> 'TokenStream':
+        text = isinstance(data, str)
+        # Given bytes, array() would take them as its raw machine values
+        values = array(_VALUES_TYPECODE, map(ord, data) if text else iter(data))
+        return cls(array(_LENGTHS_TYPECODE, [0]) * len(data), values, text)
+
+    @classmethod
+    def from_results(cls, lzss_result: Iterable[EncodeResult]) -> 'TokenStream':
+        tokens = cls()
+        for lzss_encoded in lzss_result:
+            if lzss_encoded.offset is not None:
+                tokens.append_match(lzss_encoded.length, lzss_encoded.offset)
+            elif isinstance(lzss_encoded.symbol, str):
+                tokens.text = True
+                tokens.append_literal(ord(lzss_encoded.symbol))
+            else:
+                tokens.append_literal(lzss_encoded.symbol)
+
+        return tokens
+
+    def append_literal(self, symbol: int):
+        self.lengths.append(0)
+        self.values.append(symbol)
+
+    def append_match(self, length: int, offset: int):
+        self.lengths.append(length)
+        self.values.append(offset)
+
+    @property
+    def match_count(self) -> int:
+        return len(self.lengths) - self.lengths.count(0)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __iter__(self) -> Iterator[EncodeResult]:
+        for length, value in zip(self.lengths, self.values):
+            yield self.__result(length, value)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[EncodeResult, 'TokenStream']:
+        if isinstance(index, slice):
+            return TokenStream(self.lengths[index], self.values[index], self.text)
+
+        return self.__result(self.lengths[index], self.values[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TokenStream):
+            return NotImplemented
+
+        return self.lengths == other.lengths and self.values == other.values and self.text == other.text
+
+    def __repr__(self) -> str:
+        return f'TokenStream({len(self)} tokens, {self.match_count} matches)'
+
+    def to_bytes(self) -> bytes:
+        """Little-endian serialization, 6 bytes per token"""
+        lengths, values = self.lengths, self.values
+        if sys.byteorder == 'big':
+            lengths, values = array(lengths.typecode, lengths), array(values.typecode, values)
+            lengths.byteswap()
+            values.byteswap()
+
+        header = _HEADER.pack(len(self), _TEXT_FLAG if self.text else 0)
+        return header + lengths.tobytes() + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TokenStream':
+        token_count, flags = _HEADER.unpack_from(data)
+        lengths = array(_LENGTHS_TYPECODE)
+        values = array(_VALUES_TYPECODE)
+
+        lengths_end = _HEADER.size + token_count * lengths.itemsize
+        lengths.frombytes(data[_HEADER.size: lengths_end])
+        values.frombytes(data[lengths_end: lengths_end + token_count * values.itemsize])
+
+        if len(values) != token_count:
+            raise ValueError(f'Truncated token stream: {len(values)} of {token_count} tokens')
+
+        if sys.byteorder == 'big':
+            lengths.byteswap()
+            values.byteswap()
+
+        return cls(lengths, values, bool(flags & _TEXT_FLAG))
+
+    def __result(self, length: int, value: int) -> EncodeResult:
+        if length:
+            return EncodeResult(symbol=None, offset=value, length=length)
+
+        return EncodeResult(symbol=chr(value) if self.text else value, offset=None, length=None)
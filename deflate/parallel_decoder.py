@@ -0,0 +1,184 @@
+"""
+Multi-core decompression of seekable containers, primed ones (seekable.parallel_compress_file)
+included.
+
+Frames of a plain container are independent, so workers decode them straight to bytes. A
+primed frame refers to the window before it, so it can't be decoded alone. Workers decode
+those frames anyway, in two phases: a worker decodes with stand-ins for the unknown window,
+symbols above 255 that tell which window byte a match copied, and returns the content along
+with where it still holds stand-ins, as slices of the window. The parent then takes the
+frames in order, copies those slices from the window it already has and writes them out.
+
+    python -m deflate.parallel_decoder archive.dls restored.txt --processes 4
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from array import array
+from contextlib import closing
+from multiprocessing import Pool
+from multiprocessing.pool import AsyncResult
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Union
+
+from deflate.decoder import DeflateLikeDecoder
+from deflate.seekable import Frame, SeekableReader
+from deflate.utils import ordered_results
+
+# Frame content as bytes, wrong where it comes from the window, and the slices of the window
+# that belong there as (start, window start, length)
+_DECODED_FRAME_T = tuple[bytes, list[tuple[int, int, int]]]
+_FRAME_DECODER_T = Callable[[bytes, int], Union[bytes, _DECODED_FRAME_T]]
+
+# Symbols of 4 bytes; a stand-in has the top one set, a byte never does
+_SYMBOLS_TYPECODE = 'I'
+_STAND_IN = 1 << 24
+_TOP_BYTE = 3 if sys.byteorder == 'little' else 0
+_LOW_BYTE = 0 if sys.byteorder == 'little' else 3
+_STAND_IN_RUN = re.compile(rb'[^\x00]+')
+
+
+def _decode_plain_frame(frame: bytes, window_size: int) -> bytes:
+    return DeflateLikeDecoder(window_size).decode(frame)
+
+
+def _decode_primed_frame(frame: bytes, window_size: int) -> _DECODED_FRAME_T:
+    stand_ins = array(_SYMBOLS_TYPECODE, range(_STAND_IN, _STAND_IN + window_size))
+    content = array(_SYMBOLS_TYPECODE)
+
+    for block in DeflateLikeDecoder(window_size).iter_decode(frame, stand_ins):
+        content += block
+
+    with memoryview(content).cast('B') as raw:
+        top_bytes = bytes(raw[_TOP_BYTE::content.itemsize])
+        low_bytes = bytes(raw[_LOW_BYTE::content.itemsize])
+
+    return low_bytes, [
+        window_slice
+        for run in _STAND_IN_RUN.finditer(top_bytes)
+        for window_slice in _window_slices(content, run.start(), run.end())
+    ]
+
+
+def _window_slices(content: array, start: int, end: int) -> Iterator[tuple[int, int, int]]:
+    """content[start: end] as slices of the window, split where the stand-ins stop being consecutive"""
+    slice_start = start
+    window_start = content[start] - _STAND_IN
+
+    for position in range(start + 1, end):
+        if content[position] - _STAND_IN != window_start + position - slice_start:
+            yield slice_start, window_start, position - slice_start
+            slice_start = position
+            window_start = content[position] - _STAND_IN
+
+    yield slice_start, window_start, end - slice_start
+
+
+def _decode_file_frame(file_path: str, offset: int, size: int, decode: _FRAME_DECODER_T, window_size: int):
+    # Frames are read here rather than pickled to the worker
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return decode(f.read(size), window_size)
+
+
+def _decoded_contents(async_results: Iterable[AsyncResult], primed: bool, window_size: int) -> Iterator[bytes]:
+    decoded_frames = (async_result.get() for async_result in async_results)
+    return _resolve(decoded_frames, window_size) if primed else decoded_frames
+
+
+def _resolve(decoded_frames: Iterable[_DECODED_FRAME_T], window_size: int) -> Iterator[bytes]:
+    # The window is zero padded at the start of the content, where no valid match reaches
+    window = bytes(window_size)
+
+    for content, unresolved in decoded_frames:
+        if unresolved:
+            content = bytearray(content)
+            for start, window_start, length in unresolved:
+                content[start: start + length] = window[window_start: window_start + length]
+            content = bytes(content)
+
+        yield content
+        window = (window + content)[-window_size:]
+
+
+def _checked(contents: Iterable[bytes], frames: list[Frame]) -> Iterator[bytes]:
+    for index, (frame, content) in enumerate(zip(frames, contents)):
+        if len(content) != frame.uncompressed_size:
+            raise ValueError(f'Frame {index} decoded to {len(content)} bytes, the index says {frame.uncompressed_size}')
+
+        yield content
+
+
+def _frame_decoder(reader: SeekableReader) -> _FRAME_DECODER_T:
+    return _decode_primed_frame if reader.primed else _decode_plain_frame
+
+
+def parallel_decompress(data: bytes, *, processes: Optional[int] = None) -> bytes:
+    reader = SeekableReader(data)
+    decode = _frame_decoder(reader)
+    tasks = ((decode, (reader.read_frame(index), reader.window_size)) for index in range(len(reader.frames)))
+    processes = processes or os.cpu_count() or 1
+
+    # The results are closed before the pool, which terminates the tasks they would wait for
+    with Pool(processes) as pool, closing(ordered_results(pool, tasks, 2 * processes)) as async_results:
+        contents = _decoded_contents(async_results, reader.primed, reader.window_size)
+        return b''.join(_checked(contents, reader.frames))
+
+
+def decompress_file(
+        input_path: str,
+        output_path: str,
+        *,
+        processes: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+) -> int:
+    """
+    Decompress a container file into output_path, returning the decompressed size.
+
+    Frames are written in order as soon as they are decoded, so memory depends on the frame
+    size and max_in_flight but not on the file size.
+    """
+    with open(input_path, 'rb') as f:
+        reader = SeekableReader(f)
+        frames, window_size, primed, decode = reader.frames, reader.window_size, reader.primed, _frame_decoder(reader)
+
+    processes = processes or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * processes
+    tasks = (
+        (_decode_file_frame, (input_path, frame.compressed_offset, frame.compressed_size, decode, window_size))
+        for frame in frames
+    )
+
+    with Pool(processes) as pool, closing(ordered_results(pool, tasks, max_in_flight)) as async_results:
+        with open(output_path, 'wb') as output:
+            return _write_frames(_checked(_decoded_contents(async_results, primed, window_size), frames), output)
+
+
+def _write_frames(contents: Iterable[bytes], output: BinaryIO) -> int:
+    written = 0
+
+    for content in contents:
+        output.write(content)
+        written += len(content)
+
+    return written
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m deflate.parallel_decoder', description='Decompress a seekable container on all cores')
+    parser.add_argument('input', help='container written by deflate.seekable')
+    parser.add_argument('output', help='file to write the content to')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--max-in-flight', type=int, help='frames queued or held at once (default: twice the processes)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    written = decompress_file(args.input, args.output, processes=args.processes, max_in_flight=args.max_in_flight)
+
+    print(f'Decompressed {written} bytes in {time.perf_counter() - start:.2f} seconds')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
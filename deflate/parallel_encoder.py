@@ -0,0 +1,349 @@
+import functools
+import mmap
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool, shared_memory
+from multiprocessing.pool import AsyncResult
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from deflate.bitio import BitWriter, PackedBits
+from deflate.encoder import DeflateLikeEncoder
+from deflate.lzss.chunk_compressor import Lzss
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.stats import EncoderStats
+from deflate.utils import ordered_results
+
+# A compressed part, its stats and the seconds the worker spent on it
+_WORKER_RESULT_T = tuple[PackedBits, Optional[EncoderStats], float]
+_TASK_T = tuple[Callable[..., _WORKER_RESULT_T], tuple]
+
+
+def compress_chunk(
+        chunk: bytes,
+        history: bytes = b'',
+        *,
+        window_size: int = 32768,
+        level: int = DEFAULT_LEVEL,
+        block_size: Optional[int] = None,
+        stats: Optional[EncoderStats] = None,
+) -> PackedBits:
+    """
+    Encode chunk as if the history had just been encoded by the same stream (pigz-style).
+
+    Matches may reach back into history, so the result is only decodable right after the
+    blocks holding history. block_size splits the chunk into several blocks.
+    """
+    lzss = Lzss(window_size=window_size, level=level, stats=stats).stream()
+    if history:
+        lzss.prime(history[-window_size:])
+
+    encoder = DeflateLikeEncoder(window_size, level, stats)
+    writer = BitWriter()
+    block_size = block_size or len(chunk) or 1
+
+    for start in range(0, len(chunk), block_size):
+        block = chunk[start: start + block_size]
+        encoder.write_chunk(block, lzss, writer)
+
+    return writer.getvalue()
+
+
+def concatenate(parts: Iterable[PackedBits]) -> PackedBits:
+    """Join encoded chunks bit-exactly into one stream"""
+    writer = BitWriter()
+
+    for part in parts:
+        writer.write_packed(part)
+
+    return writer.getvalue()
+
+
+def compress_primed_chunk(history: bytes, chunk: bytes, *, collect_stats: bool, **kwargs) -> _WORKER_RESULT_T:
+    """compress_chunk for a worker process: stats can't be shared, so it fills and returns its own"""
+    start = time.perf_counter()
+    chunk_stats = EncoderStats() if collect_stats else None
+    part = compress_chunk(chunk, history, stats=chunk_stats, **kwargs)
+    return part, chunk_stats, time.perf_counter() - start
+
+
+def parallel_compress(
+        data: bytes,
+        *,
+        chunk_size: int = 131072,
+        window_size: int = 32768,
+        level: int = DEFAULT_LEVEL,
+        block_size: Optional[int] = None,
+        processes: Optional[int] = None,
+        stats: Optional[EncoderStats] = None,
+) -> PackedBits:
+    """
+    Compress chunks on a process pool, each primed with the window_size bytes before it.
+
+    Workers stay independent, yet the concatenated output is one stream that compresses
+    almost like a serial run, since only the LZSS parse restarts at chunk boundaries.
+    Each worker fills its own EncoderStats, which are merged into stats.
+    """
+    with ParallelDeflateEncoder(
+            chunk_size=chunk_size, window_size=window_size, level=level, block_size=block_size,
+            processes=processes, stats=stats,
+    ) as encoder:
+        return encoder.compress(data)
+
+
+# Input slots of the ParallelDeflateEncoder that started this worker
+_input_segment: Optional[shared_memory.SharedMemory] = None
+
+
+def _attach_input_segment(segment_name: str):
+    global _input_segment
+    _input_segment = shared_memory.SharedMemory(segment_name)
+
+
+def _compress_shared_slot(slot_start: int, history_length: int, chunk_length: int, **kwargs) -> _WORKER_RESULT_T:
+    # The parent wrote history and chunk into the slot, only where it is travels through the pool
+    chunk_start = slot_start + history_length
+    history = bytes(_input_segment.buf[slot_start: chunk_start])
+    chunk = bytes(_input_segment.buf[chunk_start: chunk_start + chunk_length])
+
+    return compress_primed_chunk(history, chunk, **kwargs)
+
+
+def _compress_file_range(file_path: str, start: int, length: int, *, window_size: int, **kwargs) -> _WORKER_RESULT_T:
+    # Each worker maps the file itself, so only (offset, length) travels through the pool
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        history = mapped[max(0, start - window_size): start]
+        chunk = mapped[start: start + length]
+
+    return compress_primed_chunk(history, chunk, window_size=window_size, **kwargs)
+
+
+def _ping(_) -> int:
+    return os.getpid()
+
+
+@dataclass
+class PoolMetrics:
+    """What a ParallelDeflateEncoder spent around the actual compression, to size its pool"""
+    # From creating the pool until it answered one task per worker
+    worker_startup_seconds: float = 0.0
+    chunks: int = 0
+    # Pickled tasks sent to workers and compressed bytes received back
+    ipc_bytes_sent: int = 0
+    ipc_bytes_received: int = 0
+    # Input handed over through shared memory instead of the pool pipes
+    shared_memory_bytes: int = 0
+    # Waiting for the next result in order, and compressing in the workers
+    queue_wait_seconds: float = 0.0
+    worker_busy_seconds: float = 0.0
+
+
+class ParallelDeflateEncoder:
+    """
+    A long-lived process pool for compressing many inputs, one at a time, the way
+    parallel_compress does.
+
+    Chunks are scheduled imap-style: at most max_in_flight are queued or held at once and
+    results come back in order as soon as they are ready. Input reaches the workers through
+    shared memory (bytes and streams) or their own mmap (files), output comes back as
+    PackedBits. metrics add up over all inputs.
+
+    The shared memory holds max_in_flight slots of window_size + chunk_size bytes, and a
+    chunk takes the slot of the chunk max_in_flight before it, whose result is in by then.
+    Workers attach to it once, at startup.
+    """
+
+    def __init__(
+            self,
+            *,
+            chunk_size: int = 131072,
+            window_size: int = 32768,
+            level: int = DEFAULT_LEVEL,
+            block_size: Optional[int] = None,
+            processes: Optional[int] = None,
+            max_in_flight: Optional[int] = None,
+            stats: Optional[EncoderStats] = None,
+    ):
+        if chunk_size <= 0:
+            raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+
+        processes = processes or os.cpu_count() or 1
+
+        self.__chunk_size = chunk_size
+        self.__window_size = window_size
+        self.__max_in_flight = max_in_flight or 2 * processes
+        self.__stats = stats
+        self.__worker_kwargs = dict(
+            window_size=window_size, level=level, block_size=block_size, collect_stats=stats is not None,
+        )
+        self.__busy = False
+        self.metrics = PoolMetrics()
+
+        self.__slot_size = window_size + chunk_size
+        self.__input_segment = shared_memory.SharedMemory(create=True, size=self.__max_in_flight * self.__slot_size)
+
+        start = time.perf_counter()
+        try:
+            self.__pool = Pool(processes, initializer=_attach_input_segment, initargs=(self.__input_segment.name,))
+        except BaseException:
+            # The caller never gets the encoder, so nothing else would unlink the segment
+            self.__release_input_segment()
+            raise
+
+        try:
+            self.__pool.map(_ping, range(processes), chunksize=1)
+        except BaseException:
+            self.__pool.terminate()
+            self.__release_input_segment()
+            raise
+
+        self.metrics.worker_startup_seconds = time.perf_counter() - start
+
+    def __enter__(self) -> 'ParallelDeflateEncoder':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.__pool.terminate()
+            self.__release_input_segment()
+
+    def close(self):
+        """Let the workers finish and stop them"""
+        self.__pool.close()
+        self.__pool.join()
+        self.__release_input_segment()
+
+    def compress(self, data: bytes) -> PackedBits:
+        chunks = (data[start: start + self.__chunk_size] for start in range(0, len(data), self.__chunk_size))
+        return concatenate(self.__compress_chunks(chunks))
+
+    def compress_stream(self, stream: BinaryIO) -> Iterator[bytes]:
+        """Compressed bytes of a binary stream read to the end, the last byte zero padded"""
+        chunks = iter(functools.partial(stream.read, self.__chunk_size), b'')
+        return _iter_bytes(self.__compress_chunks(chunks))
+
+    def compress_file(self, input_path: str, output_path: str) -> int:
+        """Compress a file of any size into output_path, returning the compressed size"""
+        with open(output_path, 'wb') as output:
+            return _write_parts(self.compress_file_parts(input_path), output)
+
+    def compress_file_parts(self, input_path: str) -> Iterator[PackedBits]:
+        """The compressed chunks of a file, one per chunk_size bytes, in order"""
+        file_size = os.path.getsize(input_path)
+        compress_range = functools.partial(_compress_file_range, **self.__worker_kwargs)
+
+        tasks = (
+            (compress_range, (input_path, start, min(self.__chunk_size, file_size - start)))
+            for start in range(0, file_size, self.__chunk_size)
+        )
+
+        return self.__ordered(tasks)
+
+    def __compress_chunks(self, chunks: Iterable[bytes]) -> Iterator[PackedBits]:
+        return self.__ordered(self.__shared_tasks(chunks))
+
+    def __shared_tasks(self, chunks: Iterable[bytes]) -> Iterator[_TASK_T]:
+        compress_slot = functools.partial(_compress_shared_slot, **self.__worker_kwargs)
+        buffer = self.__input_segment.buf
+        history = b''
+
+        for index, chunk in enumerate(chunks):
+            slot_start = index % self.__max_in_flight * self.__slot_size
+            chunk_start = slot_start + len(history)
+            buffer[slot_start: chunk_start] = history
+            buffer[chunk_start: chunk_start + len(chunk)] = chunk
+            self.metrics.shared_memory_bytes += len(history) + len(chunk)
+
+            yield compress_slot, (slot_start, len(history), len(chunk))
+            history = (history + chunk)[-self.__window_size:]
+
+    def __ordered(self, tasks: Iterable[_TASK_T]) -> Iterator[PackedBits]:
+        if self.__busy:
+            raise RuntimeError('ParallelDeflateEncoder compresses one input at a time')
+
+        self.__busy = True
+        # The next task is only taken (and its slot written) once the result before it is in
+        async_results = ordered_results(self.__pool, self.__measured(tasks), self.__max_in_flight)
+
+        try:
+            for async_result in async_results:
+                yield self.__result(async_result)
+        finally:
+            # Chunks of an input that was given up on must not be running when the slots are reused
+            async_results.close()
+            self.__busy = False
+
+    def __measured(self, tasks: Iterable[_TASK_T]) -> Iterator[_TASK_T]:
+        for task in tasks:
+            self.metrics.ipc_bytes_sent += len(pickle.dumps(task))
+            yield task
+
+    def __result(self, async_result: AsyncResult) -> PackedBits:
+        start = time.perf_counter()
+        part, chunk_stats, busy_seconds = async_result.get()
+
+        metrics = self.metrics
+        metrics.queue_wait_seconds += time.perf_counter() - start
+        metrics.worker_busy_seconds += busy_seconds
+        metrics.ipc_bytes_received += len(part.data)
+        metrics.chunks += 1
+
+        if self.__stats is not None:
+            self.__stats.merge(chunk_stats)
+
+        return part
+
+    def __release_input_segment(self):
+        self.__input_segment.close()
+        self.__input_segment.unlink()
+
+
+def _iter_bytes(parts: Iterable[PackedBits]) -> Iterator[bytes]:
+    writer = BitWriter()
+
+    for part in parts:
+        writer.write_packed(part)
+        if data := writer.take_bytes():
+            yield data
+
+    if tail := writer.getvalue().data:
+        yield tail
+
+
+def _write_parts(parts: Iterable[PackedBits], output: BinaryIO) -> int:
+    written = 0
+
+    for data in _iter_bytes(parts):
+        output.write(data)
+        written += len(data)
+
+    return written
+
+
+def compress_file(
+        input_path: str,
+        output_path: str,
+        *,
+        chunk_size: int = 131072,
+        window_size: int = 32768,
+        level: int = DEFAULT_LEVEL,
+        block_size: Optional[int] = None,
+        processes: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        stats: Optional[EncoderStats] = None,
+) -> int:
+    """
+    parallel_compress for files of any size, returning the compressed size.
+
+    Workers read their ranges through mmap, and at most max_in_flight chunks are queued or
+    held at once: results are written in order as soon as they are ready, so memory
+    depends on chunk_size and the pool size but not on the file size.
+    """
+    with ParallelDeflateEncoder(
+            chunk_size=chunk_size, window_size=window_size, level=level, block_size=block_size,
+            processes=processes, max_in_flight=max_in_flight, stats=stats,
+    ) as encoder:
+        return encoder.compress_file(input_path, output_path)
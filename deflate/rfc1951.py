@@ -0,0 +1,282 @@
+import logging
+import struct
+from collections import Counter
+from typing import Optional
+
+from deflate.bitio import LsbBitWriter
+from deflate.compressibility import Compressibility, marginal_chain_length, probe
+from deflate.huffman.code_lengths import RUN_EXTRA_BITS, run_length_encode
+from deflate.huffman.huffman import huffman_code_lengths, canonical_codes, MAX_CODE_LENGTH
+from deflate.lzss.chunk_compressor import Lzss
+from deflate.lzss.levels import DEFAULT_LEVEL, MatchStrategy, compression_level
+from deflate.lzss.tokens import TokenStream
+from deflate.stats import DYNAMIC_HUFFMAN_BLOCK, FIXED_HUFFMAN_BLOCK, STORED_BLOCK, EncoderStats, stage_timer
+from deflate.tables import (
+    FIXED_LITERAL_LENGTH_LENGTHS, FIXED_OFFSET_CODE_LENGTH, LENGTH_CODES, OFFSET_CODE_TABLE, offset_code,
+)
+from deflate.vectorized import token_histograms
+
+logger = logging.getLogger(__name__)
+
+MAX_WINDOW_SIZE = 32768
+MAX_STORED_BLOCK_SIZE = 65535
+
+STORED_BTYPE = 0b00
+FIXED_HUFFMAN_BTYPE = 0b01
+DYNAMIC_HUFFMAN_BTYPE = 0b10
+
+END_OF_BLOCK = 256
+LITERAL_LENGTH_CODE_COUNT = 286
+OFFSET_CODE_COUNT = 30
+
+CODE_LENGTH_ORDER = (16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15)
+MAX_CODE_LENGTH_CODE_LENGTH = 7
+
+FIXED_OFFSET_LENGTHS = [FIXED_OFFSET_CODE_LENGTH] * OFFSET_CODE_COUNT
+
+_REVERSED_CODE_T = tuple[int, int]
+
+
+def _reverse_bits(code: int, length: int) -> int:
+    return int('{:0{}b}'.format(code, length)[::-1], 2)
+
+
+def _reversed_codes(code_lengths: list[int]) -> list[_REVERSED_CODE_T]:
+    """Dense symbol -> (bit-reversed canonical code, length), ready for LsbBitWriter"""
+    codes = canonical_codes(dict(enumerate(code_lengths)))
+    return [
+        (_reverse_bits(*codes[symbol]), code_lengths[symbol]) if symbol in codes else (0, 0)
+        for symbol in range(len(code_lengths))
+    ]
+
+
+def _dense_code_lengths(counts: Counter, max_code_length: int, min_count: int) -> list[int]:
+    # Like zlib's build_tree, force at least two codes so that every code is complete
+    counts = +counts
+    for dummy_symbol in (0, 1):
+        if len(counts) >= 2:
+            break
+        counts[dummy_symbol] = counts[dummy_symbol] or 1
+
+    code_lengths = huffman_code_lengths(counts, max_code_length)
+    dense = [0] * max(min_count, max(code_lengths) + 1)
+    for symbol, length in code_lengths.items():
+        dense[symbol] = length
+
+    return dense
+
+
+class _BlockStatistics:
+    def __init__(self, lzss_result: TokenStream):
+        histograms = token_histograms(lzss_result)
+
+        self.literal_length_counts = histograms.literal_length_counts
+        self.offset_counts = histograms.offset_counts
+        self.extra_bit_count = histograms.extra_bit_count
+
+        self.literal_length_counts[END_OF_BLOCK] += 1
+
+    def cost(self, literal_length_lengths: list[int], offset_lengths: list[int]) -> int:
+        return self.extra_bit_count + sum(
+            count * literal_length_lengths[symbol] for symbol, count in self.literal_length_counts.items()
+        ) + sum(
+            count * offset_lengths[symbol] for symbol, count in self.offset_counts.items()
+        )
+
+
+class _DynamicHeader:
+    def __init__(self, literal_length_lengths: list[int], offset_lengths: list[int]):
+        self.literal_length_lengths = literal_length_lengths
+        self.offset_lengths = offset_lengths
+
+        self.tokens = run_length_encode(literal_length_lengths + offset_lengths)
+        self.code_length_lengths = _dense_code_lengths(
+            Counter(symbol for symbol, _ in self.tokens), MAX_CODE_LENGTH_CODE_LENGTH, len(CODE_LENGTH_ORDER),
+        )
+
+        ordered = [self.code_length_lengths[symbol] for symbol in CODE_LENGTH_ORDER]
+        while len(ordered) > 4 and ordered[-1] == 0:
+            ordered.pop()
+        self.ordered_code_length_lengths = ordered
+
+    @property
+    def bit_count(self) -> int:
+        return 5 + 5 + 4 + 3 * len(self.ordered_code_length_lengths) + sum(
+            self.code_length_lengths[symbol] + (RUN_EXTRA_BITS[symbol][0] if symbol in RUN_EXTRA_BITS else 0)
+            for symbol, _ in self.tokens
+        )
+
+    def write(self, writer: LsbBitWriter):
+        writer.write(len(self.literal_length_lengths) - 257, 5)
+        writer.write(len(self.offset_lengths) - 1, 5)
+        writer.write(len(self.ordered_code_length_lengths) - 4, 4)
+
+        for length in self.ordered_code_length_lengths:
+            writer.write(length, 3)
+
+        codes = _reversed_codes(self.code_length_lengths)
+        for symbol, extra in self.tokens:
+            writer.write(*codes[symbol])
+            if symbol in RUN_EXTRA_BITS:
+                writer.write(extra, RUN_EXTRA_BITS[symbol][0])
+
+
+class RawDeflateEncoder:
+    """
+    RFC 1951 compliant encoder over the same LZSS token stream as DeflateLikeEncoder.
+
+    Each block is emitted as stored, fixed or dynamic Huffman, whichever is the shortest.
+    The interface mirrors DeflateLikeStreamEncoder: compress() / flush() / finish().
+    """
+
+    def __init__(
+            self,
+            window_size: int = MAX_WINDOW_SIZE,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+            dictionary: Optional[bytes] = None,
+    ):
+        """dictionary primes the window as zlib's deflateSetDictionary does"""
+        if not 0 < window_size <= MAX_WINDOW_SIZE:
+            raise ValueError(f'RFC 1951 window_size must be in 1..{MAX_WINDOW_SIZE}, got {window_size}')
+
+        if block_size <= 0:
+            raise ValueError(f'block_size must be positive, got {block_size}')
+
+        self.__block_size = block_size
+        self.__level = compression_level(level)
+        self.__stats = stats
+        self.__lzss = Lzss(window_size=window_size, level=level, dictionary=dictionary, stats=stats).stream()
+        self.__writer = LsbBitWriter()
+        self.__pending = bytearray()
+        self.__finished = False
+
+    def compress(self, data: bytes) -> bytes:
+        self.__check_not_finished()
+        self.__pending += data
+
+        while len(self.__pending) >= self.__block_size:
+            self.__write_block(bytes(self.__pending[:self.__block_size]), final=False)
+            del self.__pending[:self.__block_size]
+
+        return self.__writer.take_bytes()
+
+    def flush(self) -> bytes:
+        """Encode buffered input and byte-align the output with an empty stored block (zlib's Z_SYNC_FLUSH)"""
+        self.__check_not_finished()
+
+        if self.__pending:
+            self.__write_block(bytes(self.__pending), final=False)
+            self.__pending.clear()
+
+        self.__write_stored_block(b'', final=False)
+
+        return self.__writer.take_bytes()
+
+    def finish(self) -> bytes:
+        self.__check_not_finished()
+
+        self.__write_block(bytes(self.__pending), final=True)
+        self.__pending.clear()
+        self.__finished = True
+
+        self.__writer.align_to_byte()
+        return self.__writer.take_bytes()
+
+    def __write_block(self, block: bytes, *, final: bool):
+        if self.__level.strategy is MatchStrategy.LITERALS_ONLY:
+            self.__write_stored_block(block, final=final)
+            return
+
+        compressibility = probe(block)
+        if self.__stats is not None:
+            self.__stats.probe_results[compressibility.name.lower()] += 1
+
+        if compressibility is Compressibility.INCOMPRESSIBLE:
+            self.__lzss.skip(block)
+            self.__write_stored_block(block, final=final)
+            return
+
+        max_chain_length = None
+        if compressibility is Compressibility.MARGINAL:
+            max_chain_length = marginal_chain_length(self.__lzss.max_chain_length)
+
+        lzss_result = self.__lzss.compress(block, max_chain_length=max_chain_length)
+
+        with stage_timer(self.__stats, 'tree_seconds'):
+            statistics = _BlockStatistics(lzss_result)
+
+            header = _DynamicHeader(
+                _dense_code_lengths(statistics.literal_length_counts, MAX_CODE_LENGTH, 257),
+                _dense_code_lengths(statistics.offset_counts, MAX_CODE_LENGTH, 1),
+            )
+
+            dynamic_cost = header.bit_count + statistics.cost(header.literal_length_lengths, header.offset_lengths)
+            fixed_cost = statistics.cost(FIXED_LITERAL_LENGTH_LENGTHS, FIXED_OFFSET_LENGTHS)
+            stored_cost = 8 * len(block) + 40 * max(1, -(-len(block) // MAX_STORED_BLOCK_SIZE))
+
+        logger.debug('Block costs: dynamic=%d, fixed=%d, stored=%d', dynamic_cost, fixed_cost, stored_cost)
+
+        if stored_cost < min(dynamic_cost, fixed_cost):
+            self.__write_stored_block(block, final=final)
+            return
+
+        writer = self.__writer
+
+        with stage_timer(self.__stats, 'emit_seconds'):
+            writer.write(int(final), 1)
+
+            if fixed_cost <= dynamic_cost:
+                block_type = FIXED_HUFFMAN_BLOCK
+                writer.write(FIXED_HUFFMAN_BTYPE, 2)
+                self.__write_lzss_result(lzss_result, FIXED_LITERAL_LENGTH_LENGTHS, FIXED_OFFSET_LENGTHS)
+            else:
+                block_type = DYNAMIC_HUFFMAN_BLOCK
+                writer.write(DYNAMIC_HUFFMAN_BTYPE, 2)
+                header.write(writer)
+                self.__write_lzss_result(lzss_result, header.literal_length_lengths, header.offset_lengths)
+
+        if self.__stats is not None:
+            self.__stats.block_types[block_type] += 1
+
+    def __write_lzss_result(self, lzss_result: TokenStream, literal_length_lengths: list[int], offset_lengths: list[int]):
+        write = self.__writer.write
+        literal_length_codes = _reversed_codes(literal_length_lengths)
+        offset_codes = _reversed_codes(offset_lengths)
+
+        for length, value in zip(lzss_result.lengths, lzss_result.values):
+            if not length:
+                write(*literal_length_codes[value])
+                continue
+
+            length_code, length_extra_bits, base_length = LENGTH_CODES[length]
+            write(*literal_length_codes[length_code])
+            if length_extra_bits:
+                write(length - base_length, length_extra_bits)
+
+            code = offset_code(value)
+            write(*offset_codes[code])
+            base_offset, offset_extra_bits = OFFSET_CODE_TABLE[code]
+            if offset_extra_bits:
+                write(value - base_offset, offset_extra_bits)
+
+        write(*literal_length_codes[END_OF_BLOCK])
+
+    def __write_stored_block(self, block: bytes, *, final: bool):
+        writer = self.__writer
+        pieces = [block[start: start + MAX_STORED_BLOCK_SIZE] for start in range(0, len(block), MAX_STORED_BLOCK_SIZE)] or [b'']
+
+        with stage_timer(self.__stats, 'emit_seconds'):
+            for index, piece in enumerate(pieces):
+                writer.write(int(final and index == len(pieces) - 1), 1)
+                writer.write(STORED_BTYPE, 2)
+                writer.align_to_byte()
+                writer.write_bytes(struct.pack('<HH', len(piece), len(piece) ^ 0xFFFF) + piece)
+
+        if self.__stats is not None:
+            self.__stats.block_types[STORED_BLOCK] += len(pieces)
+
+    def __check_not_finished(self):
+        if self.__finished:
+            raise ValueError('Encoder is already finished')
@@ -0,0 +1,314 @@
+"""
+Seekable container: the input is cut into frames that are compressed independently and end
+on a byte boundary, followed by an index of the frames, so a byte range is read by decoding
+only the frames that cover it.
+
+    header:  magic b'DLS', version, flags, window size (big-endian uint32)
+    frames:  a deflate-like stream per frame_size bytes of input
+    index:   per frame: uncompressed offset, compressed offset (uint64),
+             uncompressed size, compressed size (uint32), all big-endian
+    footer:  frame count (big-endian uint32), magic b'DLX'
+
+Compressed offsets count from the start of the container. Restarting the window at every
+frame costs some ratio, the smaller the frames, the more. With FLAG_PRIMED, frames are
+primed with the window_size bytes before them instead, like the chunks of parallel_compress:
+they compress almost like one stream, but a frame only decodes once the content before it
+is known (or in two phases, see parallel_decoder).
+"""
+import bisect
+import io
+import os
+import struct
+from typing import BinaryIO, Iterable, NamedTuple, Optional, Union
+
+from deflate.decoder import DeflateLikeDecoder
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.parallel_encoder import ParallelDeflateEncoder, compress_chunk
+from deflate.stats import EncoderStats
+
+MAGIC = b'DLS'
+INDEX_MAGIC = b'DLX'
+FORMAT_VERSION = 1
+FLAG_PRIMED = 0x01
+
+DEFAULT_FRAME_SIZE = 262144
+
+_HEADER = struct.Struct('>3sBBI')
+_INDEX_ENTRY = struct.Struct('>QQII')
+_FOOTER = struct.Struct('>I3s')
+
+_SOURCE_T = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class Frame(NamedTuple):
+    uncompressed_offset: int
+    compressed_offset: int
+    uncompressed_size: int
+    compressed_size: int
+
+    @property
+    def uncompressed_end(self) -> int:
+        return self.uncompressed_offset + self.uncompressed_size
+
+
+class SeekableEncoder:
+    """
+    Streaming encoder of the container, fed like DeflateLikeStreamEncoder.
+
+    Input is cut into frames of frame_size bytes regardless of how it is fed; each frame is
+    a deflate-like stream of blocks of up to block_size bytes, primed with the window before
+    it if primed=True. The index is kept in memory until finish().
+    """
+
+    def __init__(
+            self,
+            frame_size: int = DEFAULT_FRAME_SIZE,
+            window_size: int = 32768,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+            primed: bool = False,
+    ):
+        if frame_size <= 0:
+            raise ValueError(f'frame_size must be positive, got {frame_size}')
+
+        self.__frame_size = frame_size
+        self.__compress_kwargs = dict(window_size=window_size, level=level, block_size=block_size, stats=stats)
+        self.__header = _HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_PRIMED if primed else 0, window_size)
+        self.__window_size = window_size
+        self.__primed = primed
+        self.__history = b''
+        self.__pending = bytearray()
+        self.__frames = []
+        self.__uncompressed_offset = 0
+        self.__compressed_offset = _HEADER.size
+        self.__finished = False
+
+    @property
+    def frames(self) -> list[Frame]:
+        return list(self.__frames)
+
+    def compress(self, data: bytes) -> bytes:
+        self.__check_not_finished()
+        self.__pending += data
+        parts = [self.__take_header()]
+
+        while len(self.__pending) >= self.__frame_size:
+            parts.append(self.__write_frame(bytes(self.__pending[:self.__frame_size])))
+            del self.__pending[:self.__frame_size]
+
+        return b''.join(parts)
+
+    def finish(self) -> bytes:
+        """Write the last frame and the index; the encoder can't be used afterwards"""
+        self.__check_not_finished()
+        parts = [self.__take_header()]
+
+        if self.__pending:
+            parts.append(self.__write_frame(bytes(self.__pending)))
+            self.__pending.clear()
+
+        parts.append(_index_bytes(self.__frames))
+        self.__finished = True
+
+        return b''.join(parts)
+
+    def __write_frame(self, frame: bytes) -> bytes:
+        compressed = compress_chunk(frame, self.__history, **self.__compress_kwargs).data
+        if self.__primed:
+            self.__history = (self.__history + frame)[-self.__window_size:]
+
+        self.__frames.append(Frame(self.__uncompressed_offset, self.__compressed_offset, len(frame), len(compressed)))
+        self.__uncompressed_offset += len(frame)
+        self.__compressed_offset += len(compressed)
+
+        return compressed
+
+    def __take_header(self) -> bytes:
+        header, self.__header = self.__header, b''
+        return header
+
+    def __check_not_finished(self):
+        if self.__finished:
+            raise ValueError('Encoder is already finished')
+
+
+class SeekableReader:
+    """
+    Random access to a container held in memory or in a seekable binary file.
+
+    Only the header and the index are read up front. read() decodes the frames covering the
+    requested range; the last decoded frame is kept, so small sequential reads decode every
+    frame once. Frames of a primed container need the content before them: reading one
+    decodes all frames from the last one kept (or the first one) up to it.
+    """
+
+    def __init__(self, source: _SOURCE_T):
+        self.__source = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+        flags, self.window_size = self.__read_header()
+        self.primed = bool(flags & FLAG_PRIMED)
+        self.frames = self.__read_index()
+        self.__frame_starts = [frame.uncompressed_offset for frame in self.frames]
+        self.__cached_index = None
+        self.__cached_frame = b''
+        # The window_size bytes before the kept frame, for primed containers
+        self.__cached_history = b''
+
+    @property
+    def size(self) -> int:
+        """Uncompressed size of the whole content"""
+        return self.frames[-1].uncompressed_end if self.frames else 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Up to length bytes from offset on; fewer at the end of the content, like a file"""
+        if offset < 0 or length < 0:
+            raise ValueError(f'Offset and length must not be negative, got {offset} and {length}')
+
+        end = min(offset + length, self.size)
+        index = bisect.bisect_right(self.__frame_starts, offset) - 1
+        parts = []
+
+        while offset < end:
+            frame = self.frames[index]
+            data = self.__frame_data(index)
+            parts.append(data[offset - frame.uncompressed_offset: end - frame.uncompressed_offset])
+            offset = frame.uncompressed_end
+            index += 1
+
+        return b''.join(parts)
+
+    def read_all(self) -> bytes:
+        return self.read(0, self.size)
+
+    def read_frame(self, index: int) -> bytes:
+        """The compressed bytes of a frame"""
+        frame = self.frames[index]
+        self.__source.seek(frame.compressed_offset)
+        return self.__source.read(frame.compressed_size)
+
+    def __frame_data(self, index: int) -> bytes:
+        if index == self.__cached_index:
+            return self.__cached_frame
+
+        if not self.primed:
+            self.__cached_index, self.__cached_frame = index, self.__decode_frame(index, b'')
+            return self.__cached_frame
+
+        if self.__cached_index is None or self.__cached_index > index:
+            self.__cached_index, self.__cached_frame, self.__cached_history = -1, b'', b''
+
+        while self.__cached_index < index:
+            history = (self.__cached_history + self.__cached_frame)[-self.window_size:]
+            next_index = self.__cached_index + 1
+            data = self.__decode_frame(next_index, history)
+            self.__cached_index, self.__cached_frame, self.__cached_history = next_index, data, history
+
+        return self.__cached_frame
+
+    def __decode_frame(self, index: int, history: bytes) -> bytes:
+        data = DeflateLikeDecoder(self.window_size).decode(self.read_frame(index), history)
+
+        expected_size = self.frames[index].uncompressed_size
+        if len(data) != expected_size:
+            raise ValueError(f'Frame {index} decoded to {len(data)} bytes, the index says {expected_size}')
+
+        return data
+
+    def __read_header(self) -> tuple[int, int]:
+        self.__source.seek(0)
+        header = self.__source.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError('Truncated container header')
+
+        magic, version, flags, window_size = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f'Not a seekable deflate-like container: magic {magic!r}')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported container version {version}')
+
+        return flags, window_size
+
+    def __read_index(self) -> list[Frame]:
+        container_size = self.__source.seek(0, io.SEEK_END)
+        index_end = container_size - _FOOTER.size
+        if index_end < _HEADER.size:
+            raise ValueError('Truncated container footer')
+
+        self.__source.seek(index_end)
+        frame_count, index_magic = _FOOTER.unpack(self.__source.read(_FOOTER.size))
+        if index_magic != INDEX_MAGIC:
+            raise ValueError(f'Container index not found: magic {index_magic!r}')
+
+        index_start = index_end - frame_count * _INDEX_ENTRY.size
+        if index_start < _HEADER.size:
+            raise ValueError(f'Index of {frame_count} frames does not fit the container')
+
+        self.__source.seek(index_start)
+        frames = [Frame(*entry) for entry in _INDEX_ENTRY.iter_unpack(self.__source.read(index_end - index_start))]
+
+        for frame in frames:
+            if frame.compressed_offset < _HEADER.size or frame.compressed_offset + frame.compressed_size > index_start:
+                raise ValueError(f'Frame at {frame.compressed_offset} lies outside of the container payload')
+
+        return frames
+
+
+def _index_bytes(frames: list[Frame]) -> bytes:
+    return b''.join(_INDEX_ENTRY.pack(*frame) for frame in frames) + _FOOTER.pack(len(frames), INDEX_MAGIC)
+
+
+def write_frames(output: BinaryIO, frames: Iterable[tuple[int, bytes]], *, window_size: int, flags: int = 0) -> int:
+    """Write a container of compressed frames given with their uncompressed sizes, returning its size"""
+    output.write(_HEADER.pack(MAGIC, FORMAT_VERSION, flags, window_size))
+    index = []
+    uncompressed_offset = 0
+    compressed_offset = _HEADER.size
+
+    for uncompressed_size, compressed in frames:
+        output.write(compressed)
+        index.append(Frame(uncompressed_offset, compressed_offset, uncompressed_size, len(compressed)))
+        uncompressed_offset += uncompressed_size
+        compressed_offset += len(compressed)
+
+    index_bytes = _index_bytes(index)
+    output.write(index_bytes)
+
+    return compressed_offset + len(index_bytes)
+
+
+def parallel_compress_file(
+        input_path: str,
+        output_path: str,
+        *,
+        frame_size: int = DEFAULT_FRAME_SIZE,
+        window_size: int = 32768,
+        level: int = DEFAULT_LEVEL,
+        block_size: Optional[int] = None,
+        processes: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        stats: Optional[EncoderStats] = None,
+) -> int:
+    """
+    parallel_encoder.compress_file into a primed container, returning its size.
+
+    The chunks are the same, but each one ends on a byte boundary and the index tells where,
+    so parallel_decoder can hand them to its workers.
+    """
+    file_size = os.path.getsize(input_path)
+    frame_sizes = (min(frame_size, file_size - start) for start in range(0, file_size, frame_size))
+
+    with ParallelDeflateEncoder(
+            chunk_size=frame_size, window_size=window_size, level=level, block_size=block_size,
+            processes=processes, max_in_flight=max_in_flight, stats=stats,
+    ) as encoder, open(output_path, 'wb') as output:
+        frames = ((size, part.data) for size, part in zip(frame_sizes, encoder.compress_file_parts(input_path)))
+        return write_frames(output, frames, window_size=window_size, flags=FLAG_PRIMED)
+
+
+def compress(data: bytes, **encoder_kwargs) -> bytes:
+    encoder = SeekableEncoder(**encoder_kwargs)
+    return encoder.compress(data) + encoder.finish()
+
+
+def decompress(data: bytes) -> bytes:
+    return SeekableReader(data).read_all()
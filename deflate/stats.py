@@ -0,0 +1,92 @@
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, fields
+from typing import Iterable, Optional
+
+from deflate.tables import offset_code
+
+STORED_BLOCK = 'stored'
+FIXED_HUFFMAN_BLOCK = 'fixed'
+DYNAMIC_HUFFMAN_BLOCK = 'dynamic'
+
+
+@dataclass
+class EncoderStats:
+    """
+    Counters filled by the encoders when one is passed as `stats`; nothing is measured otherwise.
+
+    Plain numbers and Counters only, so a stats object pickles cheaply and the ones returned
+    by pool workers can be summed up with merge().
+    """
+    input_bytes: int = 0
+    lzss_seconds: float = 0.0
+    tree_seconds: float = 0.0
+    emit_seconds: float = 0.0
+    literal_count: int = 0
+    match_count: int = 0
+    match_length_histogram: Counter = field(default_factory=Counter)
+    # Keyed by the deflate offset code (a power of two bucket), not by the raw offset
+    offset_code_histogram: Counter = field(default_factory=Counter)
+    match_searches: int = 0
+    chain_candidates: int = 0
+    block_types: Counter = field(default_factory=Counter)
+    # Verdicts of the compressibility probe, per chunk
+    probe_results: Counter = field(default_factory=Counter)
+
+    @property
+    def average_chain_depth(self) -> float:
+        return self.chain_candidates / self.match_searches if self.match_searches else 0.0
+
+    def count_tokens(self, lzss_result):
+        match_length_histogram = self.match_length_histogram
+        offset_code_histogram = self.offset_code_histogram
+        match_count = lzss_result.match_count
+
+        for length, value in zip(lzss_result.lengths, lzss_result.values):
+            if length:
+                match_length_histogram[length] += 1
+                offset_code_histogram[offset_code(value)] += 1
+
+        self.match_count += match_count
+        self.literal_count += len(lzss_result) - match_count
+
+    @contextmanager
+    def timer(self, attribute: str):
+        """Add the time spent in the with-block to the *_seconds attribute"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, attribute, getattr(self, attribute) + time.perf_counter() - start)
+
+    def merge(self, other: 'EncoderStats') -> 'EncoderStats':
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+        return self
+
+    def to_dict(self) -> dict:
+        # asdict() would rebuild each Counter from (key, count) pairs and count the pairs
+        result = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            result[f.name] = dict(sorted(value.items())) if isinstance(value, Counter) else value
+
+        result['average_chain_depth'] = self.average_chain_depth
+        return result
+
+
+def stage_timer(stats: Optional[EncoderStats], attribute: str):
+    """stats.timer(attribute), or a no-op when stats are disabled"""
+    return nullcontext() if stats is None else stats.timer(attribute)
+
+
+def merge_stats(stats: Iterable[Optional[EncoderStats]]) -> EncoderStats:
+    total = EncoderStats()
+
+    for s in stats:
+        if s is not None:
+            total.merge(s)
+
+    return total
@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+
+from deflate.bitio import BitWriter
+from deflate.encoder import DeflateLikeEncoder
+from deflate.lzss.levels import DEFAULT_LEVEL
+from deflate.stats import EncoderStats
+
+logger = logging.getLogger(__name__)
+
+
+class DeflateLikeStreamEncoder:
+    """
+    Incremental counterpart of DeflateLikeEncoder, in the spirit of zlib.compressobj.
+
+    Input is cut into blocks of block_size bytes regardless of how it is fed, and the
+    LZSS window is kept between blocks, so matches cross block and call boundaries.
+    compress() and flush() return whole bytes only: up to 7 bits of the last block stay
+    in the encoder until the next call or finish().
+    """
+
+    def __init__(
+            self,
+            window_size: int = 32768,
+            block_size: int = 65536,
+            level: int = DEFAULT_LEVEL,
+            stats: Optional[EncoderStats] = None,
+            dictionary: Optional[bytes] = None,
+    ):
+        if block_size <= 0:
+            raise ValueError(f'block_size must be positive, got {block_size}')
+
+        self.__block_size = block_size
+        self.__block_encoder = DeflateLikeEncoder(window_size, level, stats, dictionary)
+        self.__writer = BitWriter()
+        self.__lzss = self.__block_encoder.start_stream(self.__writer)
+        self.__pending = bytearray()
+        self.__finished = False
+
+    def compress(self, data: bytes) -> bytes:
+        self.__check_not_finished()
+        self.__pending += data
+
+        while len(self.__pending) >= self.__block_size:
+            self.__write_block(bytes(self.__pending[:self.__block_size]))
+            del self.__pending[:self.__block_size]
+
+        return self.__writer.take_bytes()
+
+    def flush(self) -> bytes:
+        """Encode buffered input as a (possibly short) block"""
+        self.__check_not_finished()
+
+        if self.__pending:
+            self.__write_block(bytes(self.__pending))
+            self.__pending.clear()
+
+        return self.__writer.take_bytes()
+
+    def finish(self) -> bytes:
+        """Flush and pad the last byte; the encoder can't be used afterwards"""
+        data = self.flush()
+        self.__finished = True
+
+        return data + self.__writer.getvalue().data
+
+    def __write_block(self, block: bytes):
+        self.__block_encoder.write_chunk(block, self.__lzss, self.__writer)
+        logger.debug('Block of %d bytes encoded, %d bits in total', len(block), self.__writer.bit_count)
+
+    def __check_not_finished(self):
+        if self.__finished:
+            raise ValueError('Encoder is already finished')
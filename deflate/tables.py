@@ -0,0 +1,86 @@
+"""
+Length and offset code tables of the deflate alphabets, built once per process.
+
+A length code covers lengths base..base + 2**extra_bits - 1 (RFC 1951, 3.2.5);
+offset codes follow the same layout with two codes per extra bit.
+"""
+import functools
+
+MIN_MATCH_LENGTH = 3
+MAX_MATCH_LENGTH = 258
+
+FIRST_LENGTH_CODE = 257
+LENGTH_CODE_COUNT = 29
+
+# Indexed by length code - FIRST_LENGTH_CODE
+LENGTH_BASES = (
+    3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258,
+)
+LENGTH_EXTRA_BITS = (
+    0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0,
+)
+
+_MAX_OFFSET_CODE_COUNT = 64
+
+# Predefined codes of fixed Huffman blocks (RFC 1951, 3.2.6), indexed by symbol
+FIXED_LITERAL_LENGTH_LENGTHS = (8,) * 144 + (9,) * 112 + (7,) * 24 + (8,) * 8
+FIXED_OFFSET_CODE_LENGTH = 5
+
+
+def _build_length_codes() -> tuple[tuple[int, int, int], ...]:
+    table = [(0, 0, 0)] * (MAX_MATCH_LENGTH + 1)
+
+    for code_index in range(LENGTH_CODE_COUNT):
+        base = LENGTH_BASES[code_index]
+        extra_bits = LENGTH_EXTRA_BITS[code_index]
+        entry = (FIRST_LENGTH_CODE + code_index, extra_bits, base)
+
+        for length in range(base, min(base + (1 << extra_bits), MAX_MATCH_LENGTH + 1)):
+            # 258 has its own code, so 284 stops at 257
+            if length == MAX_MATCH_LENGTH and code_index != LENGTH_CODE_COUNT - 1:
+                continue
+            table[length] = entry
+
+    return tuple(table)
+
+
+def _build_offset_code_table() -> tuple[tuple[int, int], ...]:
+    table = []
+
+    for offset_code in range(_MAX_OFFSET_CODE_COUNT):
+        if offset_code < 4:
+            table.append((offset_code + 1, 0))
+            continue
+
+        extra_bits = offset_code // 2 - 1
+        table.append((((2 + (offset_code & 1)) << extra_bits) + 1, extra_bits))
+
+    return tuple(table)
+
+
+# Indexed by length: (length code, extra bits, base length)
+LENGTH_CODES = _build_length_codes()
+
+# Indexed by offset code: (base offset, extra bits)
+OFFSET_CODE_TABLE = _build_offset_code_table()
+
+
+def offset_code(offset: int) -> int:
+    """
+    O(1) offset -> offset code via the bit length of offset - 1.
+
+    Past the first four codes every power of two is split in two codes: the bit length
+    picks the pair, the bit right below the leading one picks the code.
+    """
+    distance = offset - 1
+    if distance < 4:
+        return distance
+
+    bit_length = distance.bit_length()
+    return 2 * bit_length - 2 + ((distance >> (bit_length - 2)) & 1)
+
+
+@functools.lru_cache(maxsize=None)
+def offset_code_count(window_size: int) -> int:
+    """Size of the offset alphabet needed to address the whole window"""
+    return offset_code(window_size) + 1
@@ -1,3 +1,6 @@
+from collections import deque
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Callable, Iterable, Iterator
 
 
 def read_file_by_chunks(file_path: str, chunk_size: int):
@@ -8,3 +11,26 @@ def read_file_by_chunks(file_path: str, chunk_size: int):
                 break
 
             yield data
+
+
+def ordered_results(pool: Pool, tasks: Iterable[tuple[Callable, tuple]], max_in_flight: int) -> Iterator[AsyncResult]:
+    """
+    Submit (function, args) tasks to pool and yield their AsyncResults in task order.
+
+    At most max_in_flight tasks are queued or held at once: the next task is only taken
+    once the caller has asked for the next result. Closing the generator waits for the tasks
+    still running.
+    """
+    in_flight = deque()
+
+    try:
+        for function, args in tasks:
+            in_flight.append(pool.apply_async(function, args))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft()
+
+        while in_flight:
+            yield in_flight.popleft()
+    finally:
+        for async_result in in_flight:
+            async_result.wait()
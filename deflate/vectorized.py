@@ -0,0 +1,113 @@
+"""
+Optional NumPy kernels for the Huffman stage.
+
+NumPy is not a dependency: without it, or for inputs too small to pay for the conversion
+into arrays, the same results come from plain Python loops.
+"""
+from collections import Counter
+from typing import NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from deflate.lzss.tokens import TokenStream
+from deflate.tables import LENGTH_CODES, OFFSET_CODE_TABLE, offset_code
+
+AVAILABLE = np is not None
+
+MIN_VECTORIZED_TOKENS = 512
+
+if AVAILABLE:
+    _LENGTH_CODE_ARRAY = np.array([code for code, _, _ in LENGTH_CODES], dtype=np.int64)
+    _LENGTH_EXTRA_BITS_ARRAY = np.array([extra_bits for _, extra_bits, _ in LENGTH_CODES], dtype=np.int64)
+    _OFFSET_EXTRA_BITS_ARRAY = np.array([extra_bits for _, extra_bits in OFFSET_CODE_TABLE], dtype=np.int64)
+
+
+class TokenHistograms(NamedTuple):
+    # Literals and length codes share one alphabet; no end of block is counted
+    literal_length_counts: Counter
+    offset_counts: Counter
+    extra_bit_count: int
+    token_count: int
+    byte_count: int
+
+
+def token_histograms(lzss_result: TokenStream) -> TokenHistograms:
+    """Literal/length and offset code histograms of LZSS tokens, plus their extra bits"""
+    if AVAILABLE and len(lzss_result) >= MIN_VECTORIZED_TOKENS:
+        return _numpy_token_histograms(lzss_result)
+
+    return _python_token_histograms(lzss_result)
+
+
+def argsort(values: Sequence[int]) -> list[int]:
+    """Indices that sort values ascending, equal values keeping their order"""
+    if AVAILABLE:
+        return np.argsort(np.asarray(values), kind='stable').tolist()
+
+    return sorted(range(len(values)), key=values.__getitem__)
+
+
+def offset_codes(offsets: 'np.ndarray') -> 'np.ndarray':
+    """tables.offset_code over an array, with the bit length taken from the float exponent"""
+    distances = offsets - 1
+    bit_lengths = np.frexp(distances.astype(np.float64))[1].astype(np.int64)
+    codes = 2 * bit_lengths - 2 + ((distances >> np.maximum(bit_lengths - 2, 0)) & 1)
+
+    return np.where(distances < 4, distances, codes)
+
+
+def _python_token_histograms(lzss_result: TokenStream) -> TokenHistograms:
+    literal_length_counts = Counter()
+    offset_counts = Counter()
+    extra_bit_count = 0
+    byte_count = 0
+
+    for length, value in zip(lzss_result.lengths, lzss_result.values):
+        if not length:
+            literal_length_counts[value] += 1
+            byte_count += 1
+            continue
+
+        length_code, length_extra_bits, _ = LENGTH_CODES[length]
+        code = offset_code(value)
+
+        literal_length_counts[length_code] += 1
+        offset_counts[code] += 1
+        extra_bit_count += length_extra_bits + OFFSET_CODE_TABLE[code][1]
+        byte_count += length
+
+    return TokenHistograms(literal_length_counts, offset_counts, extra_bit_count, len(lzss_result), byte_count)
+
+
+def _numpy_token_histograms(lzss_result: TokenStream) -> TokenHistograms:
+    # The columns are viewed in place; a zero length marks a literal
+    token_count = len(lzss_result)
+    lengths = np.frombuffer(lzss_result.lengths, dtype=np.uint16).astype(np.int64)
+    values = np.frombuffer(lzss_result.values, dtype=np.uint32).astype(np.int64)
+    is_match = lengths > 0
+
+    literals = values[~is_match]
+    offsets = values[is_match]
+    match_lengths = lengths[is_match]
+
+    length_codes = _LENGTH_CODE_ARRAY[match_lengths]
+    codes = offset_codes(offsets)
+
+    extra_bit_count = int(_LENGTH_EXTRA_BITS_ARRAY[match_lengths].sum() + _OFFSET_EXTRA_BITS_ARRAY[codes].sum())
+    byte_count = len(literals) + int(match_lengths.sum())
+
+    return TokenHistograms(
+        _counter(np.bincount(np.concatenate((literals, length_codes)))),
+        _counter(np.bincount(codes)),
+        extra_bit_count,
+        token_count,
+        byte_count,
+    )
+
+
+def _counter(counts: 'np.ndarray') -> Counter:
+    symbols = np.flatnonzero(counts)
+    return Counter(dict(zip(symbols.tolist(), counts[symbols].tolist())))
@@ -4,22 +4,27 @@ from deflate.utils import read_file_by_chunks
 
 logging.basicConfig(level=logging.DEBUG)
 
-from deflate.encoder import DeflateLikeEncoder
+from deflate.stream_encoder import DeflateLikeStreamEncoder
 
 
 def main():
     WINDOW_SIZE = 32768
     CHUNK_SIZE = 1024
+    BLOCK_SIZE = 65536
 
-    encoder = DeflateLikeEncoder(WINDOW_SIZE)
+    encoder = DeflateLikeStreamEncoder(WINDOW_SIZE, BLOCK_SIZE)
 
     total_chunks = 0
+    compressed_size = 0
 
     for chunk in read_file_by_chunks('samples/CharlesDickens-OliverTwist.txt', CHUNK_SIZE):
-        encoder.encode(chunk)
+        compressed_size += len(encoder.compress(chunk))
         total_chunks += 1
         print(total_chunks)
 
+    compressed_size += len(encoder.finish())
+    print(f'Compressed size: {compressed_size} bytes')
+
 
 if __name__ == '__main__':
     main()
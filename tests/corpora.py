@@ -0,0 +1,32 @@
+import random
+import struct
+
+_SEED = 1951
+
+
+def _sample(name: str, size: int) -> bytes:
+    with open(f'samples/{name}', 'rb') as f:
+        return f.read(size)
+
+
+def _random(size: int) -> bytes:
+    return random.Random(_SEED).randbytes(size)
+
+
+def _records(count: int) -> bytes:
+    generator = random.Random(_SEED)
+    return b''.join(struct.pack('<IHH', index, index % 7, generator.getrandbits(16)) for index in range(count))
+
+
+# Small enough for the pure Python encoders, yet with matches crossing block and chunk
+# boundaries, overlapping matches and incompressible stretches
+CORPORA = {
+    'empty': b'',
+    'one-byte': b'x',
+    'run': b'a' * 5000,
+    'text': _sample('CharlesDickens-OliverTwist.txt', 12000),
+    'random': _random(3000),
+    'records': _records(600),
+}
+
+TEXT = _sample('Dialogues-David-Hume.txt', 20000)
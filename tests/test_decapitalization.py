@@ -0,0 +1,108 @@
+import random
+import sys
+
+import pytest
+
+from decapitalization import container
+from decapitalization.compiled import CompiledDecapitalizer
+from decapitalization.decapitalizer import Decapitalizer
+from decapitalization.deviations import decode_deviations, encode_deviations
+from decapitalization.rules import FirstTextLetterRule, UpperLetterAfterFullStopRule, UpperLetterAfterTwoUpperLettersRule
+from decapitalization.stream import CapitalizingStream, DecapitalizingStream
+from tests.corpora import CORPORA, TEXT
+
+# Symbols whose lower() isn't one symbol that upper() turns back into them
+_IRREVERSIBLE = ''.join(
+    symbol for symbol in map(chr, range(sys.maxunicode + 1))
+    if symbol.lower() != symbol and (len(symbol.lower()) != 1 or symbol.lower().upper() != symbol)
+)
+
+TEXTS = [
+    '',
+    'a',
+    'Hello world. This is TEXT. and NASA said so.',
+    'İstanbul. HELLO world',
+    '..  A. b.C  dEF gHI.',
+    'ǅemal ǈubljana ﬁrst. ẞTRASSE ΩMEGA Kelvin K Ⓐ circled',
+    TEXT.decode('utf-8'),
+]
+
+
+def _rules_decapitalizer() -> Decapitalizer:
+    return Decapitalizer([FirstTextLetterRule(), UpperLetterAfterFullStopRule(), UpperLetterAfterTwoUpperLettersRule()])
+
+
+def _random_texts(count: int) -> list[str]:
+    generator = random.Random(16)
+    alphabet = 'aAbBzZ. \n1' + _IRREVERSIBLE[:40] + 'ßσςΣ'
+    return [''.join(generator.choice(alphabet) for _ in range(generator.randrange(1, 40))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('text', TEXTS + _random_texts(300))
+def test_compiled_equals_rules(text):
+    decapitalized, deviations = CompiledDecapitalizer().decapitalize(text)
+
+    assert (decapitalized, deviations) == _rules_decapitalizer().decapitalize(text)
+    assert len(decapitalized) == len(text)
+    assert CompiledDecapitalizer().capitalize(decapitalized, deviations) == text
+    assert _rules_decapitalizer().capitalize(decapitalized, deviations) == text
+
+
+def test_state_is_carried_between_calls():
+    text = TEXTS[2] * 3
+    decapitalizer = CompiledDecapitalizer()
+    pieces = [decapitalizer.decapitalize(text[start: start + 5]) for start in range(0, len(text), 5)]
+
+    offsets = range(0, len(text), 5)
+    deviations = [offset + deviation for offset, (_, piece_deviations) in zip(offsets, pieces) for deviation in piece_deviations]
+    assert (''.join(piece for piece, _ in pieces), deviations) == CompiledDecapitalizer().decapitalize(text)
+
+
+@pytest.mark.parametrize('piece_size', [1, 3, 1000])
+def test_stream_round_trip(piece_size):
+    data = '\n'.join(TEXTS).encode('utf-8')
+    decapitalizer = DecapitalizingStream()
+    decapitalized, deviations = b'', []
+
+    # Pieces cut UTF-8 sequences apart
+    for start in range(0, len(data), piece_size):
+        piece, piece_deviations = decapitalizer.decapitalize(data[start: start + piece_size])
+        decapitalized += piece
+        deviations += piece_deviations
+    piece, piece_deviations = decapitalizer.decapitalize(b'', final=True)
+    decapitalized += piece
+    deviations += piece_deviations
+
+    capitalizer = CapitalizingStream(deviations)
+    restored = b''.join(capitalizer.capitalize(decapitalized[start: start + 7]) for start in range(0, len(decapitalized), 7))
+    assert restored + capitalizer.capitalize(b'', final=True) == data
+
+
+def test_deviations_coding():
+    positions = [1, 2, 130, 131, 20000, 2 ** 40]
+
+    assert decode_deviations(encode_deviations(positions)) == positions
+    with pytest.raises(ValueError):
+        encode_deviations([3, 3])
+    with pytest.raises(ValueError):
+        decode_deviations(b'\x80')
+
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('decapitalize', [False, True])
+def test_container_round_trip(text, decapitalize):
+    data = text.encode('utf-8')
+
+    assert container.decompress(container.compress(data, decapitalize=decapitalize)) == data
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_container_without_decapitalization(name):
+    data = CORPORA[name]
+
+    assert container.decompress(container.compress(data, decapitalize=False)) == data
+
+
+def test_container_rejects_non_text():
+    with pytest.raises(UnicodeDecodeError):
+        container.compress(CORPORA['random'])
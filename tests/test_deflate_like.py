@@ -0,0 +1,105 @@
+import pytest
+
+from deflate.decoder import DeflateLikeDecoder
+from deflate.encoder import DeflateLikeEncoder
+from deflate.lzss.chunk_compressor import Lzss, LzssChunkDecompressor
+from deflate.lzss.levels import LEVELS
+from deflate.lzss.tokens import TokenStream
+from deflate.stream_encoder import DeflateLikeStreamEncoder
+from tests.corpora import CORPORA, TEXT
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+@pytest.mark.parametrize('level', sorted(LEVELS))
+def test_round_trip(name, level):
+    data = CORPORA[name]
+    encoded = DeflateLikeEncoder(level=level).encode_to_bytes(data)
+
+    assert DeflateLikeDecoder().decode(encoded) == data
+
+
+@pytest.mark.parametrize('window_size', [256, 4096, 65536])
+def test_window_sizes(window_size):
+    encoded = DeflateLikeEncoder(window_size).encode_to_bytes(TEXT)
+
+    assert DeflateLikeDecoder(window_size).decode(encoded) == TEXT
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_stream_round_trip(name):
+    data = CORPORA[name]
+    middle = len(data) // 2
+    encoder = DeflateLikeStreamEncoder(block_size=1000)
+    pieces = [encoder.compress(data[start: min(start + 777, middle)]) for start in range(0, middle, 777)]
+    pieces.append(encoder.flush())
+    pieces += [encoder.compress(data[start: start + 777]) for start in range(middle, len(data), 777)]
+
+    assert DeflateLikeDecoder().decode(b''.join(pieces) + encoder.finish()) == data
+
+
+def test_stream_matches_across_blocks_are_kept():
+    data = TEXT[:4000] * 3
+
+    def compressed_size(block_size):
+        encoder = DeflateLikeStreamEncoder(block_size=block_size)
+        return len(encoder.compress(data) + encoder.finish())
+
+    # Blocks of 4000 bytes only repeat the previous block, which a restarted window would miss
+    assert compressed_size(4000) < len(data) // 2
+
+
+def test_preset_dictionary():
+    dictionary = TEXT[:8000]
+    data = TEXT[8000:12000]
+    encoder = DeflateLikeStreamEncoder(dictionary=dictionary)
+    encoded = encoder.compress(data) + encoder.finish()
+
+    assert DeflateLikeDecoder(dictionary=dictionary).decode(encoded) == data
+    with pytest.raises(ValueError):
+        DeflateLikeDecoder().decode(encoded)
+
+
+def test_decode_into():
+    encoded = DeflateLikeEncoder().encode_to_bytes(TEXT)
+    buffer = bytearray(len(TEXT) + 10)
+
+    assert DeflateLikeDecoder().decode_into(encoded, buffer) == len(TEXT)
+    assert buffer[:len(TEXT)] == TEXT
+    with pytest.raises(ValueError):
+        DeflateLikeDecoder().decode_into(encoded, bytearray(len(TEXT) - 1))
+
+
+@pytest.mark.parametrize('flipped_bit', range(40, 2000, 13))
+def test_corrupt_stream_raises_value_error(flipped_bit):
+    # A flipped bit may still decode to something; it must never fail with anything else
+    encoded = bytearray(DeflateLikeEncoder().encode_to_bytes(TEXT[:3000]).data)
+    encoded[flipped_bit // 8] ^= 1 << flipped_bit % 8
+
+    try:
+        DeflateLikeDecoder().decode(bytes(encoded))
+    except (ValueError, EOFError):
+        pass
+
+
+@pytest.mark.parametrize('data', [TEXT[:5000], TEXT[:5000].decode('utf-8')])
+def test_lzss_round_trip(data):
+    lzss = Lzss(window_size=32768)
+
+    assert lzss.decompress(lzss.compress(data)) == data
+
+
+def test_lzss_short_size_hint_grows():
+    tokens = Lzss(window_size=32768).compress(TEXT[:5000])
+
+    assert LzssChunkDecompressor(bytes).decompress(tokens, size_hint=10) == TEXT[:5000]
+    with pytest.raises(ValueError):
+        LzssChunkDecompressor.decompress_into(tokens, bytearray(10))
+
+
+def test_lzss_zero_offset_raises():
+    tokens = TokenStream()
+    tokens.lengths.extend([0, 5])
+    tokens.values.extend([ord('a'), 0])
+
+    with pytest.raises(ValueError):
+        LzssChunkDecompressor(bytes).decompress(tokens)
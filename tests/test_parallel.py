@@ -0,0 +1,100 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from deflate.async_encoder import AsyncDeflateEncoder
+from deflate.decoder import DeflateLikeDecoder
+from deflate.parallel_encoder import ParallelDeflateEncoder, compress_chunk, compress_file, concatenate, parallel_compress
+from deflate.stats import EncoderStats
+from tests.corpora import CORPORA, TEXT
+
+_CHUNK_SIZE = 3000
+_WINDOW_SIZE = 4096
+
+
+def _serial(data: bytes) -> bytes:
+    """Every chunk primed with the window before it, compressed in this process"""
+    parts = [
+        compress_chunk(data[start: start + _CHUNK_SIZE], data[max(0, start - _WINDOW_SIZE): start], window_size=_WINDOW_SIZE)
+        for start in range(0, len(data), _CHUNK_SIZE)
+    ]
+    return concatenate(parts).data
+
+
+@pytest.fixture(scope='module')
+def encoder():
+    with ParallelDeflateEncoder(chunk_size=_CHUNK_SIZE, window_size=_WINDOW_SIZE, processes=2, max_in_flight=3) as encoder:
+        yield encoder
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_same_bytes_as_serial(encoder, name):
+    data = CORPORA[name]
+    compressed = encoder.compress(data).data
+
+    assert compressed == _serial(data)
+    assert DeflateLikeDecoder(_WINDOW_SIZE).decode(compressed) == data
+
+
+def test_stream_and_file(encoder, tmp_path):
+    source, compressed = tmp_path / 'source', tmp_path / 'compressed'
+    source.write_bytes(TEXT)
+
+    assert b''.join(encoder.compress_stream(io.BytesIO(TEXT))) == _serial(TEXT)
+    assert encoder.compress_file(str(source), str(compressed)) == compressed.stat().st_size
+    assert compressed.read_bytes() == _serial(TEXT)
+    assert encoder.metrics.chunks > 0
+
+
+def test_parallel_compress_merges_stats(tmp_path):
+    stats = EncoderStats()
+    compressed = parallel_compress(TEXT, chunk_size=_CHUNK_SIZE, window_size=_WINDOW_SIZE, processes=2, stats=stats)
+
+    assert compressed.data == _serial(TEXT)
+    assert stats.input_bytes == len(TEXT)
+
+    source, output = tmp_path / 'source', tmp_path / 'output'
+    source.write_bytes(TEXT)
+    compress_file(str(source), str(output), chunk_size=_CHUNK_SIZE, window_size=_WINDOW_SIZE, processes=2)
+    assert output.read_bytes() == _serial(TEXT)
+
+
+def test_one_input_at_a_time(encoder):
+    parts = encoder.compress_stream(io.BytesIO(TEXT))
+    next(parts)
+
+    with pytest.raises(RuntimeError):
+        encoder.compress(b'abc')
+
+    parts.close()
+    assert encoder.compress(b'abc').data == _serial(b'abc')
+
+
+async def _pieces(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start: start + size]
+        await asyncio.sleep(0)
+
+
+def test_async_encoder():
+    async def compress():
+        with ThreadPoolExecutor(2) as executor:
+            encoder = AsyncDeflateEncoder(chunk_size=_CHUNK_SIZE, window_size=_WINDOW_SIZE, executor=executor, max_in_flight=2)
+            return b''.join([part async for part in encoder.compress(_pieces(TEXT, 1234))])
+
+    assert asyncio.run(compress()) == _serial(TEXT)
+
+
+def test_async_encoder_owns_its_pool():
+    async def compress():
+        async with AsyncDeflateEncoder(chunk_size=_CHUNK_SIZE, window_size=_WINDOW_SIZE) as encoder:
+            compressed = [await encoder.encode(data) for data in (TEXT, TEXT[:100])]
+
+        with pytest.raises(ValueError):
+            await encoder.encode(TEXT)
+
+        return compressed
+
+    assert asyncio.run(compress()) == [_serial(TEXT), _serial(TEXT[:100])]
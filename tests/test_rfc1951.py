@@ -0,0 +1,64 @@
+import gzip
+import zlib
+
+import pytest
+
+from deflate.containers import Container, GzipEncoder, ZlibEncoder, compress
+from deflate.lzss.levels import LEVELS
+from deflate.rfc1951 import RawDeflateEncoder
+from tests.corpora import CORPORA, TEXT
+
+# RFC 1951 output has no decoder here, the stdlib checks it
+_RAW_WBITS = -15
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+@pytest.mark.parametrize('level', sorted(LEVELS))
+def test_raw_deflate(name, level):
+    data = CORPORA[name]
+
+    assert zlib.decompress(compress(data, Container.RAW, level=level), _RAW_WBITS) == data
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_zlib(name):
+    data = CORPORA[name]
+
+    assert zlib.decompress(compress(data, Container.ZLIB)) == data
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+def test_gzip(name):
+    data = CORPORA[name]
+
+    assert gzip.decompress(compress(data, Container.GZIP)) == data
+
+
+@pytest.mark.parametrize('window_size', [512, 8192, 32768])
+def test_window_sizes(window_size):
+    encoded = compress(TEXT, Container.ZLIB, window_size=window_size)
+
+    assert zlib.decompress(encoded) == TEXT
+
+
+@pytest.mark.parametrize('encoder_class', [RawDeflateEncoder, ZlibEncoder, GzipEncoder])
+def test_streaming_with_flush(encoder_class):
+    encoder = encoder_class(block_size=3000)
+    encoded = encoder.compress(TEXT[:5000]) + encoder.flush() + encoder.compress(TEXT[5000:]) + encoder.finish()
+
+    decompressor = zlib.decompressobj({RawDeflateEncoder: _RAW_WBITS, ZlibEncoder: 15, GzipEncoder: 31}[encoder_class])
+    assert decompressor.decompress(encoded) + decompressor.flush() == TEXT
+
+
+def test_zlib_preset_dictionary():
+    dictionary = TEXT[:8000]
+    data = TEXT[8000:]
+    encoded = compress(data, Container.ZLIB, dictionary=dictionary)
+
+    decompressor = zlib.decompressobj(zdict=dictionary)
+    assert decompressor.decompress(encoded) + decompressor.flush() == data
+
+
+def test_window_size_out_of_range():
+    with pytest.raises(ValueError):
+        RawDeflateEncoder(window_size=65536)
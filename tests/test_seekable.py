@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from deflate import parallel_decoder, seekable
+from deflate.seekable import SeekableEncoder, SeekableReader
+from tests.corpora import CORPORA, TEXT
+
+
+def _container(data: bytes, primed: bool, frame_size: int = 3000) -> bytes:
+    return seekable.compress(data, frame_size=frame_size, primed=primed, window_size=4096)
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+@pytest.mark.parametrize('primed', [False, True])
+def test_round_trip(name, primed):
+    data = CORPORA[name]
+
+    assert seekable.decompress(_container(data, primed)) == data
+
+
+@pytest.mark.parametrize('primed', [False, True])
+def test_random_reads(primed):
+    reader = SeekableReader(_container(TEXT, primed))
+    generator = random.Random(24)
+
+    for _ in range(50):
+        offset = generator.randrange(len(TEXT) + 10)
+        length = generator.randrange(7000)
+        assert reader.read(offset, length) == TEXT[offset: offset + length]
+
+
+def test_frames_do_not_depend_on_how_input_is_fed():
+    encoder = SeekableEncoder(frame_size=3000)
+    pieces = [encoder.compress(TEXT[start: start + 1234]) for start in range(0, len(TEXT), 1234)]
+
+    assert b''.join(pieces) + encoder.finish() == seekable.compress(TEXT, frame_size=3000)
+
+
+def test_primed_frames_compress_better():
+    assert len(_container(TEXT, primed=True)) < len(_container(TEXT, primed=False))
+
+
+def test_corrupt_footer():
+    container = _container(TEXT, primed=False)
+
+    with pytest.raises(ValueError):
+        SeekableReader(container[:-1])
+
+
+@pytest.mark.parametrize('name', sorted(CORPORA))
+@pytest.mark.parametrize('primed', [False, True])
+def test_parallel_decompress(name, primed):
+    data = CORPORA[name]
+
+    assert parallel_decoder.parallel_decompress(_container(data, primed), processes=2) == data
+
+
+def test_parallel_compress_and_decompress_file(tmp_path):
+    source, container, restored = tmp_path / 'source', tmp_path / 'container', tmp_path / 'restored'
+    source.write_bytes(TEXT)
+
+    size = seekable.parallel_compress_file(str(source), str(container), frame_size=3000, processes=2)
+    written = parallel_decoder.decompress_file(str(container), str(restored), processes=2, max_in_flight=2)
+
+    assert size == container.stat().st_size
+    assert written == len(TEXT)
+    assert restored.read_bytes() == TEXT
+    assert SeekableReader(container.read_bytes()).primed
+
+
+def test_parallel_decompress_checks_frame_sizes():
+    container = bytearray(_container(TEXT, primed=False))
+    reader = SeekableReader(bytes(container))
+    frame = reader.frames[0]
+    entry_start = len(container) - seekable._FOOTER.size - len(reader.frames) * seekable._INDEX_ENTRY.size
+    container[entry_start: entry_start + seekable._INDEX_ENTRY.size] = seekable._INDEX_ENTRY.pack(
+        frame.uncompressed_offset, frame.compressed_offset, frame.uncompressed_size + 1, frame.compressed_size,
+    )
+
+    with pytest.raises(ValueError):
+        parallel_decoder.parallel_decompress(bytes(container), processes=2)